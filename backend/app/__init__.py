@@ -1,5 +1,6 @@
 from flask import Flask, send_from_directory, jsonify
 from .config import Config
+import logging
 import os
 
 def create_app():
@@ -7,12 +8,61 @@ def create_app():
     app = Flask(__name__, static_folder='../../frontend')
     app.config.from_object(Config)
 
+    # Take the client IP from X-Forwarded-For set by our own proxies
+    if Config.TRUSTED_PROXY_HOPS:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.TRUSTED_PROXY_HOPS)
+
+    # Tokens signed with a published key could be forged by anyone, so none
+    # are issued or accepted until a real key is configured
+    from .services.tokens import is_public_key
+    if is_public_key(Config.SECRET_KEY):
+        logging.getLogger('app').error(
+            "SECRET_KEY is not set (or is a published default): logins and authenticated "
+            "endpoints are refused until it is set to a random secret"
+        )
+    elif Config.QR_TOKEN_MODE == 'signed' and is_public_key(Config.QR_SIGNING_KEY):
+        logging.getLogger('app').error(
+            "QR_SIGNING_KEY is a published default: signed QR codes are refused until it is set to a random secret"
+        )
+
+    # Return each request's pooled database connection during teardown
+    from .models import database
+    database.init_app(app)
+    from .models.write_buffer import write_buffer
+
+    from .services.passwords import hasher
+    from .services.rate_limit import buckets
+    from .services.nonce_set import used_nonces
+    from .services.qr_sweeper import qr_sweeper
+    from .services.qr_events import qr_status_events
+
+    # Started lazily: a thread started here would not survive a pre-fork server
+    @app.before_request
+    def start_background_jobs():
+        qr_sweeper.ensure_started()
+
     # Add health check endpoint
+    # Stays 200 while the circuit breaker is open: restarting the app does
+    # not bring the database back, so only report "degraded"
     @app.route('/health')
     def health_check():
+        breaker_state = database.get_breaker_state()
         return jsonify({
-            "status": "ok",
-            "message": "Application is running"
+            "status": "ok" if breaker_state == 'closed' else "degraded",
+            "message": "Application is running",
+            "database": {
+                "breaker": breaker_state,
+                "pool": database.get_pool_stats(),
+                "replicas": database.get_replica_pool_stats(),
+                "statement_cache": database.get_statement_cache_stats()
+            },
+            "group_commit": write_buffer.stats(),
+            "password_hasher": hasher.stats(),
+            "rate_limiter": buckets.stats(),
+            "qr_nonces": used_nonces.stats(),
+            "qr_sweeper": qr_sweeper.stats(),
+            "qr_status_waits": qr_status_events.stats()
         }), 200
 
     # Add debug endpoint to check configuration
@@ -109,17 +159,20 @@ def create_app():
     from .api.auth import auth_bp
     from .api.users import users_bp
     from .api.attendance import attendance_bp
+    from .api.admin import admin_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(users_bp, url_prefix='/api/users')
     app.register_blueprint(attendance_bp, url_prefix='/api/attendance')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
 
     # Enable CORS
     @app.after_request
     def after_request(response):
         response.headers.add('Access-Control-Allow-Origin', Config.CORS_ORIGINS)
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,Idempotency-Key')
         response.headers.add('Access-Control-Allow-Methods', 'GET,POST,PUT,DELETE,OPTIONS')
+        response.headers.add('Access-Control-Expose-Headers', 'Idempotent-Replayed')
         return response
 
     # Frontend routes
@@ -0,0 +1,72 @@
+from flask import Blueprint, jsonify
+from ..models.database import query_stats
+from ..models.hierarchy import hierarchy
+from ..models.user_cache import user_cache
+from ..services.qr_sweeper import qr_sweeper, qr_table_sizes
+from .auth import require_role
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/query-stats', methods=['GET'])
+@require_role('Manager')
+def get_query_stats():
+    """Dump per-fingerprint and per-endpoint query timings for this worker process"""
+    try:
+        return jsonify(query_stats.snapshot()), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@admin_bp.route('/query-stats', methods=['DELETE'])
+@require_role('Manager')
+def reset_query_stats():
+    """Clear the query timings, e.g. before a load test"""
+    try:
+        query_stats.reset()
+        return jsonify({"message": "Query statistics reset"}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@admin_bp.route('/cache-stats', methods=['GET'])
+@require_role('Manager')
+def get_cache_stats():
+    """Hit, miss and eviction counters of this worker's in-process caches"""
+    try:
+        return jsonify({
+            "user_cache": user_cache.stats(),
+            "hierarchy": hierarchy.stats()
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@admin_bp.route('/qr-sweep', methods=['GET'])
+@require_role('Manager')
+def get_qr_sweep():
+    """Current size of the QR tables and this worker's sweep statistics"""
+    try:
+        return jsonify({
+            "tables": qr_table_sizes(),
+            "sweeper": qr_sweeper.stats()
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@admin_bp.route('/qr-sweep', methods=['POST'])
+@require_role('Manager')
+def run_qr_sweep():
+    """Run a sweep now, even during busy hours; 409 while another worker is sweeping"""
+    try:
+        report = qr_sweeper.run_once(force=True)
+        if report is None:
+            return jsonify({"error": "A sweep is already running in another worker"}), 409
+
+        return jsonify({
+            "report": report,
+            "tables": qr_table_sizes()
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,5 +1,22 @@
-from flask import Blueprint, request, jsonify
-from ..models.database import execute_query, get_connection
+from flask import Blueprint, after_this_request, request, jsonify, g
+from ..config import Config
+from ..models.database import (
+    execute_query, execute_write, get_connection, iter_query, query_timeout, read_from_primary,
+    release_request_connections, transaction
+)
+from ..models.hierarchy import hierarchy
+from ..models.user_cache import find_user
+from ..models.write_buffer import execute_grouped_write
+from ..services.idempotency import idempotent
+from ..services.kiosk_sync import KioskSyncConflict, sync_events
+from ..services.nonce_set import used_nonces
+from ..services.qr_events import qr_status_events
+from ..services.qr_tokens import (
+    InvalidQRToken, claim_qr_token, is_signed_token, issue_qr_token, mark_qr_token_failed, qr_token_status,
+    verify_qr_token
+)
+from .auth import require_role
+from .responses import stream_json_list
 from datetime import datetime, date, timedelta
 import hashlib
 import secrets
@@ -14,6 +31,32 @@ def generate_qr_token(lead_username, member_username, action_type):
     token = hashlib.sha256(data.encode()).hexdigest()
     return token, timestamp
 
+def find_open_entry(username):
+    """
+    Return the user's open time entry ({"id": ...}) or None
+
+    A point lookup on the unique open_username index: constant time however
+    long the user's history is.
+    """
+    query = "SELECT id FROM time_entries WHERE open_username = %s"
+    return execute_query(query, (username,), fetch_one=True)
+
+def notify_qr_status(token):
+    """Wake requests waiting on the code's status once this request has finished (and committed)"""
+    @after_this_request
+    def publish(response):
+        qr_status_events.publish(token)
+        return response
+
+def mark_qr_failed(token, claims=None):
+    """Record that a scanned QR code's action could not be applied"""
+    if claims is not None:
+        mark_qr_token_failed(claims)
+    else:
+        update_query = "UPDATE qr_requests SET status = 'failed' WHERE token = %s"
+        execute_query(update_query, (token,), commit=True)
+    notify_qr_status(token)
+
 def get_month_range(year, month):
     """Get start and end date for a given month"""
     start = date(year, month, 1)
@@ -34,100 +77,80 @@ def count_weekdays(start_date, end_date):
     return count
 
 @attendance_bp.route('/check-in', methods=['POST'])
+@query_timeout(Config.QUERY_TIMEOUT_HOT_MS)
+@require_role('Manager', 'Lead', 'Member')
+@idempotent
 def check_in():
-    """Clock in for work"""
-    data = request.get_json() or {}
-    username = data.get('username')
-
-    if not username:
-        return jsonify({"error": "Username is required"}), 400
+    """Clock in for work (the user is taken from the session token)"""
+    user = g.user
+    username = user['username']
 
+    # The unique index on open_username allows one open entry per user, so
+    # the INSERT itself reports an existing one by writing no row
     try:
-        # Get user info
-        user_query = "SELECT username, user_level FROM users WHERE username = %s"
-        user = execute_query(user_query, (username,), fetch_one=True)
-
-        if not user:
-            return jsonify({"error": "User not found"}), 404
-
-        # Check for open time entry
-        open_query = """
-            SELECT id FROM time_entries
-            WHERE username = %s AND out_time IS NULL
-            ORDER BY in_time DESC LIMIT 1
-        """
-        open_entry = execute_query(open_query, (username,), fetch_one=True)
-
-        if open_entry:
-            return jsonify({"error": "You have an open time entry. Please check out first."}), 400
-
         # Managers and Leads auto-approve their own time entries
         if user['user_level'] in ['Manager', 'Lead']:
             insert_query = """
                 INSERT INTO time_entries
                 (username, in_time, status, approved_by, approved_at)
                 VALUES (%s, NOW(), 'Approved', %s, NOW())
+                ON DUPLICATE KEY UPDATE id = id
             """
-            entry_id = execute_query(insert_query, (username, username), commit=True)
+            result = execute_grouped_write(insert_query, (username, username))
+            if not result.rowcount:
+                return jsonify({"error": "You have an open time entry. Please check out first."}), 400
             return jsonify({
                 "message": "Check-in successful (auto-approved)",
-                "entry_id": entry_id
+                "entry_id": result.lastrowid
             }), 201
 
         # Members need approval from their Lead (but Members shouldn't use manual check-in)
         else:
             # Check if member has a lead
-            lead_query = """
-                SELECT lead_username FROM lead_assignments
-                WHERE member_username = %s
-            """
-            lead = execute_query(lead_query, (username,), fetch_one=True)
-
-            if not lead:
+            if not hierarchy.leads_of_member(username):
                 return jsonify({"error": "No lead assigned. Members should use QR code check-in."}), 403
 
             insert_query = """
                 INSERT INTO time_entries
                 (username, in_time, status)
                 VALUES (%s, NOW(), 'Pending')
+                ON DUPLICATE KEY UPDATE id = id
             """
-            entry_id = execute_query(insert_query, (username,), commit=True)
+            result = execute_grouped_write(insert_query, (username,))
+            if not result.rowcount:
+                return jsonify({"error": "You have an open time entry. Please check out first."}), 400
             return jsonify({
                 "message": "Check-in submitted. Waiting for lead approval.",
-                "entry_id": entry_id
+                "entry_id": result.lastrowid
             }), 201
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @attendance_bp.route('/check-out', methods=['POST'])
+@query_timeout(Config.QUERY_TIMEOUT_HOT_MS)
+@require_role('Manager', 'Lead', 'Member')
+@idempotent
 def check_out():
-    """Clock out from work"""
-    data = request.get_json() or {}
-    username = data.get('username')
-
-    if not username:
-        return jsonify({"error": "Username is required"}), 400
+    """Clock out from work (the user is taken from the session token)"""
+    username = g.user['username']
 
     try:
         # Find open time entry
-        query = """
-            SELECT id FROM time_entries
-            WHERE username = %s AND out_time IS NULL
-            ORDER BY in_time DESC LIMIT 1
-        """
-        entry = execute_query(query, (username,), fetch_one=True)
+        entry = find_open_entry(username)
 
         if not entry:
             return jsonify({"error": "No open time entry found"}), 400
 
-        # Update with checkout time
+        # Update with checkout time; a concurrent check-out of the same
+        # entry changes no row
         update_query = """
             UPDATE time_entries
             SET out_time = NOW()
-            WHERE id = %s
+            WHERE id = %s AND out_time IS NULL
         """
-        execute_query(update_query, (entry['id'],), commit=True)
+        if not execute_grouped_write(update_query, (entry['id'],)).rowcount:
+            return jsonify({"error": "No open time entry found"}), 400
 
         return jsonify({
             "message": "Check-out successful",
@@ -137,6 +160,49 @@ def check_out():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@attendance_bp.route('/batch', methods=['POST'])
+@query_timeout(Config.QUERY_TIMEOUT_REPORT_MS)
+@require_role('Manager', 'Lead')
+@idempotent
+def batch_sync():
+    """
+    Upload scans a kiosk recorded while offline
+    Request body: {
+        "events": [
+            {
+                "event_id": "42",  # Optional, unique per device
+                "device_id": "kiosk-3",
+                "member_username": "member01",
+                "action": "check-in",  # or "check-out"
+                "timestamp": "2025-01-06T07:01:12+08:00"
+            },
+            ...
+        ]
+    }
+    Applied in timestamp order in one transaction; each event gets its own result.
+    """
+    data = request.get_json(silent=True) or {}
+    events = data.get('events')
+
+    if not isinstance(events, list) or not events:
+        return jsonify({"error": "events must be a non-empty list"}), 400
+    if len(events) > Config.KIOSK_SYNC_MAX_EVENTS:
+        return jsonify({"error": f"At most {Config.KIOSK_SYNC_MAX_EVENTS} events per batch"}), 413
+
+    try:
+        results = sync_events(events, g.user)
+        applied = sum(1 for result in results if result['status'] == 'applied')
+        return jsonify({
+            "applied": applied,
+            "rejected": len(results) - applied,
+            "results": results
+        }), 200
+
+    except KioskSyncConflict as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @attendance_bp.route('/my-entries', methods=['GET'])
 def my_entries():
     """Get time entries for the current user"""
@@ -162,22 +228,15 @@ def my_entries():
         return jsonify({"error": str(e)}), 500
 
 @attendance_bp.route('/pending-approvals', methods=['GET'])
+@require_role('Manager', 'Lead')
 def pending_approvals():
-    """Get pending time entries for a Manager or Lead to approve"""
-    approver_username = request.args.get('username')
-
-    if not approver_username:
-        return jsonify({"error": "username parameter is required"}), 400
+    """Get pending time entries for the signed-in Manager or Lead to approve"""
+    user = g.user
+    approver_username = user['username']
 
     try:
-        # Verify user is a Manager or Lead
-        user_query = "SELECT user_level FROM users WHERE username = %s"
-        user = execute_query(user_query, (approver_username,), fetch_one=True)
-
-        if not user or user['user_level'] not in ['Manager', 'Lead']:
-            return jsonify({"error": "Only Managers and Leads can view pending approvals"}), 403
-
-        # Managers see ALL pending entries
+        # Managers see ALL pending entries; the list is unbounded, so it is
+        # streamed to the client instead of being buffered in the worker
         if user['user_level'] == 'Manager':
             query = """
                 SELECT te.id, te.username, u.display_name, te.in_time, te.out_time, te.status
@@ -186,62 +245,57 @@ def pending_approvals():
                 WHERE te.status = 'Pending'
                 ORDER BY te.in_time DESC
             """
-            entries = execute_query(query, fetch_all=True)
+            entries = iter_query(query)
         else:  # Lead
             # Get pending entries for this Lead's Members
-            query = """
+            members = list(hierarchy.members_of(approver_username))
+            if not members:
+                return jsonify({"pending_entries": []}), 200
+
+            placeholders = ', '.join(['%s'] * len(members))
+            query = f"""
                 SELECT te.id, te.username, u.display_name, te.in_time, te.out_time, te.status
                 FROM time_entries te
-                JOIN lead_assignments la ON te.username = la.member_username
                 JOIN users u ON te.username = u.username
-                WHERE la.lead_username = %s AND te.status = 'Pending'
+                WHERE te.username IN ({placeholders}) AND te.status = 'Pending'
                 ORDER BY te.in_time DESC
             """
-            entries = execute_query(query, (approver_username,), fetch_all=True)
+            entries = iter_query(query, tuple(members))
 
-        return jsonify({"pending_entries": entries}), 200
+        return stream_json_list("pending_entries", entries)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @attendance_bp.route('/approve', methods=['POST'])
+@require_role('Manager', 'Lead')
+@idempotent
 def approve_entry():
-    """Approve or reject a time entry"""
+    """Approve or reject a time entry as the signed-in Manager or Lead"""
     data = request.get_json() or {}
-    approver_username = data.get('approver_username') or data.get('manager_username')  # Support both parameter names
+    user = g.user
+    approver_username = user['username']
     entry_id = data.get('entry_id')
     status = data.get('status')  # 'Approved' or 'Rejected'
     notes = data.get('notes', '')
 
-    if not all([approver_username, entry_id, status]):
-        return jsonify({"error": "approver_username, entry_id, and status are required"}), 400
+    if not all([entry_id, status]):
+        return jsonify({"error": "entry_id and status are required"}), 400
 
     if status not in ['Approved', 'Rejected']:
         return jsonify({"error": "Status must be 'Approved' or 'Rejected'"}), 400
 
     try:
-        # Verify approver is Manager or Lead
-        user_query = "SELECT user_level FROM users WHERE username = %s"
-        user = execute_query(user_query, (approver_username,), fetch_one=True)
-
-        if not user or user['user_level'] not in ['Manager', 'Lead']:
-            return jsonify({"error": "Only Managers and Leads can approve entries"}), 403
+        entry_query = """
+            SELECT te.username FROM time_entries te
+            WHERE te.id = %s
+        """
+        entry = execute_query(entry_query, (entry_id,), fetch_one=True)
 
-        # Managers can approve any entry
-        if user['user_level'] == 'Manager':
-            entry_query = """
-                SELECT te.username FROM time_entries te
-                WHERE te.id = %s
-            """
-            entry = execute_query(entry_query, (entry_id,), fetch_one=True)
-        else:  # Lead
-            # Get the time entry and verify Lead has authority over this Member
-            entry_query = """
-                SELECT te.username FROM time_entries te
-                JOIN lead_assignments la ON te.username = la.member_username
-                WHERE te.id = %s AND la.lead_username = %s
-            """
-            entry = execute_query(entry_query, (entry_id, approver_username), fetch_one=True)
+        # Managers can approve any entry; Leads only their own Members'
+        if entry and user['user_level'] == 'Lead':
+            if not hierarchy.is_member_of(approver_username, entry['username']):
+                entry = None
 
         if not entry:
             return jsonify({"error": "Entry not found or you don't have permission"}), 404
@@ -264,6 +318,7 @@ def approve_entry():
         return jsonify({"error": str(e)}), 500
 
 @attendance_bp.route('/monthly-summary', methods=['GET'])
+@query_timeout(Config.QUERY_TIMEOUT_REPORT_MS)
 def monthly_summary():
     """Get monthly attendance summary"""
     username = request.args.get('username')
@@ -318,37 +373,31 @@ def monthly_summary():
 # =============================================
 
 @attendance_bp.route('/qr/generate', methods=['POST'])
+@query_timeout(Config.QUERY_TIMEOUT_HOT_MS)
+@require_role('Lead')
+@idempotent
 def generate_qr_request():
     """
-    Lead generates a QR code request for a Member to check in/out
+    The signed-in Lead generates a QR code request for a Member to check in/out
     Request body: {
-        "lead_username": "jsmith",
         "member_username": "member01",
         "action": "check-in" or "check-out"
     }
     """
     data = request.get_json() or {}
-    lead_username = data.get('lead_username') or data.get('manager_username')  # Support old parameter name
+    lead_username = g.user['username']
     member_username = data.get('member_username') or data.get('worker_username')  # Support old parameter name
     action = data.get('action')  # 'check-in' or 'check-out'
 
-    if not all([lead_username, member_username, action]):
-        return jsonify({"error": "lead_username, member_username, and action are required"}), 400
+    if not all([member_username, action]):
+        return jsonify({"error": "member_username and action are required"}), 400
 
     if action not in ['check-in', 'check-out']:
         return jsonify({"error": "action must be 'check-in' or 'check-out'"}), 400
 
     try:
-        # Verify Lead
-        lead_query = "SELECT user_level FROM users WHERE username = %s"
-        lead = execute_query(lead_query, (lead_username,), fetch_one=True)
-
-        if not lead or lead['user_level'] != 'Lead':
-            return jsonify({"error": "Only Leads can generate QR codes"}), 403
-
         # Verify Member exists
-        member_query = "SELECT username, display_name, user_level FROM users WHERE username = %s"
-        member = execute_query(member_query, (member_username,), fetch_one=True)
+        member = find_user(member_username)
 
         if not member:
             return jsonify({"error": "Member not found"}), 404
@@ -357,57 +406,44 @@ def generate_qr_request():
             return jsonify({"error": "QR codes can only be generated for Members"}), 400
 
         # Verify Lead-Member relationship
-        relationship_query = """
-            SELECT 1 FROM lead_assignments
-            WHERE lead_username = %s AND member_username = %s
-        """
-        relationship = execute_query(
-            relationship_query,
-            (lead_username, member_username),
-            fetch_one=True
-        )
-
-        if not relationship:
+        if not hierarchy.is_member_of(lead_username, member_username):
             return jsonify({"error": "Member is not assigned to this Lead"}), 403
 
         # For check-out, verify there's an open time entry
         if action == 'check-out':
-            open_query = """
-                SELECT id FROM time_entries
-                WHERE username = %s AND out_time IS NULL
-                ORDER BY in_time DESC LIMIT 1
-            """
-            open_entry = execute_query(open_query, (member_username,), fetch_one=True)
+            open_entry = find_open_entry(member_username)
 
             if not open_entry:
                 return jsonify({"error": "Member has no open time entry to check out"}), 400
 
         # For check-in, verify there's no open time entry
         if action == 'check-in':
-            open_query = """
-                SELECT id FROM time_entries
-                WHERE username = %s AND out_time IS NULL
-                ORDER BY in_time DESC LIMIT 1
-            """
-            open_entry = execute_query(open_query, (member_username,), fetch_one=True)
+            open_entry = find_open_entry(member_username)
 
             if open_entry:
                 return jsonify({"error": "Member already has an open time entry"}), 400
 
-        # Generate QR token
-        token, timestamp = generate_qr_token(lead_username, member_username, action)
+        if Config.QR_TOKEN_MODE == 'signed':
+            # The token carries everything verification needs; nothing is written
+            token, issued_at, expires_at = issue_qr_token(lead_username, member_username, action)
+            timestamp = issued_at.isoformat()
+            expires_in = int((expires_at - issued_at).total_seconds())
+        else:
+            # Generate QR token
+            token, timestamp = generate_qr_token(lead_username, member_username, action)
+            expires_in = 300
 
-        # Store the QR request in database (expires in 5 minutes)
-        insert_query = """
-            INSERT INTO qr_requests
-            (token, lead_username, member_username, action_type, created_at, expires_at, status)
-            VALUES (%s, %s, %s, %s, %s, DATE_ADD(%s, INTERVAL 5 MINUTE), 'pending')
-        """
-        execute_query(
-            insert_query,
-            (token, lead_username, member_username, action, timestamp, timestamp),
-            commit=True
-        )
+            # Store the QR request in database (expires in 5 minutes)
+            insert_query = """
+                INSERT INTO qr_requests
+                (token, lead_username, member_username, action_type, created_at, expires_at, status)
+                VALUES (%s, %s, %s, %s, %s, DATE_ADD(%s, INTERVAL 5 MINUTE), 'pending')
+            """
+            execute_query(
+                insert_query,
+                (token, lead_username, member_username, action, timestamp, timestamp),
+                commit=True
+            )
 
         return jsonify({
             "message": "QR code generated successfully",
@@ -415,7 +451,7 @@ def generate_qr_request():
             "member_username": member_username,
             "member_name": member.get('display_name', member_username),
             "action": action,
-            "expires_in_seconds": 300,
+            "expires_in_seconds": expires_in,
             "timestamp": timestamp
         }), 201
 
@@ -423,6 +459,8 @@ def generate_qr_request():
         return jsonify({"error": str(e)}), 500
 
 @attendance_bp.route('/qr/verify', methods=['POST'])
+@query_timeout(Config.QUERY_TIMEOUT_HOT_MS)
+@idempotent
 def verify_qr_code():
     """
     Member scans QR code to confirm check-in/check-out
@@ -438,82 +476,100 @@ def verify_qr_code():
     if not token:
         return jsonify({"error": "Token is required"}), 400
 
-    try:
-        # Find the QR request
-        query = """
-            SELECT *
-            FROM qr_requests
-            WHERE token = %s AND status = 'pending' AND expires_at > NOW()
-        """
-        qr_request = execute_query(query, (token,), fetch_one=True)
-
-        if not qr_request:
+    # A signed token is checked without the database (QR_TOKEN_MODE=signed)
+    claims = None
+    if is_signed_token(token):
+        try:
+            claims = verify_qr_token(token)
+        except InvalidQRToken:
             return jsonify({"error": "Invalid or expired QR code"}), 400
 
         # Verify member if username provided
-        if member_username and qr_request['member_username'] != member_username:
+        if member_username and claims['member'] != member_username:
             return jsonify({"error": "QR code is not for this member"}), 403
 
-        action = qr_request['action_type']
-        member_user = qr_request['member_username']
-        lead_user = qr_request['lead_username']
-
-        # Perform the action
-        if action == 'check-in':
-            # Check again for open entry (in case status changed)
-            open_query = """
-                SELECT id FROM time_entries
-                WHERE username = %s AND out_time IS NULL
-                ORDER BY in_time DESC LIMIT 1
-            """
-            open_entry = execute_query(open_query, (member_user,), fetch_one=True)
-
-            if open_entry:
-                # Mark QR request as failed
-                update_query = "UPDATE qr_requests SET status = 'failed' WHERE token = %s"
-                execute_query(update_query, (token,), commit=True)
-                return jsonify({"error": "Member already has an open time entry"}), 400
-
-            # Create check-in entry (auto-approved via QR code)
-            insert_query = """
-                INSERT INTO time_entries
-                (username, in_time, status, approved_by, approved_at)
-                VALUES (%s, NOW(), 'Approved', %s, NOW())
-            """
-            entry_id = execute_query(insert_query, (member_user, lead_user), commit=True)
-
-        else:  # check-out
-            # Find open entry
-            open_query = """
-                SELECT id FROM time_entries
-                WHERE username = %s AND out_time IS NULL
-                ORDER BY in_time DESC LIMIT 1
-            """
-            open_entry = execute_query(open_query, (member_user,), fetch_one=True)
-
-            if not open_entry:
-                # Mark QR request as failed
-                update_query = "UPDATE qr_requests SET status = 'failed' WHERE token = %s"
-                execute_query(update_query, (token,), commit=True)
-                return jsonify({"error": "No open time entry found"}), 400
-
-            # Update with checkout time
-            update_entry_query = """
-                UPDATE time_entries
-                SET out_time = NOW()
-                WHERE id = %s
-            """
-            execute_query(update_entry_query, (open_entry['id'],), commit=True)
-            entry_id = open_entry['id']
-
-        # Mark QR request as used
-        update_qr_query = """
-            UPDATE qr_requests
-            SET status = 'used', used_at = NOW()
-            WHERE token = %s
-        """
-        execute_query(update_qr_query, (token,), commit=True)
+        # A second scan of the code is turned away without a query
+        if not used_nonces.add(claims['nonce'], claims['exp']):
+            return jsonify({"error": "Invalid or expired QR code"}), 400
 
+    try:
+        # The QR request row is locked (a signed token's used-token record is
+        # claimed) so two concurrent scans of the same code cannot both
+        # apply; the time entry and QR status commit together
+        with transaction():
+            if claims is not None:
+                if not claim_qr_token(claims):
+                    return jsonify({"error": "Invalid or expired QR code"}), 400
+
+                action = claims['act']
+                member_user = claims['member']
+                lead_user = claims['lead']
+            else:
+                # Find the QR request
+                query = """
+                    SELECT *
+                    FROM qr_requests
+                    WHERE token = %s AND status = 'pending' AND expires_at > NOW()
+                    FOR UPDATE
+                """
+                qr_request = execute_query(query, (token,), fetch_one=True)
+
+                if not qr_request:
+                    return jsonify({"error": "Invalid or expired QR code"}), 400
+
+                # Verify member if username provided
+                if member_username and qr_request['member_username'] != member_username:
+                    return jsonify({"error": "QR code is not for this member"}), 403
+
+                action = qr_request['action_type']
+                member_user = qr_request['member_username']
+                lead_user = qr_request['lead_username']
+
+            # Perform the action
+            if action == 'check-in':
+                # Create check-in entry (auto-approved via QR code); writes
+                # nothing if the Member already has an open entry
+                insert_query = """
+                    INSERT INTO time_entries
+                    (username, in_time, status, approved_by, approved_at)
+                    VALUES (%s, NOW(), 'Approved', %s, NOW())
+                    ON DUPLICATE KEY UPDATE id = id
+                """
+                result = execute_write(insert_query, (member_user, lead_user))
+
+                if not result.rowcount:
+                    mark_qr_failed(token, claims)
+                    return jsonify({"error": "Member already has an open time entry"}), 400
+
+                entry_id = result.lastrowid
+
+            else:  # check-out
+                # Find open entry
+                open_entry = find_open_entry(member_user)
+
+                if not open_entry:
+                    mark_qr_failed(token, claims)
+                    return jsonify({"error": "No open time entry found"}), 400
+
+                # Update with checkout time
+                update_entry_query = """
+                    UPDATE time_entries
+                    SET out_time = NOW()
+                    WHERE id = %s
+                """
+                execute_query(update_entry_query, (open_entry['id'],), commit=True)
+                entry_id = open_entry['id']
+
+            # Mark QR request as used (a signed token's record already says so)
+            if claims is None:
+                update_qr_query = """
+                    UPDATE qr_requests
+                    SET status = 'used', used_at = NOW()
+                    WHERE token = %s
+                """
+                execute_query(update_qr_query, (token,), commit=True)
+
+        notify_qr_status(token)
         return jsonify({
             "message": f"{action.title()} successful",
             "action": action,
@@ -523,11 +579,49 @@ def verify_qr_code():
         }), 200
 
     except Exception as e:
+        # Rolled back: the code was not used up
+        if claims is not None:
+            used_nonces.discard(claims['nonce'], claims['exp'])
         return jsonify({"error": str(e)}), 500
 
 @attendance_bp.route('/qr/status/<token>', methods=['GET'])
+@query_timeout(Config.QUERY_TIMEOUT_HOT_MS)
 def get_qr_status(token):
-    """Check the status of a QR request"""
+    """
+    Check the status of a QR request
+
+    With ?wait=N (seconds, capped at QR_STATUS_MAX_WAIT) a pending code's
+    status is only returned once a scan changes it, N seconds pass or the
+    code expires, so the Lead page needs one request per scan instead of
+    polling. The wait holds no database connection.
+    """
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), Config.QR_STATUS_MAX_WAIT)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+
+    # Read before the status, so a scan landing in between still ends the wait
+    since = qr_status_events.generation(token)
+    response, status_code = read_qr_status(token)
+    if not wait or status_code != 200:
+        return response, status_code
+
+    body = response.get_json()
+    if body['status'] != 'pending' or body['is_expired']:
+        return response, status_code
+
+    expires_in = (datetime.fromisoformat(body['expires_at']) - datetime.now()).total_seconds()
+    release_request_connections()
+    if qr_status_events.wait(token, since, min(wait, max(expires_in, 0))):
+        # The scan was committed by another request; a replica may not have it yet
+        read_from_primary()
+    return read_qr_status(token)
+
+def read_qr_status(token):
+    """Return the (response, status code) describing a QR code's current status"""
+    if is_signed_token(token):
+        return get_signed_qr_status(token)
+
     try:
         query = "SELECT * FROM qr_requests WHERE token = %s"
         qr_request = execute_query(query, (token,), fetch_one=True)
@@ -549,3 +643,30 @@ def get_qr_status(token):
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+def get_signed_qr_status(token):
+    """Status of a signed QR token: its claims plus the used-token record, if it was scanned"""
+    try:
+        claims = verify_qr_token(token, allow_expired=True)
+    except InvalidQRToken:
+        return jsonify({"error": "QR request not found"}), 404
+
+    try:
+        record = qr_token_status(claims)
+        expires_at = datetime.fromtimestamp(claims['exp'])
+        is_expired = expires_at < datetime.now()
+
+        return jsonify({
+            "token": token,
+            "member_username": claims['member'],
+            "lead_username": claims['lead'],
+            "action": claims['act'],
+            "status": record['status'] if record else ('expired' if is_expired else 'pending'),
+            "created_at": datetime.fromtimestamp(claims['iat']).isoformat(),
+            "expires_at": expires_at.isoformat(),
+            "used_at": record['used_at'].isoformat() if record and record['used_at'] else None,
+            "is_expired": is_expired
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,14 +1,54 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
+from functools import wraps
 from ..models.database import execute_query, get_connection
-import hashlib
+from ..models.user_cache import user_cache
+from ..services.passwords import PasswordHasherBusy, hash_password, verify_password
+from ..services.rate_limit import login_rate_limit
+from ..services.tokens import InvalidToken, SigningKeyNotSet, issue_token, verify_token
 
 auth_bp = Blueprint('auth', __name__)
 
-def hash_password(password):
-    """Simple password hashing (use bcrypt in production)"""
-    return hashlib.sha256(password.encode()).hexdigest()
+def require_role(*roles):
+    """
+    Authorize the caller from the session token issued at login
+
+    Reads the ``Authorization: Bearer <token>`` header and verifies the
+    token's signature and expiry without touching the database. The caller
+    is stored as ``g.user`` ({"username", "user_level"}).
+
+    Responds 401 without a valid token and 403 when the caller's role is
+    not one of ``roles``. The role is the one the user had at login.
+
+    Usage:
+        @attendance_bp.route('/approve', methods=['POST'])
+        @require_role('Manager', 'Lead')
+        def approve_entry():
+            approver_username = g.user['username']
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+            if scheme.lower() != 'bearer' or not token:
+                return jsonify({"error": "Authentication required"}), 401
+
+            try:
+                user = verify_token(token.strip())
+            except InvalidToken as e:
+                return jsonify({"error": str(e)}), 401
+            except SigningKeyNotSet as e:
+                return jsonify({"error": str(e)}), 500
+
+            if user['user_level'] not in roles:
+                return jsonify({"error": f"Only {' and '.join(role + 's' for role in roles)} can access this endpoint"}), 403
+
+            g.user = user
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
 
 @auth_bp.route('/login', methods=['POST'])
+@login_rate_limit
 def login():
     """User login endpoint"""
     data = request.get_json() or {}
@@ -19,29 +59,43 @@ def login():
         return jsonify({"error": "Username and password are required"}), 400
 
     try:
-        # Hash the password
-        hashed_password = hash_password(password)
-
         # Query user
         query = """
-            SELECT id, username, display_name, email, user_level
+            SELECT id, username, display_name, email, user_level, password
             FROM users
-            WHERE username = %s AND password = %s
+            WHERE username = %s
         """
-        user = execute_query(query, (username, hashed_password), fetch_one=True)
+        user = execute_query(query, (username,), fetch_one=True)
+
+        # Check the password off the request thread
+        stored_password = user.pop('password') if user else None
+        matches, needs_rehash = verify_password(password, stored_password)
 
-        if not user:
+        if not matches:
             return jsonify({"error": "Invalid credentials"}), 401
 
+        # Replace a legacy SHA-256 (or weaker scrypt) hash now that the
+        # plaintext is known; skipped if the password changed meanwhile
+        if needs_rehash:
+            upgrade_query = "UPDATE users SET password = %s WHERE username = %s AND password = %s"
+            execute_query(upgrade_query, (hash_password(password), username, stored_password), commit=True)
+
         # Prevent Members from logging in (they only use QR codes)
         if user['user_level'] == 'Member':
             return jsonify({"error": "Members cannot log in. Please use QR code check-in."}), 403
 
+        # Later requests present this token instead of re-checking the role
+        token, expires_at = issue_token(user['username'], user['user_level'])
+
         return jsonify({
             "message": "Login successful",
-            "user": user
+            "user": user,
+            "token": token,
+            "expires_at": expires_at
         }), 200
 
+    except PasswordHasherBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -85,6 +139,7 @@ def register():
             (username, display_name, email, hashed_password, user_level),
             commit=True
         )
+        user_cache.invalidate(username)
 
         return jsonify({
             "message": "User registered successfully",
@@ -92,6 +147,8 @@ def register():
             "username": username
         }), 201
 
+    except PasswordHasherBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
     except Exception as e:
         if "Duplicate entry" in str(e):
             return jsonify({"error": "Username or email already exists"}), 409
@@ -0,0 +1,36 @@
+from flask import Response, current_app, stream_with_context
+
+# Rows serialized per chunk written to the client
+_ROWS_PER_CHUNK = 100
+
+def stream_json_list(key, rows, status=200):
+    """
+    Stream {"<key>": [row, ...]} to the client without building the list in memory
+
+    The first row is fetched before the response starts, so a failing query
+    still raises inside the caller's try block and becomes a normal error
+    response. Pass a generator from iter_query() as ``rows``.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    dumps = current_app.json.dumps
+
+    def generate():
+        try:
+            chunk = [f'{{"{key}": [']
+            if first is not None:
+                chunk.append(dumps(first))
+                for row in rows:
+                    chunk.append(',')
+                    chunk.append(dumps(row))
+                    if len(chunk) >= _ROWS_PER_CHUNK * 2:
+                        yield ''.join(chunk)
+                        chunk = []
+            chunk.append(']}\n')
+            yield ''.join(chunk)
+        finally:
+            close = getattr(rows, 'close', None)
+            if close is not None:
+                close()
+
+    return Response(stream_with_context(generate()), status=status, mimetype='application/json')
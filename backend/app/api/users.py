@@ -1,23 +1,19 @@
-from flask import Blueprint, request, jsonify
-from ..models.database import execute_query, get_connection
-import hashlib
+from flask import Blueprint, request, jsonify, g
+from ..models.database import execute_query, get_connection, iter_query, transaction
+from ..models.hierarchy import hierarchy
+from ..models.user_cache import find_user, user_cache
+from .auth import require_role
+from ..services.passwords import PasswordHasherBusy, hash_password, verify_password
+from ..services.rate_limit import login_rate_limit
+from .responses import stream_json_list
 
 users_bp = Blueprint('users', __name__)
 
-def hash_password(password):
-    """Simple password hashing (use bcrypt in production)"""
-    return hashlib.sha256(password.encode()).hexdigest()
-
 @users_bp.route('/<username>', methods=['GET'])
 def get_user(username):
     """Get user information by username"""
     try:
-        query = """
-            SELECT id, username, display_name, email, user_level, created_at
-            FROM users
-            WHERE username = %s
-        """
-        user = execute_query(query, (username,), fetch_one=True)
+        user = find_user(username)
 
         if not user:
             return jsonify({"error": "User not found"}), 404
@@ -32,15 +28,13 @@ def get_user(username):
 # =============================================
 
 @users_bp.route('/manager/<username>/leads', methods=['GET'])
+@require_role('Manager')
 def get_manager_leads(username):
     """Get all Leads managed by a Manager (or all Leads if super-user)"""
-    try:
-        # Verify the user is a Manager
-        user_query = "SELECT user_level FROM users WHERE username = %s"
-        user = execute_query(user_query, (username,), fetch_one=True)
+    if username != g.user['username']:
+        return jsonify({"error": "User is not the signed-in Manager"}), 403
 
-        if not user or user['user_level'] != 'Manager':
-            return jsonify({"error": "User is not a Manager"}), 403
+    try:
 
         # Managers see ALL Leads (super-user access)
         query = """
@@ -57,15 +51,13 @@ def get_manager_leads(username):
         return jsonify({"error": str(e)}), 500
 
 @users_bp.route('/manager/<username>/all-members', methods=['GET'])
+@require_role('Manager')
 def get_all_members(username):
     """Get all Members across all Leads (Manager only)"""
-    try:
-        # Verify the user is a Manager
-        user_query = "SELECT user_level FROM users WHERE username = %s"
-        user = execute_query(user_query, (username,), fetch_one=True)
+    if username != g.user['username']:
+        return jsonify({"error": "User is not the signed-in Manager"}), 403
 
-        if not user or user['user_level'] != 'Manager':
-            return jsonify({"error": "User is not a Manager"}), 403
+    try:
 
         # Get all Members with their assigned Lead
         query = """
@@ -93,8 +85,7 @@ def get_lead_members(username):
     """Get all Members assigned to a Lead"""
     try:
         # Verify the user is a Lead
-        user_query = "SELECT user_level FROM users WHERE username = %s"
-        user = execute_query(user_query, (username,), fetch_one=True)
+        user = find_user(username)
 
         if not user or user['user_level'] != 'Lead':
             return jsonify({"error": "User is not a Lead"}), 403
@@ -115,8 +106,12 @@ def get_lead_members(username):
         return jsonify({"error": str(e)}), 500
 
 @users_bp.route('/lead/<username>/members', methods=['POST'])
+@require_role('Lead')
 def add_member_to_lead(username):
     """Lead adds a new Member to their team"""
+    if username != g.user['username']:
+        return jsonify({"error": "Only Leads can add Members to their own team"}), 403
+
     data = request.get_json() or {}
     member_username = data.get('member_username')
     member_display_name = data.get('display_name')
@@ -126,30 +121,29 @@ def add_member_to_lead(username):
         return jsonify({"error": "member_username, display_name, and email are required"}), 400
 
     try:
-        # Verify the requester is a Lead
-        lead_query = "SELECT user_level FROM users WHERE username = %s"
-        lead = execute_query(lead_query, (username,), fetch_one=True)
+        # Create the Member and the assignment together so a failure cannot
+        # leave an unassigned Member behind
+        with transaction():
+            # Create the Member user (no password needed)
+            insert_user_query = """
+                INSERT INTO users (username, display_name, email, password, user_level)
+                VALUES (%s, %s, %s, '', 'Member')
+            """
+            user_id = execute_query(
+                insert_user_query,
+                (member_username, member_display_name, member_email),
+                commit=True
+            )
 
-        if not lead or lead['user_level'] != 'Lead':
-            return jsonify({"error": "Only Leads can add Members"}), 403
+            # Assign Member to Lead
+            assign_query = """
+                INSERT INTO lead_assignments (lead_username, member_username)
+                VALUES (%s, %s)
+            """
+            execute_query(assign_query, (username, member_username), commit=True)
 
-        # Create the Member user (no password needed)
-        insert_user_query = """
-            INSERT INTO users (username, display_name, email, password, user_level)
-            VALUES (%s, %s, %s, '', 'Member')
-        """
-        user_id = execute_query(
-            insert_user_query,
-            (member_username, member_display_name, member_email),
-            commit=True
-        )
-
-        # Assign Member to Lead
-        assign_query = """
-            INSERT INTO lead_assignments (lead_username, member_username)
-            VALUES (%s, %s)
-        """
-        execute_query(assign_query, (username, member_username), commit=True)
+        user_cache.invalidate(member_username)
+        hierarchy.assign_member(username, member_username)
 
         return jsonify({
             "message": "Member created and assigned successfully",
@@ -166,6 +160,7 @@ def add_member_to_lead(username):
                     VALUES (%s, %s)
                 """
                 execute_query(assign_query, (username, member_username), commit=True)
+                hierarchy.assign_member(username, member_username)
                 return jsonify({
                     "message": "Existing Member assigned successfully",
                     "member_username": member_username
@@ -177,24 +172,15 @@ def add_member_to_lead(username):
         return jsonify({"error": str(e)}), 500
 
 @users_bp.route('/lead/<username>/members/<member_username>', methods=['DELETE'])
+@require_role('Lead')
 def remove_member_from_lead(username, member_username):
     """Lead removes a Member from their team"""
-    try:
-        # Verify the requester is a Lead
-        lead_query = "SELECT user_level FROM users WHERE username = %s"
-        lead = execute_query(lead_query, (username,), fetch_one=True)
-
-        if not lead or lead['user_level'] != 'Lead':
-            return jsonify({"error": "Only Leads can remove Members"}), 403
+    if username != g.user['username']:
+        return jsonify({"error": "Only Leads can remove Members from their own team"}), 403
 
+    try:
         # Verify the Member is assigned to this Lead
-        check_query = """
-            SELECT id FROM lead_assignments
-            WHERE lead_username = %s AND member_username = %s
-        """
-        assignment = execute_query(check_query, (username, member_username), fetch_one=True)
-
-        if not assignment:
+        if not hierarchy.is_member_of(username, member_username):
             return jsonify({"error": "Member not found in your team"}), 404
 
         # Remove assignment
@@ -203,6 +189,7 @@ def remove_member_from_lead(username, member_username):
             WHERE lead_username = %s AND member_username = %s
         """
         execute_query(delete_assignment_query, (username, member_username), commit=True)
+        hierarchy.unassign_member(username, member_username)
 
         # Optionally delete the Member user entirely (they're orphaned now)
         # Uncomment this if you want to delete the Member when unassigned:
@@ -221,59 +208,43 @@ def remove_member_from_lead(username, member_username):
 # =============================================
 
 @users_bp.route('/', methods=['GET'])
+@require_role('Manager')
 def list_users():
     """List all users - Manager only"""
-    manager_username = request.args.get('manager_username')
-
-    if not manager_username:
-        return jsonify({"error": "manager_username parameter is required"}), 400
-
     try:
-        # Verify the requester is a Manager
-        manager_query = "SELECT user_level FROM users WHERE username = %s"
-        manager = execute_query(manager_query, (manager_username,), fetch_one=True)
-
-        if not manager or manager['user_level'] != 'Manager':
-            return jsonify({"error": "Only Managers can list users"}), 403
-
-        # Get all users
+        # Get all users (streamed, the table is unbounded)
         query = """
             SELECT id, username, display_name, email, user_level, created_at
             FROM users
             ORDER BY user_level, created_at DESC
         """
-        users = execute_query(query, fetch_all=True)
+        users = iter_query(query)
 
-        return jsonify({"users": users}), 200
+        return stream_json_list("users", users)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @users_bp.route('/', methods=['POST'])
+@require_role('Manager', 'Lead')
 def create_user():
     """Create a new user - Manager creates Leads, Leads create Members"""
     data = request.get_json() or {}
-    requester_username = data.get('requester_username')
+    requester = g.user
+    requester_username = requester['username']
     username = data.get('username')
     display_name = data.get('display_name')
     email = data.get('email')
     password = data.get('password')
     user_level = data.get('user_level', 'Member')
 
-    if not all([requester_username, username, display_name, email]):
-        return jsonify({"error": "requester_username, username, display_name, and email are required"}), 400
+    if not all([username, display_name, email]):
+        return jsonify({"error": "username, display_name, and email are required"}), 400
 
     if user_level not in ['Manager', 'Lead', 'Member']:
         return jsonify({"error": "user_level must be 'Manager', 'Lead', or 'Member'"}), 400
 
     try:
-        # Verify the requester's permissions
-        requester_query = "SELECT user_level FROM users WHERE username = %s"
-        requester = execute_query(requester_query, (requester_username,), fetch_one=True)
-
-        if not requester:
-            return jsonify({"error": "Requester not found"}), 404
-
         # Authorization check
         if requester['user_level'] == 'Manager':
             # Managers can create Leads and Members
@@ -295,24 +266,29 @@ def create_user():
         else:
             hashed_password = hash_password(password)
 
-        # Insert new user
-        insert_query = """
-            INSERT INTO users (username, display_name, email, password, user_level)
-            VALUES (%s, %s, %s, %s, %s)
-        """
-        user_id = execute_query(
-            insert_query,
-            (username, display_name, email, hashed_password, user_level),
-            commit=True
-        )
+        with transaction():
+            # Insert new user
+            insert_query = """
+                INSERT INTO users (username, display_name, email, password, user_level)
+                VALUES (%s, %s, %s, %s, %s)
+            """
+            user_id = execute_query(
+                insert_query,
+                (username, display_name, email, hashed_password, user_level),
+                commit=True
+            )
+
+            # If Lead created a Member, auto-assign to that Lead
+            if requester['user_level'] == 'Lead' and user_level == 'Member':
+                assign_query = """
+                    INSERT INTO lead_assignments (lead_username, member_username)
+                    VALUES (%s, %s)
+                """
+                execute_query(assign_query, (requester_username, username), commit=True)
 
-        # If Lead created a Member, auto-assign to that Lead
+        user_cache.invalidate(username)
         if requester['user_level'] == 'Lead' and user_level == 'Member':
-            assign_query = """
-                INSERT INTO lead_assignments (lead_username, member_username)
-                VALUES (%s, %s)
-            """
-            execute_query(assign_query, (requester_username, username), commit=True)
+            hierarchy.assign_member(requester_username, username)
 
         return jsonify({
             "message": "User created successfully",
@@ -320,54 +296,43 @@ def create_user():
             "username": username
         }), 201
 
+    except PasswordHasherBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
     except Exception as e:
         if "Duplicate entry" in str(e):
             return jsonify({"error": "Username or email already exists"}), 409
         return jsonify({"error": str(e)}), 500
 
 @users_bp.route('/<username>', methods=['DELETE'])
+@require_role('Manager')
 def delete_user(username):
     """Delete a user - Manager only (can delete Leads or Members)"""
-    data = request.get_json() or {}
-    manager_username = data.get('manager_username')
-
-    if not manager_username:
-        return jsonify({"error": "manager_username is required"}), 400
+    manager_username = g.user['username']
 
     try:
-        # Verify the requester is a Manager
-        manager_query = "SELECT user_level FROM users WHERE username = %s"
-        manager = execute_query(manager_query, (manager_username,), fetch_one=True)
-
-        if not manager or manager['user_level'] != 'Manager':
-            return jsonify({"error": "Only Managers can delete users"}), 403
-
         # Prevent deleting yourself
         if manager_username == username:
             return jsonify({"error": "You cannot delete your own account"}), 400
 
         # Check if user exists
-        user_query = "SELECT username, user_level FROM users WHERE username = %s"
-        user = execute_query(user_query, (username,), fetch_one=True)
+        user = find_user(username)
 
         if not user:
             return jsonify({"error": "User not found"}), 404
 
         # Additional checks for Leads with Members
         if user['user_level'] == 'Lead':
-            member_count_query = """
-                SELECT COUNT(*) as count FROM lead_assignments
-                WHERE lead_username = %s
-            """
-            member_count = execute_query(member_count_query, (username,), fetch_one=True)
-            if member_count and member_count['count'] > 0:
+            member_count = len(hierarchy.members_of(username))
+            if member_count > 0:
                 return jsonify({
-                    "error": f"Cannot delete Lead with {member_count['count']} assigned Members. Reassign or remove Members first."
+                    "error": f"Cannot delete Lead with {member_count} assigned Members. Reassign or remove Members first."
                 }), 400
 
         # Delete user (CASCADE will handle related records)
         delete_query = "DELETE FROM users WHERE username = %s"
         execute_query(delete_query, (username,), commit=True)
+        user_cache.invalidate(username)
+        hierarchy.remove_user(username)
 
         return jsonify({"message": f"User {username} deleted successfully"}), 200
 
@@ -390,15 +355,13 @@ def assign_lead_to_manager():
 
     try:
         # Verify manager exists and is a Manager
-        manager_query = "SELECT user_level FROM users WHERE username = %s"
-        manager = execute_query(manager_query, (manager_username,), fetch_one=True)
+        manager = find_user(manager_username)
 
         if not manager or manager['user_level'] != 'Manager':
             return jsonify({"error": "Invalid Manager username"}), 400
 
         # Verify lead exists and is a Lead
-        lead_query = "SELECT user_level FROM users WHERE username = %s"
-        lead = execute_query(lead_query, (lead_username,), fetch_one=True)
+        lead = find_user(lead_username)
 
         if not lead or lead['user_level'] != 'Lead':
             return jsonify({"error": "Invalid Lead username"}), 400
@@ -409,6 +372,7 @@ def assign_lead_to_manager():
             VALUES (%s, %s)
         """
         execute_query(insert_query, (manager_username, lead_username), commit=True)
+        hierarchy.assign_lead(manager_username, lead_username)
 
         return jsonify({"message": "Lead assigned to Manager successfully"}), 201
 
@@ -429,30 +393,24 @@ def assign_member_to_lead():
 
     try:
         # Verify lead exists and is a Lead
-        lead_query = "SELECT user_level FROM users WHERE username = %s"
-        lead = execute_query(lead_query, (lead_username,), fetch_one=True)
+        lead = find_user(lead_username)
 
         if not lead or lead['user_level'] != 'Lead':
             return jsonify({"error": "Invalid Lead username"}), 400
 
         # Verify member exists and is a Member
-        member_query = "SELECT user_level FROM users WHERE username = %s"
-        member = execute_query(member_query, (member_username,), fetch_one=True)
+        member = find_user(member_username)
 
         if not member or member['user_level'] != 'Member':
             return jsonify({"error": "Invalid Member username"}), 400
 
         # Members can only be assigned to one Lead
         # Check if already assigned
-        existing_query = """
-            SELECT lead_username FROM lead_assignments
-            WHERE member_username = %s
-        """
-        existing = execute_query(existing_query, (member_username,), fetch_one=True)
+        existing = hierarchy.leads_of_member(member_username)
 
         if existing:
             return jsonify({
-                "error": f"Member already assigned to Lead: {existing['lead_username']}"
+                "error": f"Member already assigned to Lead: {', '.join(sorted(existing))}"
             }), 400
 
         # Create assignment
@@ -461,6 +419,7 @@ def assign_member_to_lead():
             VALUES (%s, %s)
         """
         execute_query(insert_query, (lead_username, member_username), commit=True)
+        hierarchy.assign_member(lead_username, member_username)
 
         return jsonify({"message": "Member assigned to Lead successfully"}), 201
 
@@ -474,6 +433,7 @@ def assign_member_to_lead():
 # =============================================
 
 @users_bp.route('/<username>/change-password', methods=['PUT'])
+@login_rate_limit
 def change_password(username):
     """Change user password - Manager and Lead only (Members don't have passwords)"""
     data = request.get_json() or {}
@@ -488,14 +448,14 @@ def change_password(username):
 
     try:
         # Verify old password
-        hashed_old_password = hash_password(old_password)
         verify_query = """
-            SELECT username, user_level FROM users
-            WHERE username = %s AND password = %s
+            SELECT username, user_level, password FROM users
+            WHERE username = %s
         """
-        user = execute_query(verify_query, (username, hashed_old_password), fetch_one=True)
+        user = execute_query(verify_query, (username,), fetch_one=True)
+        matches, _ = verify_password(old_password, user['password'] if user else None)
 
-        if not user:
+        if not matches:
             return jsonify({"error": "Current password is incorrect"}), 401
 
         # Members don't have passwords
@@ -506,43 +466,39 @@ def change_password(username):
         hashed_new_password = hash_password(new_password)
         update_query = "UPDATE users SET password = %s WHERE username = %s"
         execute_query(update_query, (hashed_new_password, username), commit=True)
+        user_cache.invalidate(username)
 
         return jsonify({
             "message": "Password changed successfully",
             "username": username
         }), 200
 
+    except PasswordHasherBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @users_bp.route('/<username>/role', methods=['PUT'])
+@require_role('Manager')
 def update_user_role(username):
     """Update a user's role - Manager only"""
     data = request.get_json() or {}
-    manager_username = data.get('manager_username')
+    manager_username = g.user['username']
     new_role = data.get('user_level')
 
-    if not manager_username or not new_role:
-        return jsonify({"error": "manager_username and user_level are required"}), 400
+    if not new_role:
+        return jsonify({"error": "user_level is required"}), 400
 
     if new_role not in ['Manager', 'Lead', 'Member']:
         return jsonify({"error": "user_level must be 'Manager', 'Lead', or 'Member'"}), 400
 
     try:
-        # Verify the requester is a Manager
-        manager_query = "SELECT user_level FROM users WHERE username = %s"
-        manager = execute_query(manager_query, (manager_username,), fetch_one=True)
-
-        if not manager or manager['user_level'] != 'Manager':
-            return jsonify({"error": "Only Managers can update user roles"}), 403
-
         # Prevent changing your own role
         if manager_username == username:
             return jsonify({"error": "You cannot change your own role"}), 400
 
         # Check if user exists
-        user_query = "SELECT username, user_level FROM users WHERE username = %s"
-        user = execute_query(user_query, (username,), fetch_one=True)
+        user = find_user(username)
 
         if not user:
             return jsonify({"error": "User not found"}), 404
@@ -550,6 +506,7 @@ def update_user_role(username):
         # Update user role
         update_query = "UPDATE users SET user_level = %s WHERE username = %s"
         execute_query(update_query, (new_role, username), commit=True)
+        user_cache.invalidate(username)
 
         return jsonify({
             "message": f"User {username} role updated to {new_role}",
@@ -1,52 +1,656 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import partial, wraps
+from itertools import count, islice
+
 import mysql.connector
 from mysql.connector import Error
+from flask import g, has_app_context, has_request_context, jsonify, request, session
+
 from ..config import Config
+from .pool import ConnectionPool, PoolTimeout
+from .query_stats import QueryStats
+from .resilience import (
+    ER_QUERY_TIMEOUT, CircuitBreaker, DatabaseUnavailable, QueryTimeout, is_connection_lost, with_backoff
+)
+from .dialect import get_dialect as select_dialect
+from .statements import get_statement_cache_stats
+
+# Errors after which a connection can no longer be trusted and must not go back to the pool
+_BROKEN_CONNECTION_ERRORS = (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError)
+
+# Single-row VALUES (...) clause of an INSERT/REPLACE, plus any trailing clause (ON DUPLICATE KEY UPDATE ...)
+_VALUES_CLAUSE = re.compile(r"\bVALUES\s*(\((?:[^()]|\([^()]*\))*\))(.*)$", re.IGNORECASE | re.DOTALL)
+_INSERT_STATEMENT = re.compile(r"^\s*(INSERT|REPLACE)\b", re.IGNORECASE)
+
+# Session key holding the time until which this session's reads stay on the primary
+_PRIMARY_PIN_KEY = '_db_primary_until'
+
+replica_log = logging.getLogger('app.sql.replica')
+retry_log = logging.getLogger('app.sql.retry')
+
+_dialect = None
+_pool = None
+_replica_pools = []
+_replica_turn = count()
+_pool_lock = threading.RLock()
+
+# Per-process query timings, aggregated per SQL fingerprint and per endpoint
+query_stats = QueryStats(slow_threshold_ms=Config.SLOW_QUERY_MS, window=Config.QUERY_STATS_WINDOW)
+
+# Connection and transaction state for code running outside a Flask app context
+_thread_scope = threading.local()
+
+
+def get_dialect():
+    """Return the SQL dialect (MySQL or embedded SQLite) this process talks to"""
+    global _dialect
+    if _dialect is None:
+        with _pool_lock:
+            if _dialect is None:
+                _dialect = select_dialect()
+    return _dialect
+
+
+def _new_pool(connect):
+    """Build a pool whose connects back off on failure behind their own circuit breaker"""
+    return ConnectionPool(
+        with_backoff(connect, retries=Config.DB_CONNECT_RETRIES, base_delay=Config.DB_CONNECT_BACKOFF),
+        size=Config.DB_POOL_SIZE,
+        timeout=Config.DB_POOL_TIMEOUT,
+        recycle=Config.DB_POOL_RECYCLE,
+        breaker=CircuitBreaker(threshold=Config.DB_BREAKER_THRESHOLD, reset_timeout=Config.DB_BREAKER_RESET),
+    )
+
+
+def get_pool():
+    """Return this process's connection pool, creating it on first use"""
+    global _pool
+    pool = _pool
+    # A pool inherited across fork() shares sockets with the parent; start fresh
+    if pool is None or pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = _new_pool(get_dialect().connect)
+            pool = _pool
+    return pool
+
+
+def get_replica_pools():
+    """Return this process's read-replica pools; empty unless DB_REPLICAS is set and the engine is MySQL"""
+    global _replica_pools
+    pools = _replica_pools
+    if pools and pools[0].pid == os.getpid():
+        return pools
+    if not Config.DB_REPLICAS or get_dialect().name != 'mysql':
+        return []
+
+    with _pool_lock:
+        if not _replica_pools or _replica_pools[0].pid != os.getpid():
+            dialect = get_dialect()
+            _replica_pools = [
+                _new_pool(partial(dialect.connect, db_config))
+                for db_config in Config.get_replica_configs()
+            ]
+        return _replica_pools
+
+
+def get_pool_stats():
+    """Return usage statistics for the connection pool"""
+    return get_pool().stats()
+
+
+def get_breaker_state():
+    """Return the primary's circuit breaker state: 'closed', 'open' or 'half_open'"""
+    return get_pool().breaker.state
+
+
+def get_replica_pool_stats():
+    """Return usage statistics for each read-replica pool"""
+    return [pool.stats() for pool in get_replica_pools()]
+
+
+def _scope():
+    """Return the object holding connection state: flask.g in a request, else a thread-local"""
+    return g if has_app_context() else _thread_scope
+
+
+def _acquire():
+    """Check a connection out of the primary pool, remembering a breaker rejection for the response"""
+    try:
+        return get_pool().acquire(priority=getattr(_scope(), 'db_priority', False))
+    except DatabaseUnavailable as e:
+        if has_request_context():
+            g.db_unavailable = e
+        raise
+
 
 def get_connection():
-    """Create and return a database connection"""
+    """
+    Return the current request's pooled connection
+
+    The connection is checked out on first use and returned to the pool when
+    the application context is torn down. Outside of an application context a
+    connection is checked out directly; return it with release_connection().
+    """
+    if not has_app_context():
+        connection = getattr(_thread_scope, 'db_connection', None)
+        return connection if connection is not None else _acquire()
+
+    connection = g.get('db_connection')
+    if connection is None:
+        connection = _acquire()
+        g.db_connection = connection
+    return connection
+
+
+def prioritize_connections():
+    """
+    Serve this thread's pool checkouts before waiting requests
+
+    For background threads that requests block on, such as the
+    group-commit flusher: queued behind the requests they serve, they
+    would stall every one of them.
+    """
+    _thread_scope.db_priority = True
+
+
+def release_connection(connection, discard=False):
+    """Return a connection obtained outside of a request to the pool"""
+    get_pool().release(connection, discard=discard)
+
+
+def release_request_connections():
+    """
+    Return the request's connections to their pools ahead of teardown
+
+    For a request about to block (e.g. a long poll) outside a transaction;
+    its next query checks a connection out again.
+    """
+    connection = g.pop('db_connection', None)
+    if connection is not None:
+        get_pool().release(connection)
+
+    replica = g.pop('db_replica_connection', None)
+    if replica is not None:
+        g.pop('db_replica_pool').release(replica)
+
+
+def close_request_connection(exception=None):
+    """Teardown handler returning the request's connections to their pools"""
+    g.pop('db_tx_depth', None)
+    g.pop('db_tx_broken', None)
+    g.pop('db_wrote', None)
+    g.pop('db_primary_only', None)
+    release_request_connections()
+
+
+def read_from_primary():
+    """Send the rest of the request's reads to the primary, e.g. to see a write just announced by another worker"""
+    g.db_primary_only = True
+
+
+def _record_request_queries(exception=None):
+    """Teardown handler counting the statements issued by the finished request"""
+    query_stats.record_request(request.endpoint or '<unmatched>', g.pop('db_queries', 0))
+
+
+def _unavailable_response(retry_after):
+    response = jsonify({"error": "Database temporarily unavailable, please retry shortly"})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(max(1, round(retry_after)))
+    return response
+
+
+def _fail_fast_while_unavailable():
+    """Before-request hook: answer API calls with 503 while the circuit breaker is open"""
+    if request.path.startswith('/api/'):
+        retry_after = get_pool().breaker.retry_after()
+        if retry_after:
+            return _unavailable_response(retry_after)
+
+
+def _report_unavailable(response):
+    """
+    After-request hook turning an error caused by an open breaker into a 503
+
+    The blueprints catch every exception and answer 500; a breaker
+    rejection is transient, so tell the client when to come back instead.
+    """
+    error = g.pop('db_unavailable', None)
+    if error is not None and response.status_code >= 500:
+        return _unavailable_response(error.retry_after)
+    return response
+
+
+def init_app(app):
+    """Register the request-scoped connection handling on the Flask app"""
+    app.before_request(_fail_fast_while_unavailable)
+    app.after_request(_report_unavailable)
+    app.register_error_handler(DatabaseUnavailable, lambda e: _unavailable_response(e.retry_after))
+    app.teardown_request(_record_request_queries)
+    app.teardown_appcontext(close_request_connection)
+
+
+def _mark_write(scope):
+    """Pin the rest of this request, and this session for a while, to the primary"""
+    scope.db_wrote = True
+    if (has_request_context() and Config.DB_PRIMARY_STICKY_SECONDS > 0
+            and get_replica_pools()):
+        session[_PRIMARY_PIN_KEY] = time.time() + Config.DB_PRIMARY_STICKY_SECONDS
+
+
+def _reads_from_replica(scope):
+    """
+    True when a read may go to a replica
+
+    Only request reads are routed. They stay on the primary inside a
+    transaction and once the request or, within DB_PRIMARY_STICKY_SECONDS,
+    its session has written, so users always see their own changes.
+    """
+    if not has_request_context() or not get_replica_pools():
+        return False
+    if getattr(scope, 'db_tx_depth', 0) or getattr(scope, 'db_wrote', False) or getattr(scope, 'db_primary_only', False):
+        return False
+    return session.get(_PRIMARY_PIN_KEY, 0) <= time.time()
+
+
+def _acquire_replica():
+    """Check out a connection from the next replica in turn; returns (pool, connection) or (None, None)"""
+    pools = get_replica_pools()
+    start = next(_replica_turn)
+    for offset in range(len(pools)):
+        pool = pools[(start + offset) % len(pools)]
+        try:
+            return pool, pool.acquire()
+        except Error as e:
+            replica_log.warning("Replica unavailable: %s", e)
+    return None, None
+
+
+def _replica_connection():
+    """Return the request's replica connection, checking one out on first use; None if no replica is reachable"""
+    connection = g.get('db_replica_connection')
+    if connection is None:
+        pool, connection = _acquire_replica()
+        if connection is not None:
+            g.db_replica_connection = connection
+            g.db_replica_pool = pool
+    return connection
+
+
+@contextmanager
+def _checkout(readonly=False):
+    """
+    Yield a connection for one statement, reusing the request's or transaction's connection
+
+    Reads (``readonly=True``) use the request's replica connection when
+    replicas are configured and nothing pins the request to the primary;
+    if no replica is reachable they fall back to the primary.
+    """
+    scope = _scope()
+    replica = _replica_connection() if readonly and _reads_from_replica(scope) else None
+    if replica is not None:
+        try:
+            yield replica
+        except _BROKEN_CONNECTION_ERRORS:
+            g.pop('db_replica_connection', None)
+            g.pop('db_replica_pool').release(replica, discard=True)
+            raise
+        return
+
+    connection = getattr(scope, 'db_connection', None)
+    owned = False
+    if connection is None:
+        connection = _acquire()
+        if has_app_context():
+            g.db_connection = connection
+        else:
+            owned = True
+
     try:
-        connection = mysql.connector.connect(**Config.get_db_config())
-        return connection
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
+        yield connection
+    except BaseException as e:
+        broken = isinstance(e, _BROKEN_CONNECTION_ERRORS)
+        if getattr(scope, 'db_tx_depth', 0):
+            # The connection belongs to the checkout of the enclosing
+            # transaction(), which discards it (once) when the block ends,
+            # even if the error is caught or turned into another one on the way
+            if broken:
+                scope.db_tx_broken = True
+            raise
+        _finish_checkout(scope, connection, owned, broken)
         raise
+    else:
+        _finish_checkout(scope, connection, owned, False)
+
+
+def _finish_checkout(scope, connection, owned, broken):
+    """Release a statement's or transaction's connection, discarding it if it broke"""
+    if getattr(scope, 'db_tx_broken', False):
+        scope.db_tx_broken = False
+        broken = True
+    if broken:
+        # Never hand a half-dead connection back to the pool
+        if not owned:
+            scope.db_connection = None
+        release_connection(connection, discard=True)
+    elif owned:
+        release_connection(connection)
+
+
+@contextmanager
+def transaction():
+    """
+    Run several statements on one connection and commit them once
+
+    Every execute_query() call made inside the block shares the same
+    connection and transaction; commit=True statements are applied when the
+    block exits normally and rolled back together if it raises. Nested
+    blocks join the outermost transaction.
+
+    Usage:
+        with transaction():
+            execute_query(insert_query, params, commit=True)
+            execute_query(update_query, params, commit=True)
+    """
+    scope = _scope()
+    if getattr(scope, 'db_tx_depth', 0):
+        scope.db_tx_depth += 1
+        try:
+            yield scope.db_connection
+        finally:
+            scope.db_tx_depth -= 1
+        return
+
+    with _checkout() as conn:
+        scope.db_connection = conn
+        conn.start_transaction()
+        scope.db_tx_depth = 1
+        try:
+            yield conn
+        except BaseException:
+            try:
+                conn.rollback()
+            except _BROKEN_CONNECTION_ERRORS:
+                # Keep the original error, but do not pool the connection
+                scope.db_tx_broken = True
+            except Error:
+                pass
+            raise
+        else:
+            conn.commit()
+        finally:
+            scope.db_tx_depth = 0
+            if not has_app_context():
+                scope.db_connection = None
+
+
+def query_timeout(timeout_ms):
+    """
+    View decorator setting the time budget for the request's statements
+
+    Every execute_query() call made while handling the request defaults to
+    ``timeout_ms`` instead of Config.QUERY_TIMEOUT_MS.
+
+    Usage:
+        @attendance_bp.route('/check-in', methods=['POST'])
+        @query_timeout(Config.QUERY_TIMEOUT_HOT_MS)
+        def check_in():
+            ...
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.query_timeout_ms = timeout_ms
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
 
-def execute_query(query, params=None, fetch_one=False, fetch_all=False, commit=False):
+def _query_budget(timeout_ms):
+    """Resolve a statement's budget: the call's, else the endpoint's, else the default"""
+    if timeout_ms is None and has_app_context():
+        timeout_ms = g.get('query_timeout_ms')
+    return Config.QUERY_TIMEOUT_MS if timeout_ms is None else timeout_ms
+
+
+def _timed_out(error, elapsed, budget):
+    """True if ``error`` is the server or the client cancelling a statement at its budget"""
+    if getattr(error, 'errno', None) == ER_QUERY_TIMEOUT:
+        return True
+    return bool(budget) and is_connection_lost(error) and elapsed * 1000 >= budget
+
+
+def execute_query(query, params=None, fetch_one=False, fetch_all=False, commit=False, timeout_ms=None):
     """
     Execute a database query with proper connection handling
 
+    Pooled connections run in autocommit mode, so a write issued with
+    commit=True is durable as soon as the statement returns. Inside a
+    transaction() block the write is committed with the rest of the block.
+    Fetches may be served by a read replica (see DB_REPLICAS); writes always
+    go to the primary and pin the session's later reads to it. A fetch
+    outside a transaction whose connection is lost mid-statement ("server
+    has gone away") is retried once on a fresh connection.
+
+    Each statement runs under a time budget (see query_timeout()); one
+    cancelled for exceeding it raises QueryTimeout and is counted in the
+    query statistics.
+
     Args:
         query: SQL query string
         params: Query parameters (tuple)
         fetch_one: Return single row as dictionary
         fetch_all: Return all rows as list of dictionaries
         commit: Commit the transaction
+        timeout_ms: Time budget for this statement, overriding the endpoint's (0 disables)
 
     Returns:
         Query results or None
     """
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+    result = _execute(query, params, fetch_one, fetch_all, commit, timeout_ms)
+    return result.lastrowid if commit else result
 
-    try:
-        cursor.execute(query, params or ())
 
-        if commit:
-            conn.commit()
-            return cursor.lastrowid
+# Outcome of execute_write(): the new row's id and the number of rows changed
+WriteResult = namedtuple('WriteResult', ['lastrowid', 'rowcount'])
 
-        if fetch_one:
-            result = cursor.fetchone()
-            return result
 
-        if fetch_all:
-            result = cursor.fetchall()
-            return result
+def execute_write(query, params=None, timeout_ms=None):
+    """
+    Execute an INSERT/UPDATE/DELETE and report how many rows it changed
+
+    Like execute_query(..., commit=True), but returns a WriteResult so the
+    caller can tell a conditional write that applied from one that did not,
+    e.g. an ``INSERT ... ON DUPLICATE KEY UPDATE id = id`` that hit an
+    existing row (rowcount 0; translated to ON CONFLICT DO NOTHING on
+    SQLite) without a second round trip.
+
+    Returns:
+        WriteResult(lastrowid, rowcount)
+    """
+    return _execute(query, params, False, False, True, timeout_ms)
+
 
+def _execute(query, params, fetch_one, fetch_all, commit, timeout_ms):
+    """Run a statement for execute_query()/execute_write() with the read retry and time budget"""
+    budget = _query_budget(timeout_ms)
+    retry = not commit and not getattr(_scope(), 'db_tx_depth', 0)
+    started = time.perf_counter()
+    try:
+        try:
+            return _run_query(query, params, fetch_one, fetch_all, commit, budget)
+        except _BROKEN_CONNECTION_ERRORS as e:
+            if not retry or not is_connection_lost(e) or _timed_out(e, time.perf_counter() - started, budget):
+                raise
+            retry_log.warning("Connection lost during read, retrying once: %s", e)
+        started = time.perf_counter()
+        return _run_query(query, params, fetch_one, fetch_all, commit, budget)
     except Error as e:
-        if commit:
-            conn.rollback()
-        raise e
+        elapsed = time.perf_counter() - started
+        if not _timed_out(e, elapsed, budget):
+            raise
+        query_stats.record_timeout(query, params, elapsed, budget)
+        raise QueryTimeout(budget) from e
+
+
+def _run_query(query, params, fetch_one, fetch_all, commit, timeout_ms):
+    """Run one statement for _execute() on a checked-out connection"""
+    with _checkout(readonly=not commit) as conn:
+        statements = getattr(conn, 'statement_cache', None)
+        started = time.perf_counter()
+        rows = 0
+        cursor = None
+        try:
+            with get_dialect().time_limit(conn, query, timeout_ms) as statement:
+                if statements is not None:
+                    cursor = statements.execute(statement, params)
+                else:
+                    cursor = conn.cursor(dictionary=True)
+                    cursor.execute(statement, params or ())
+
+                # Always read the full result so the connection is never handed on with unread rows
+                result = cursor.fetchall() if cursor.with_rows else None
+
+            if commit:
+                rows = max(cursor.rowcount, 0)
+                _mark_write(_scope())
+                return WriteResult(cursor.lastrowid, rows)
+
+            if fetch_one:
+                rows = 1 if result else 0
+                return result[0] if result else None
+
+            if fetch_all:
+                rows = len(result)
+                return result
+
+        finally:
+            # Cached statements stay open for reuse on this connection
+            if cursor is not None and statements is None:
+                cursor.close()
+            query_stats.record(query, params, time.perf_counter() - started, rows)
+
+
+def iter_query(query, params=None, batch_size=None):
+    """
+    Stream the rows of a SELECT without buffering the whole result set
+
+    Rows are pulled from an unbuffered cursor in fetchmany() batches, so
+    memory stays bounded by the batch size. A dedicated pooled connection is
+    held for the whole iteration, because an unread result set blocks every
+    other statement on its connection; it is returned when iteration
+    finishes or the generator is closed. Rows are read outside of any
+    transaction() the caller has open, from a read replica when one is
+    configured and the session is not pinned to the primary.
+
+    Args:
+        query: SQL query string
+        params: Query parameters (tuple)
+        batch_size: Rows fetched per round trip (defaults to Config.DB_STREAM_BATCH_SIZE)
+
+    Yields:
+        Rows as dictionaries
+    """
+    batch_size = batch_size or Config.DB_STREAM_BATCH_SIZE
+    started = time.perf_counter()
+    rows = 0
+    exhausted = False
+    pool, connection, cursor = _start_stream(query, params)
+    try:
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            rows += len(batch)
+            yield from batch
+        exhausted = True
     finally:
-        cursor.close()
-        conn.close()
+        # An abandoned or broken stream leaves unread rows on the wire;
+        # dropping the connection is cheaper than draining a large result set
+        if exhausted:
+            cursor.close()
+        pool.release(connection, discard=not exhausted)
+        query_stats.record(query, params, time.perf_counter() - started, rows)
+
+
+def _start_stream(query, params):
+    """
+    Check out a dedicated connection for iter_query() and start the SELECT on it
+
+    Nothing has been yielded yet, so a connection lost at this point is
+    retried once on a fresh connection, like any other read.
+
+    Returns:
+        (pool, connection, cursor)
+    """
+    for attempt in range(2):
+        pool, connection = _acquire_replica() if _reads_from_replica(_scope()) else (None, None)
+        if connection is None:
+            pool, connection = get_pool(), _acquire()
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(query, params or ())
+            return pool, connection, cursor
+        except Exception as e:
+            pool.release(connection, discard=True)
+            if attempt or not isinstance(e, _BROKEN_CONNECTION_ERRORS) or not is_connection_lost(e):
+                raise
+            retry_log.warning("Connection lost starting a stream, retrying once: %s", e)
+
+
+def execute_many(query, rows, chunk_size=None):
+    """
+    Write many rows in few round trips, all inside one transaction
+
+    An INSERT/REPLACE written for a single row (``VALUES (%s, %s)``) is
+    rewritten into multi-row statements of up to ``chunk_size`` rows each.
+    Other statements (UPDATE, DELETE) run once per row through
+    executemany(). Joins the caller's transaction() if one is open.
+
+    Args:
+        query: SQL statement written for one row
+        rows: Iterable of parameter tuples
+        chunk_size: Rows per statement (defaults to Config.DB_BULK_CHUNK_SIZE)
+
+    Returns:
+        List of affected row counts, one per chunk
+    """
+    chunk_size = chunk_size or Config.DB_BULK_CHUNK_SIZE
+    values = _VALUES_CLAUSE.search(query) if _INSERT_STATEMENT.match(query) else None
+    rows = iter(rows)
+    counts = []
+
+    with transaction() as conn:
+        cursor = conn.cursor()
+        try:
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+
+                started = time.perf_counter()
+                if values is not None:
+                    statement = (
+                        query[:values.start(1)]
+                        + ', '.join([values.group(1)] * len(chunk))
+                        + values.group(2)
+                    )
+                    cursor.execute(statement, [param for row in chunk for param in row])
+                else:
+                    statement = query
+                    cursor.executemany(statement, chunk)
+                affected = max(cursor.rowcount, 0)
+                query_stats.record(statement, chunk[0], time.perf_counter() - started, affected)
+                counts.append(affected)
+        finally:
+            cursor.close()
+
+    _mark_write(_scope())
+    return counts
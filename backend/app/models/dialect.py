@@ -0,0 +1,360 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import lru_cache
+
+import mysql.connector
+from mysql.connector import errors
+
+from ..config import Config
+from .resilience import ER_QUERY_TIMEOUT
+from .statements import StatementCache
+
+SQLITE_SCHEMA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'database', 'init_database_sqlite.sql'
+)
+
+# MySQL error number for a duplicate key, matched by the "Duplicate entry" checks in the blueprints
+ER_DUP_ENTRY = 1062
+
+_SELECT_KEYWORD = re.compile(r"^\s*SELECT\b", re.IGNORECASE)
+
+# SQLite virtual machine instructions between deadline checks
+_PROGRESS_STEPS = 10000
+
+
+class MySQLDialect:
+    """The production engine: statements are sent to MySQL unchanged"""
+
+    name = 'mysql'
+
+    def connect(self, db_config=None):
+        """Open a new MySQL connection (to the primary unless ``db_config`` is given), with its own prepared-statement cache"""
+        try:
+            connection = mysql.connector.connect(
+                autocommit=True,
+                connection_timeout=Config.DB_CONNECT_TIMEOUT,
+                **(db_config or Config.get_db_config())
+            )
+        except errors.Error as e:
+            print(f"Error connecting to MySQL: {e}")
+            raise
+
+        if Config.DB_STATEMENT_CACHE_SIZE > 0:
+            connection.statement_cache = StatementCache(connection, Config.DB_STATEMENT_CACHE_SIZE)
+        return connection
+
+    def translate(self, query):
+        return query
+
+    @contextmanager
+    def time_limit(self, connection, query, timeout_ms):
+        """
+        Bound one statement to ``timeout_ms`` and yield the SQL to run
+
+        SELECTs get a MAX_EXECUTION_TIME optimizer hint, so the server
+        cancels them with error 3024. With the pure-Python driver the socket
+        read timeout is also set to the budget plus QUERY_TIMEOUT_GRACE, so
+        writes and anything the server does not cancel cannot hold the worker
+        past it either; the connection is dropped when that fires.
+        """
+        if not timeout_ms:
+            yield query
+            return
+
+        if _SELECT_KEYWORD.match(query):
+            query = _SELECT_KEYWORD.sub(
+                lambda m: f"{m.group(0)} /*+ MAX_EXECUTION_TIME({int(timeout_ms)}) */", query, count=1
+            )
+        sock = getattr(connection, '_socket', None)  # only the pure-Python connection exposes it
+        if sock is None:
+            yield query
+            return
+
+        sock.set_connection_timeout(timeout_ms / 1000 + Config.QUERY_TIMEOUT_GRACE)
+        try:
+            yield query
+        finally:
+            sock.set_connection_timeout(None)
+
+
+# =============================================
+# Embedded SQLite engine
+# =============================================
+
+_MYSQL_TO_SQLITE = [
+    # INSERT IGNORE -> INSERT OR IGNORE
+    (re.compile(r"\bINSERT\s+IGNORE\b", re.IGNORECASE), "INSERT OR IGNORE"),
+    # No-op upsert (ON DUPLICATE KEY UPDATE id = id) -> skip the row on a unique conflict
+    (re.compile(r"\s+ON\s+DUPLICATE\s+KEY\s+UPDATE\s+(\w+)\s*=\s*\1\b", re.IGNORECASE), " ON CONFLICT DO NOTHING"),
+    # DATE_ADD(expr, INTERVAL n UNIT) -> datetime(expr, '+n units')
+    (re.compile(r"\bDATE_ADD\(\s*(NOW\(\)|[^,()]+?)\s*,\s*INTERVAL\s+(\d+)\s+(SECOND|MINUTE|HOUR|DAY|MONTH|YEAR)\s*\)",
+                re.IGNORECASE),
+     lambda m: f"datetime({m.group(1)}, '+{m.group(2)} {m.group(3).lower()}s')"),
+    # DATE_SUB(expr, INTERVAL n UNIT) -> datetime(expr, '-n units')
+    (re.compile(r"\bDATE_SUB\(\s*(NOW\(\)|[^,()]+?)\s*,\s*INTERVAL\s+(\d+)\s+(SECOND|MINUTE|HOUR|DAY|MONTH|YEAR)\s*\)",
+                re.IGNORECASE),
+     lambda m: f"datetime({m.group(1)}, '-{m.group(2)} {m.group(3).lower()}s')"),
+    # NOW() -> local wall-clock time, as MySQL's NOW() returns the session time
+    (re.compile(r"\bNOW\(\)", re.IGNORECASE), "datetime('now', 'localtime')"),
+    # TIMESTAMPDIFF(MINUTE, a, b) -> whole minutes between a and b
+    (re.compile(r"\bTIMESTAMPDIFF\(\s*MINUTE\s*,\s*([^,()]+?)\s*,\s*([^,()]+?)\s*\)", re.IGNORECASE),
+     r"CAST((julianday(\2) - julianday(\1)) * 1440 AS INTEGER)"),
+    (re.compile(r"\bTIMESTAMPDIFF\(\s*SECOND\s*,\s*([^,()]+?)\s*,\s*([^,()]+?)\s*\)", re.IGNORECASE),
+     r"CAST((julianday(\2) - julianday(\1)) * 86400 AS INTEGER)"),
+    # Row locks: SQLite transactions here take the write lock up front (BEGIN IMMEDIATE)
+    (re.compile(r"\s+FOR\s+UPDATE\b", re.IGNORECASE), ""),
+    # Placeholders
+    (re.compile(r"%s"), "?"),
+]
+
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value.decode())
+
+
+def _parse_date(value):
+    return date.fromisoformat(value.decode()[:10])
+
+
+# Store datetimes the way MySQL prints them so string comparisons with
+# datetime('now', 'localtime') order correctly
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter('DATETIME', _parse_datetime)
+sqlite3.register_converter('TIMESTAMP', _parse_datetime)
+sqlite3.register_converter('DATE', _parse_date)
+
+
+def _translate_error(error):
+    """Map a sqlite3 error onto the mysql.connector error the rest of the app expects"""
+    message = str(error)
+    if isinstance(error, sqlite3.IntegrityError):
+        if 'UNIQUE constraint failed' in message:
+            return errors.IntegrityError(msg=f"Duplicate entry ({message})", errno=ER_DUP_ENTRY)
+        return errors.IntegrityError(msg=message)
+    if isinstance(error, sqlite3.ProgrammingError) and 'closed' in message:
+        return errors.InterfaceError(msg=message)
+    if isinstance(error, sqlite3.OperationalError) and message == 'interrupted':
+        # Aborted by the progress handler once the statement's deadline passed
+        return errors.DatabaseError(msg="Query execution was interrupted", errno=ER_QUERY_TIMEOUT)
+    return errors.DatabaseError(msg=message)
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteCursor:
+    """Cursor adapter giving a sqlite3 cursor the mysql.connector surface used by the data layer"""
+
+    def __init__(self, cursor, dialect):
+        self._cursor = cursor
+        self._dialect = dialect
+
+    def execute(self, query, params=()):
+        try:
+            self._cursor.execute(self._dialect.translate(query), tuple(params or ()))
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+
+    def executemany(self, query, seq_params):
+        try:
+            self._cursor.executemany(self._dialect.translate(query), seq_params)
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+
+    def fetchone(self):
+        try:
+            return self._cursor.fetchone()
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+
+    def fetchmany(self, size=None):
+        try:
+            return self._cursor.fetchmany(size or self._cursor.arraysize)
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+
+    def fetchall(self):
+        try:
+            return self._cursor.fetchall()
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+
+    @property
+    def with_rows(self):
+        return self._cursor.description is not None
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        try:
+            self._cursor.close()
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+
+
+class SQLiteConnection:
+    """Connection adapter giving sqlite3 the mysql.connector surface used by the pool and data layer"""
+
+    def __init__(self, connection, dialect):
+        self._connection = connection
+        self._dialect = dialect
+        self.deadline = None  # time.monotonic() after which the running statement is aborted
+        connection.set_progress_handler(self._past_deadline, _PROGRESS_STEPS)
+
+    def _past_deadline(self):
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def cursor(self, dictionary=False, **kwargs):
+        try:
+            cursor = self._connection.cursor()
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+        if dictionary:
+            cursor.row_factory = _dict_row
+        return SQLiteCursor(cursor, self._dialect)
+
+    def start_transaction(self):
+        # Take the write lock immediately so concurrent writers queue on
+        # busy_timeout instead of failing when a read lock is upgraded
+        try:
+            self._connection.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+
+    def commit(self):
+        try:
+            self._connection.commit()
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+
+    def rollback(self):
+        try:
+            self._connection.rollback()
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+
+    @property
+    def in_transaction(self):
+        try:
+            return self._connection.in_transaction
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+
+    def is_connected(self):
+        return True
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        """Embedded database: there is no server connection to lose"""
+
+    def close(self):
+        try:
+            self._connection.close()
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+
+
+class SQLiteDialect:
+    """
+    Embedded engine for single-site deployments and hermetic benchmarks
+
+    The database file runs in WAL mode so readers never block the writer.
+    MySQL-only SQL in the blueprints (NOW(), DATE_ADD, TIMESTAMPDIFF, %s
+    placeholders, INSERT IGNORE, no-op ON DUPLICATE KEY UPDATE, FOR UPDATE)
+    is rewritten once per distinct statement, and the schema is created (or
+    upgraded) on first connect.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connect(self):
+        """Open a new connection to the database file"""
+        connection = sqlite3.connect(
+            self.path,
+            timeout=Config.SQLITE_BUSY_TIMEOUT,
+            isolation_level=None,  # autocommit; transaction() issues BEGIN explicitly
+            check_same_thread=False,  # the pool hands connections between threads
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            cached_statements=max(Config.DB_STATEMENT_CACHE_SIZE, 0),
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        self._ensure_schema(connection)
+        return SQLiteConnection(connection, self)
+
+    def _ensure_schema(self, connection):
+        if self._schema_ready:
+            return
+        with self._schema_lock:
+            if not self._schema_ready:
+                self._upgrade_schema(connection)
+                with open(SQLITE_SCHEMA_PATH) as schema:
+                    connection.executescript(schema.read())
+                self._schema_ready = True
+
+    @staticmethod
+    def _upgrade_schema(connection):
+        """Add what the schema file gained since an existing database file was created"""
+        columns = {row[1] for row in connection.execute("PRAGMA table_xinfo(time_entries)")}
+        if columns and 'open_username' not in columns:
+            # Keep each user's newest open entry; close older duplicates so
+            # the one-open-entry index can be created
+            connection.execute("""
+                UPDATE time_entries
+                SET out_time = in_time, notes = TRIM(COALESCE(notes, '') || ' [closed: duplicate open entry]')
+                WHERE out_time IS NULL AND id NOT IN (
+                    SELECT MAX(id) FROM time_entries WHERE out_time IS NULL GROUP BY username
+                )
+            """)
+            connection.execute("""
+                ALTER TABLE time_entries ADD COLUMN open_username VARCHAR(50)
+                GENERATED ALWAYS AS (CASE WHEN out_time IS NULL THEN username END) VIRTUAL
+            """)
+
+    @contextmanager
+    def time_limit(self, connection, query, timeout_ms):
+        """Bound one statement to ``timeout_ms`` through the connection's progress handler"""
+        if not timeout_ms:
+            yield query
+            return
+
+        connection.deadline = time.monotonic() + timeout_ms / 1000
+        try:
+            yield query
+        finally:
+            connection.deadline = None
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def translate(query):
+        """Rewrite a MySQL statement into SQLite syntax"""
+        for pattern, replacement in _MYSQL_TO_SQLITE:
+            query = pattern.sub(replacement, query)
+        return query
+
+
+def get_dialect():
+    """Return the dialect selected by Config.DB_ENGINE"""
+    if Config.DB_ENGINE == 'sqlite':
+        return SQLiteDialect(Config.SQLITE_PATH)
+    if Config.DB_ENGINE == 'mysql':
+        return MySQLDialect()
+    raise ValueError(f"Unsupported DB_ENGINE: {Config.DB_ENGINE}")
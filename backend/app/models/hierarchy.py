@@ -0,0 +1,183 @@
+import threading
+import time
+
+from ..config import Config
+from .database import execute_query
+
+
+class HierarchyIndex:
+    """
+    In-memory copy of the Manager -> Lead -> Member assignments
+
+    Built lazily from ``lead_assignments`` and ``manager_lead_assignments``
+    on first use. At most every ``refresh_interval`` seconds a cheap version
+    query (row count and highest id of both tables) is compared with the
+    version the index was built from, and the index is rebuilt when another
+    worker changed the assignments. Writes made through this process are
+    applied immediately with the assign/unassign/remove methods.
+    """
+
+    _VERSION_QUERY = """
+        SELECT
+            (SELECT COUNT(*) FROM lead_assignments) AS lead_rows,
+            (SELECT MAX(id) FROM lead_assignments) AS lead_max_id,
+            (SELECT COUNT(*) FROM manager_lead_assignments) AS manager_rows,
+            (SELECT MAX(id) FROM manager_lead_assignments) AS manager_max_id
+    """
+
+    def __init__(self, refresh_interval=5.0):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._members_by_lead = {}  # lead -> set of members
+        self._leads_by_member = {}  # member -> set of leads
+        self._leads_by_manager = {}  # manager -> set of leads
+        self._version = None
+        self._checked_at = 0.0
+        self._generation = 0  # bumped by every local change
+
+        # Statistics
+        self._rebuilds = 0
+        self._version_checks = 0
+
+    # ----------------------------------------------------------------------
+    # Lookups
+    # ----------------------------------------------------------------------
+
+    def members_of(self, lead_username):
+        """Return the set of Members on a Lead's team"""
+        self._ensure_fresh()
+        with self._lock:
+            return set(self._members_by_lead.get(lead_username, ()))
+
+    def leads_of_member(self, member_username):
+        """Return the set of Leads a Member is assigned to"""
+        self._ensure_fresh()
+        with self._lock:
+            return set(self._leads_by_member.get(member_username, ()))
+
+    def leads_of_manager(self, manager_username):
+        """Return the set of Leads assigned to a Manager"""
+        self._ensure_fresh()
+        with self._lock:
+            return set(self._leads_by_manager.get(manager_username, ()))
+
+    def is_member_of(self, lead_username, member_username):
+        """True if the Member is assigned to the Lead"""
+        self._ensure_fresh()
+        with self._lock:
+            return member_username in self._members_by_lead.get(lead_username, ())
+
+    # ----------------------------------------------------------------------
+    # Local changes (call after the write has committed)
+    # ----------------------------------------------------------------------
+
+    def assign_member(self, lead_username, member_username):
+        with self._lock:
+            self._generation += 1
+            self._add_member(lead_username, member_username)
+
+    def unassign_member(self, lead_username, member_username):
+        with self._lock:
+            self._generation += 1
+            self._members_by_lead.get(lead_username, set()).discard(member_username)
+            leads = self._leads_by_member.get(member_username)
+            if leads is not None:
+                leads.discard(lead_username)
+                if not leads:
+                    del self._leads_by_member[member_username]
+
+    def assign_lead(self, manager_username, lead_username):
+        with self._lock:
+            self._generation += 1
+            self._leads_by_manager.setdefault(manager_username, set()).add(lead_username)
+
+    def remove_user(self, username):
+        """Drop every assignment of a deleted user (the rows go with ON DELETE CASCADE)"""
+        with self._lock:
+            self._generation += 1
+            for member in self._members_by_lead.pop(username, ()):
+                leads = self._leads_by_member.get(member)
+                if leads is not None:
+                    leads.discard(username)
+                    if not leads:
+                        del self._leads_by_member[member]
+            for lead in self._leads_by_member.pop(username, ()):
+                self._members_by_lead.get(lead, set()).discard(username)
+            self._leads_by_manager.pop(username, None)
+            for leads in self._leads_by_manager.values():
+                leads.discard(username)
+
+    def invalidate(self):
+        """Force a version check on the next lookup"""
+        with self._lock:
+            self._generation += 1
+            self._checked_at = 0.0
+
+    # ----------------------------------------------------------------------
+    # Refresh
+    # ----------------------------------------------------------------------
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._checked_at < self.refresh_interval:
+                return
+            generation = self._generation
+
+        row = execute_query(self._VERSION_QUERY, fetch_one=True)
+        version = tuple(row.values())
+        with self._lock:
+            self._version_checks += 1
+            if version == self._version and generation == self._generation:
+                self._checked_at = now
+                return
+
+        # A local change landing while the rows load may predate them; load
+        # again, the change has committed by the time it shows up here
+        while not self._rebuild(version, generation, now):
+            with self._lock:
+                generation = self._generation
+
+    def _rebuild(self, version, generation, now):
+        lead_rows = execute_query(
+            "SELECT lead_username, member_username FROM lead_assignments",
+            fetch_all=True
+        )
+        manager_rows = execute_query(
+            "SELECT manager_username, lead_username FROM manager_lead_assignments",
+            fetch_all=True
+        )
+
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self._members_by_lead = {}
+            self._leads_by_member = {}
+            self._leads_by_manager = {}
+            for row in lead_rows:
+                self._add_member(row['lead_username'], row['member_username'])
+            for row in manager_rows:
+                self._leads_by_manager.setdefault(row['manager_username'], set()).add(row['lead_username'])
+            self._version = version
+            self._checked_at = now
+            self._rebuilds += 1
+            return True
+
+    def _add_member(self, lead_username, member_username):
+        self._members_by_lead.setdefault(lead_username, set()).add(member_username)
+        self._leads_by_member.setdefault(member_username, set()).add(lead_username)
+
+    def stats(self):
+        """Return index size and refresh counters"""
+        with self._lock:
+            return {
+                "leads": len(self._members_by_lead),
+                "members": len(self._leads_by_member),
+                "managers": len(self._leads_by_manager),
+                "refresh_interval_seconds": self.refresh_interval,
+                "version_checks": self._version_checks,
+                "rebuilds": self._rebuilds,
+            }
+
+
+hierarchy = HierarchyIndex(refresh_interval=Config.HIERARCHY_REFRESH_SECONDS)
@@ -0,0 +1,197 @@
+import os
+import threading
+import time
+from collections import deque
+
+from mysql.connector import Error
+
+
+class PoolTimeout(Error):
+    """Raised when no pooled connection becomes free within the checkout timeout"""
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of database connections
+
+    Connections are opened lazily up to ``size`` and handed out LIFO so the
+    warmest connection is reused first. Callers that find the pool exhausted
+    wait up to ``timeout`` seconds for a connection to be released. A
+    priority caller (a background writer that requests are waiting on) is
+    served before every other waiter.
+
+    Args:
+        factory: Callable returning a new open connection
+        size: Maximum number of connections (in use + idle)
+        timeout: Seconds to wait for a free connection before PoolTimeout
+        recycle: Seconds a connection may sit idle before it is pinged on checkout
+        breaker: Optional CircuitBreaker guarding every new connection
+    """
+
+    def __init__(self, factory, size=10, timeout=5.0, recycle=300, breaker=None):
+        self._factory = factory
+        self.breaker = breaker
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pid = os.getpid()
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = deque()  # (connection, released_at)
+        self._opened = 0
+        self._in_use = 0
+        self._priority_waiting = 0
+
+        # Statistics
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+        self._discarded = 0
+
+    def _must_wait(self, priority):
+        if not self._idle and self._opened >= self.size:
+            return True
+        # Leave released connections to a waiting priority caller
+        return not priority and self._priority_waiting > 0
+
+    def acquire(self, priority=False):
+        """Check a connection out of the pool, opening one if there is room"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        with self._lock:
+            if priority:
+                self._priority_waiting += 1
+            try:
+                while self._must_wait(priority):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            msg=f"No database connection available after {self.timeout}s "
+                                f"({self._in_use}/{self.size} in use)"
+                        )
+                    waited = True
+                    self._available.wait(remaining)
+            finally:
+                if priority:
+                    self._priority_waiting -= 1
+                    # Wake the callers that stood aside
+                    self._available.notify_all()
+
+            if self._idle:
+                connection, released_at = self._idle.pop()
+            else:
+                connection, released_at = None, None
+                self._opened += 1
+            self._in_use += 1
+            self._checkouts += 1
+
+            if waited:
+                wait = time.monotonic() - started
+                self._waits += 1
+                self._wait_time += wait
+                self._max_wait = max(self._max_wait, wait)
+
+        try:
+            if connection is not None and time.monotonic() - released_at > self.recycle:
+                connection = self._revalidate(connection)
+            if connection is None:
+                connection = self.breaker.call(self._factory) if self.breaker else self._factory()
+        except Exception:
+            self._forget(discarded=False)
+            raise
+
+        return connection
+
+    def _revalidate(self, connection):
+        """
+        Ping a connection that sat idle past the recycle interval
+
+        A dead connection is closed and None returned so a fresh one is opened.
+        It is never reconnected in place, because a reconnect silently drops
+        server-side session state such as prepared statements.
+        """
+        try:
+            connection.ping()
+            return connection
+        except Exception:
+            try:
+                connection.close()
+            except Exception:
+                pass
+            with self._lock:
+                self._discarded += 1
+            return None
+
+    def release(self, connection, discard=False):
+        """Return a connection to the pool, closing it if it is no longer usable"""
+        if not discard:
+            # in_transaction is read from the last server status flags, so
+            # this costs a round trip only when a transaction was left open
+            try:
+                if connection.in_transaction:
+                    connection.rollback()
+            except Exception:
+                discard = True
+
+        if discard:
+            try:
+                connection.close()
+            except Exception:
+                pass
+            self._forget()
+            return
+
+        with self._lock:
+            self._in_use -= 1
+            self._idle.append((connection, time.monotonic()))
+            self._notify()
+
+    def _forget(self, discarded=True):
+        """Drop a checked-out connection from the accounting and wake a waiter"""
+        with self._lock:
+            self._in_use -= 1
+            self._opened -= 1
+            if discarded:
+                self._discarded += 1
+            self._notify()
+
+    def _notify(self):
+        # notify() might wake a caller that has to keep standing aside
+        if self._priority_waiting:
+            self._available.notify_all()
+        else:
+            self._available.notify()
+
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            while self._idle:
+                connection, _ = self._idle.pop()
+                self._opened -= 1
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+
+    def stats(self):
+        """Return a snapshot of pool usage counters"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "opened": self._opened,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_ms_total": round(self._wait_time * 1000, 2),
+                "wait_time_ms_max": round(self._max_wait * 1000, 2),
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "breaker": self.breaker.stats() if self.breaker else None,
+            }
@@ -0,0 +1,201 @@
+import logging
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+from flask import g, has_app_context, has_request_context, request
+
+slow_query_log = logging.getLogger('app.sql.slow')
+timeout_log = logging.getLogger('app.sql.timeout')
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(query):
+    """
+    Normalize a SQL string so that calls differing only in literals group together
+
+    Literals and placeholders become ``?``, IN lists and multi-row VALUES
+    collapse to a single entry, and whitespace is squeezed.
+    """
+    normalized = _STRING_LITERAL.sub('?', query)
+    normalized = _NUMBER_LITERAL.sub('?', normalized)
+    normalized = _PLACEHOLDER.sub('?', normalized)
+    normalized = _IN_LIST.sub('IN (...)', normalized)
+    normalized = _VALUES_LIST.sub(r'\1, ...', normalized)
+    return _WHITESPACE.sub(' ', normalized).strip()
+
+
+def param_shapes(params):
+    """Describe bind parameters by type only, so values never reach the logs"""
+    if not params:
+        return []
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    return [
+        f"{type(value).__name__}[{len(value)}]" if isinstance(value, (list, tuple)) else type(value).__name__
+        for value in params
+    ]
+
+
+def _percentile(sorted_samples, fraction):
+    index = min(len(sorted_samples) - 1, int(round(fraction * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+class _Aggregate:
+    """Running totals plus a bounded window of recent durations for percentiles"""
+
+    __slots__ = ('count', 'total', 'max', 'rows', 'timeouts', 'samples')
+
+    def __init__(self, window):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.timeouts = 0
+        self.samples = deque(maxlen=window)
+
+    def add(self, duration, rows):
+        self.count += 1
+        self.total += duration
+        self.rows += rows
+        if duration > self.max:
+            self.max = duration
+        self.samples.append(duration)
+
+    def summary(self):
+        samples = sorted(self.samples)
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "avg_ms": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(_percentile(samples, 0.50) * 1000, 3) if samples else 0.0,
+            "p95_ms": round(_percentile(samples, 0.95) * 1000, 3) if samples else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "rows": self.rows,
+            "timeouts": self.timeouts,
+        }
+
+
+class QueryStats:
+    """
+    Thread-safe per-process query statistics
+
+    Aggregates are kept per SQL fingerprint and per Flask endpoint. Queries
+    slower than ``slow_threshold_ms`` are written to the ``app.sql.slow``
+    logger and kept in a short in-memory ring for the admin endpoint.
+    Statements cancelled by their time budget are counted separately and
+    logged to ``app.sql.timeout``.
+    """
+
+    def __init__(self, slow_threshold_ms=200, window=512, slow_log_size=100):
+        self.slow_threshold = slow_threshold_ms / 1000.0
+        self.window = window
+        self._lock = threading.Lock()
+        self._by_fingerprint = {}
+        self._by_endpoint = {}
+        self._requests = {}
+        self._slow = deque(maxlen=slow_log_size)
+        self._started = time.time()
+
+    def record(self, query, params, duration, rows):
+        """Record one executed statement"""
+        key = fingerprint(query)
+        endpoint = _current_endpoint()
+
+        if has_app_context():
+            g.db_queries = g.get('db_queries', 0) + 1
+
+        with self._lock:
+            self._aggregate(self._by_fingerprint, key).add(duration, rows)
+            self._aggregate(self._by_endpoint, endpoint).add(duration, rows)
+
+        if duration >= self.slow_threshold:
+            entry = {
+                "at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+                "endpoint": endpoint,
+                "duration_ms": round(duration * 1000, 3),
+                "rows": rows,
+                "fingerprint": key,
+                "params": param_shapes(params),
+            }
+            with self._lock:
+                self._slow.append(entry)
+            slow_query_log.warning(
+                "slow query %.1fms endpoint=%s rows=%d params=%s sql=%s",
+                entry["duration_ms"], endpoint, rows, entry["params"], key
+            )
+
+    def record_timeout(self, query, params, duration, timeout_ms):
+        """Count a statement that was cancelled for exceeding its time budget"""
+        key = fingerprint(query)
+        endpoint = _current_endpoint()
+        with self._lock:
+            self._aggregate(self._by_fingerprint, key).timeouts += 1
+            self._aggregate(self._by_endpoint, endpoint).timeouts += 1
+        timeout_log.warning(
+            "query timeout after %.1fms (budget %dms) endpoint=%s params=%s sql=%s",
+            duration * 1000, timeout_ms, endpoint, param_shapes(params), key
+        )
+
+    def _aggregate(self, aggregates, key):
+        aggregate = aggregates.get(key)
+        if aggregate is None:
+            aggregate = aggregates[key] = _Aggregate(self.window)
+        return aggregate
+
+    def record_request(self, endpoint, queries):
+        """Record how many statements one request issued"""
+        with self._lock:
+            count, total = self._requests.get(endpoint, (0, 0))
+            self._requests[endpoint] = (count + 1, total + queries)
+
+    def snapshot(self):
+        """Return all aggregates, slowest total time first"""
+        with self._lock:
+            fingerprints = [
+                dict(fingerprint=key, **aggregate.summary())
+                for key, aggregate in self._by_fingerprint.items()
+            ]
+            endpoints = []
+            for key, aggregate in self._by_endpoint.items():
+                summary = dict(endpoint=key, **aggregate.summary())
+                requests, queries = self._requests.get(key, (0, 0))
+                summary["requests"] = requests
+                summary["queries_per_request"] = round(queries / requests, 2) if requests else None
+                endpoints.append(summary)
+            slow = list(self._slow)
+
+        fingerprints.sort(key=lambda item: item["total_ms"], reverse=True)
+        endpoints.sort(key=lambda item: item["total_ms"], reverse=True)
+        return {
+            "since": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self._started)),
+            "slow_query_threshold_ms": round(self.slow_threshold * 1000, 3),
+            "by_fingerprint": fingerprints,
+            "by_endpoint": endpoints,
+            "slow_queries": slow,
+        }
+
+    def reset(self):
+        """Clear all aggregates"""
+        with self._lock:
+            self._by_fingerprint.clear()
+            self._by_endpoint.clear()
+            self._requests.clear()
+            self._slow.clear()
+            self._started = time.time()
+
+
+def _current_endpoint():
+    if has_request_context():
+        return request.endpoint or '<unmatched>'
+    return '<background>'
@@ -0,0 +1,158 @@
+import logging
+import random
+import threading
+import time
+
+from mysql.connector import Error, errors
+
+connection_log = logging.getLogger('app.sql.connection')
+
+# Client errors meaning the server dropped an established connection
+# (CR_SERVER_GONE_ERROR, CR_SERVER_LOST, CR_SERVER_LOST_EXTENDED)
+CONNECTION_LOST_ERRNOS = frozenset((2006, 2013, 2055))
+
+# Server error for a statement cancelled by MAX_EXECUTION_TIME (ER_QUERY_TIMEOUT)
+ER_QUERY_TIMEOUT = 3024
+
+
+class DatabaseUnavailable(Error):
+    """Raised without touching the database while the circuit breaker is open"""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(msg=f"Database unavailable, retry in {retry_after:.0f}s")
+
+
+class QueryTimeout(Error):
+    """Raised when a statement is cancelled for running past its time budget"""
+
+    def __init__(self, timeout_ms):
+        self.timeout_ms = timeout_ms
+        super().__init__(msg=f"Query exceeded its {timeout_ms:.0f}ms time budget", errno=ER_QUERY_TIMEOUT)
+
+
+def is_connection_lost(error):
+    """True if ``error`` means the connection died mid-statement and a fresh one may succeed"""
+    return getattr(error, 'errno', None) in CONNECTION_LOST_ERRNOS
+
+
+class CircuitBreaker:
+    """
+    Stop opening connections to a database that keeps failing
+
+    After ``threshold`` consecutive failed connects the breaker opens and
+    every connect attempt raises DatabaseUnavailable immediately. Once
+    ``reset_timeout`` seconds have passed a single trial connect is let
+    through (half-open); it closes the breaker on success and re-opens it
+    on failure.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold=5, reset_timeout=10.0):
+        self.threshold = max(1, threshold)
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+        # Statistics
+        self._times_opened = 0
+        self._rejected = 0
+
+    def retry_after(self):
+        """Seconds until a trial connect will be allowed, or 0 if calls may proceed"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return 0
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining
+            return self.reset_timeout if self._trial_running else 0
+
+    def call(self, func):
+        """Run ``func`` (a connect) under the breaker"""
+        self._before_call()
+        try:
+            result = func()
+        except Exception:
+            self._record_failure()
+            raise
+        self._record_success()
+        return result
+
+    def _before_call(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self._trial_running:
+                self._rejected += 1
+                raise DatabaseUnavailable(max(remaining, 1))
+            self._state = self.HALF_OPEN
+            self._trial_running = True
+
+    def _record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                connection_log.warning("Database reachable again, closing circuit breaker")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def _record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._state == self.HALF_OPEN or self._failures >= self.threshold:
+                if self._state != self.OPEN:
+                    self._times_opened += 1
+                    connection_log.error(
+                        "Opening circuit breaker after %d failed connects for %.0fs",
+                        self._failures, self.reset_timeout
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def stats(self):
+        """Return the breaker state and counters"""
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "times_opened": self._times_opened,
+                "rejected": self._rejected,
+            }
+
+
+def with_backoff(connect, retries=2, base_delay=0.1, max_delay=2.0):
+    """
+    Wrap a connect callable so transient failures are retried
+
+    Retries ``retries`` times on operational/interface errors (refused,
+    unreachable, too many connections), sleeping a random time up to an
+    exponentially growing cap between attempts ("full jitter") so workers
+    reconnecting after an outage do not hit the server in lockstep.
+    """
+    def connect_with_backoff():
+        for attempt in range(retries + 1):
+            try:
+                return connect()
+            except (errors.OperationalError, errors.InterfaceError) as e:
+                if attempt == retries:
+                    raise
+                delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+                connection_log.warning("Connect failed (%s), retrying in %.2fs", e, delay)
+                time.sleep(delay)
+
+    return connect_with_backoff
@@ -0,0 +1,91 @@
+import threading
+from collections import OrderedDict
+
+from mysql.connector import DataError, Error, IntegrityError
+
+_totals_lock = threading.Lock()
+_totals = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _count(counter):
+    with _totals_lock:
+        _totals[counter] += 1
+
+
+def get_statement_cache_stats():
+    """Return hit/miss/eviction counters summed over every connection's cache"""
+    with _totals_lock:
+        stats = dict(_totals)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else None
+    return stats
+
+
+class StatementCache:
+    """
+    LRU cache of server-side prepared statements for one connection
+
+    Each distinct SQL text gets its own prepared cursor, so the server parses
+    and plans the statement once per connection instead of on every call.
+    The least recently used statement is closed once ``size`` is exceeded.
+    """
+
+    def __init__(self, connection, size=64):
+        self._connection = connection
+        self.size = size
+        self._cursors = OrderedDict()  # sql text -> (sql object, prepared cursor)
+
+    def execute(self, query, params=None):
+        """Execute ``query`` with a cached prepared statement and return its cursor"""
+        entry = self._cursors.get(query)
+
+        if entry is not None:
+            self._cursors.move_to_end(query)
+            _count("hits")
+            sql, cursor = entry
+            try:
+                # Passing the identical string object lets the cursor skip re-preparing
+                cursor.execute(sql, tuple(params or ()))
+            except (IntegrityError, DataError):
+                raise  # rejected row; the statement itself is fine
+            except Error:
+                # The statement may no longer be prepared; do not keep it
+                self._discard(query)
+                raise
+            return cursor
+
+        _count("misses")
+        cursor = self._connection.cursor(prepared=True, dictionary=True)
+        try:
+            cursor.execute(query, params or ())
+        except Error:
+            self._close(cursor)
+            raise
+
+        self._cursors[query] = (query, cursor)
+        while len(self._cursors) > self.size:
+            _, (_, evicted) = self._cursors.popitem(last=False)
+            _count("evictions")
+            self._close(evicted)
+        return cursor
+
+    def _discard(self, query):
+        entry = self._cursors.pop(query, None)
+        if entry is not None:
+            self._close(entry[1])
+
+    @staticmethod
+    def _close(cursor):
+        try:
+            cursor.close()
+        except Error:
+            pass
+
+    def clear(self):
+        """Close every cached statement"""
+        while self._cursors:
+            _, (_, cursor) = self._cursors.popitem(last=False)
+            self._close(cursor)
+
+    def __len__(self):
+        return len(self._cursors)
@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+
+from ..config import Config
+from .database import execute_query
+
+
+class UserCache:
+    """
+    Bounded, thread-safe LRU cache of user records with a time-to-live
+
+    Entries expire ``ttl`` seconds after they were loaded and the least
+    recently used entry is evicted once ``size`` is exceeded. Writers call
+    invalidate() for the users they change; a load that races with an
+    invalidation is not stored, so a stale row cannot be cached after the
+    write that replaced it. Each worker process has its own cache, so
+    changes made by another worker become visible within ``ttl`` seconds.
+    """
+
+    def __init__(self, size=1024, ttl=60.0):
+        self.size = max(1, size)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # username -> (record, expires_at)
+        self._generation = 0  # bumped by every invalidation
+
+        # Statistics
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def get(self, username, loader):
+        """Return the cached record for ``username``, calling ``loader(username)`` on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(username)
+                    self._hits += 1
+                    return entry[0]
+                del self._entries[username]
+                self._expirations += 1
+            self._misses += 1
+            generation = self._generation
+
+        record = loader(username)
+
+        # Unknown users are not cached, so a new account is visible at once
+        if record is not None:
+            with self._lock:
+                if generation == self._generation:
+                    self._entries[username] = (record, now + self.ttl)
+                    self._entries.move_to_end(username)
+                    while len(self._entries) > self.size:
+                        self._entries.popitem(last=False)
+                        self._evictions += 1
+        return record
+
+    def invalidate(self, *usernames):
+        """Drop the given users' records after a write that changes them"""
+        with self._lock:
+            self._generation += 1
+            for username in usernames:
+                if self._entries.pop(username, None) is not None:
+                    self._invalidations += 1
+
+    def clear(self):
+        """Drop every cached record"""
+        with self._lock:
+            self._generation += 1
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        """Return cache size and hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.size,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else None,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+            }
+
+
+user_cache = UserCache(size=Config.USER_CACHE_SIZE, ttl=Config.USER_CACHE_TTL)
+
+
+def _load_user(username):
+    query = """
+        SELECT id, username, display_name, email, user_level, created_at
+        FROM users
+        WHERE username = %s
+    """
+    return execute_query(query, (username,), fetch_one=True)
+
+
+def find_user(username):
+    """
+    Return a user's public record (id, username, display_name, email, user_level, created_at)
+
+    Served from the in-process cache; returns None for an unknown user.
+    The returned dict is shared, do not modify it.
+    """
+    return user_cache.get(username, _load_user)
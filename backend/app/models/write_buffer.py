@@ -0,0 +1,173 @@
+import logging
+import os
+import threading
+import time
+
+from flask import g, has_app_context
+
+from ..config import Config
+from .database import _mark_write, _scope, execute_write, prioritize_connections, release_connection, transaction
+
+write_buffer_log = logging.getLogger('app.sql.group_commit')
+
+
+class _PendingWrite:
+    """One queued statement and the slot its caller waits on"""
+
+    __slots__ = ('query', 'params', 'done', 'result', 'error')
+
+    def __init__(self, query, params):
+        self.query = query
+        self.params = params
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class GroupCommitBuffer:
+    """
+    Queue single-row writes and commit them together
+
+    Callers block in submit() while a flusher thread collects statements
+    for up to ``max_wait_ms`` (or until ``max_batch`` are queued) and runs
+    them in one transaction, so a burst of scans pays for one commit (one
+    redo log flush) instead of one each. submit() returns only after that
+    commit, with the statement's own WriteResult.
+
+    If the batch fails, it is rolled back and every statement is retried on
+    its own, so one bad write only fails its own caller. Statements must
+    therefore be safe to run again, e.g. guarded by a unique index or an
+    ``out_time IS NULL`` condition.
+    """
+
+    def __init__(self, max_wait_ms=5, max_batch=64):
+        self.max_wait = max(0, max_wait_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+
+        self._cond = threading.Condition()
+        self._pending = []
+        self._pid = None
+
+        # Statistics
+        self._batches = 0
+        self._writes = 0
+        self._largest_batch = 0
+        self._fallbacks = 0
+
+    def _ensure_flusher(self):
+        # Threads do not survive fork; each worker starts its own flusher
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pending = []
+            self._pid = pid
+            threading.Thread(target=self._run, name='group-commit', daemon=True).start()
+
+    def submit(self, query, params=None):
+        """
+        Queue a write and wait until it has been committed
+
+        Returns:
+            WriteResult(lastrowid, rowcount) of this statement
+        """
+        pending = _PendingWrite(query, params)
+        with self._cond:
+            self._ensure_flusher()
+            self._pending.append(pending)
+            self._cond.notify()
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _run(self):
+        prioritize_connections()
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.max_wait
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            try:
+                with transaction():
+                    results = [execute_write(item.query, item.params) for item in batch]
+            except Exception as e:
+                write_buffer_log.warning("Group commit of %d writes failed, retrying one by one: %s", len(batch), e)
+                with self._cond:
+                    self._fallbacks += 1
+                for item in batch:
+                    try:
+                        item.result = execute_write(item.query, item.params)
+                    except Exception as error:
+                        item.error = error
+            else:
+                for item, result in zip(batch, results):
+                    item.result = result
+            with self._cond:
+                self._batches += 1
+                self._writes += len(batch)
+                self._largest_batch = max(self._largest_batch, len(batch))
+        except Exception as e:
+            # Keep the flusher alive; whoever has no outcome yet gets the error
+            write_buffer_log.exception("Group commit flusher error")
+            for item in batch:
+                if item.result is None and item.error is None:
+                    item.error = e
+        finally:
+            for item in batch:
+                item.done.set()
+
+    def stats(self):
+        """Return batch counts and sizes for this process"""
+        with self._cond:
+            return {
+                "enabled": Config.GROUP_COMMIT_ENABLED,
+                "max_wait_ms": self.max_wait * 1000,
+                "max_batch": self.max_batch,
+                "queued": len(self._pending) if self._pid == os.getpid() else 0,
+                "batches": self._batches,
+                "writes": self._writes,
+                "average_batch": round(self._writes / self._batches, 2) if self._batches else 0,
+                "largest_batch": self._largest_batch,
+                "fallbacks": self._fallbacks,
+            }
+
+
+write_buffer = GroupCommitBuffer(
+    max_wait_ms=Config.GROUP_COMMIT_MAX_WAIT_MS,
+    max_batch=Config.GROUP_COMMIT_MAX_BATCH,
+)
+
+
+def execute_grouped_write(query, params=None):
+    """
+    Run a single-row write through the group-commit buffer when enabled
+
+    With GROUP_COMMIT_ENABLED off, or inside a transaction() block (whose
+    statements must commit together), this is execute_write(). Otherwise
+    the request's connection goes back to the pool while it waits, so
+    waiting requests never starve the flusher of connections.
+
+    Returns:
+        WriteResult(lastrowid, rowcount)
+    """
+    scope = _scope()
+    if not Config.GROUP_COMMIT_ENABLED or getattr(scope, 'db_tx_depth', 0):
+        return execute_write(query, params)
+
+    if has_app_context():
+        connection = g.pop('db_connection', None)
+        if connection is not None:
+            release_connection(connection)
+    result = write_buffer.submit(query, params)
+    _mark_write(scope)
+    return result
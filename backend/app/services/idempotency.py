@@ -0,0 +1,224 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, jsonify, make_response, request
+
+from ..config import Config
+from ..models.database import execute_query, execute_write
+
+idempotency_log = logging.getLogger('app.idempotency')
+
+# Longest Idempotency-Key header accepted
+MAX_KEY_LENGTH = 255
+
+# begin() results besides a stored response
+PROCEED = 'proceed'
+IN_PROGRESS = 'in_progress'
+MISMATCH = 'mismatch'
+
+
+class MemoryIdempotencyStore:
+    """
+    Per-process store: an LRU of at most ``max_keys`` entries kept ``ttl`` seconds
+
+    A claim still in progress is only held for ``lease`` seconds. Only
+    retries that reach the same worker are answered from it; use the
+    database store when several workers serve the API.
+    """
+
+    def __init__(self, max_keys=10000, ttl=86400, lease=180):
+        self.max_keys = max(1, max_keys)
+        self.ttl = ttl
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> [request_hash, response or None, expires_at]
+
+    def begin(self, key, request_hash):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] > now:
+                if entry[0] != request_hash:
+                    return MISMATCH
+                return entry[1] or IN_PROGRESS
+            self._entries[key] = [request_hash, None, now + self.lease]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+            return PROCEED
+
+    def complete(self, key, status_code, body):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] = (status_code, body)
+                entry[2] = time.monotonic() + self.ttl
+
+    def abandon(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class DatabaseIdempotencyStore:
+    """
+    Store shared by every worker through the ``idempotency_keys`` table
+
+    A key is claimed with a single no-op upsert: the row that wins the
+    insert runs the request, everyone else reads the row. The claim expires
+    after ``lease`` seconds, so one whose request never completed (the
+    worker died) can be taken over by a retry; a stored response is kept
+    for ``ttl`` seconds. Expired rows are deleted at most once a minute per
+    process.
+    """
+
+    _PURGE_INTERVAL = 60
+
+    def __init__(self, ttl=86400, lease=180):
+        self.ttl = int(ttl)
+        self.lease = int(lease)
+        self._next_purge = 0.0
+
+    def begin(self, key, request_hash):
+        self._purge_expired()
+        claim_query = f"""
+            INSERT INTO idempotency_keys (idem_key, request_hash, created_at, expires_at)
+            VALUES (%s, %s, NOW(), DATE_ADD(NOW(), INTERVAL {self.lease} SECOND))
+            ON DUPLICATE KEY UPDATE idem_key = idem_key
+        """
+        if execute_write(claim_query, (key, request_hash)).rowcount:
+            return PROCEED
+
+        query = """
+            SELECT request_hash, status_code, response_body, expires_at < NOW() AS expired
+            FROM idempotency_keys
+            WHERE idem_key = %s
+        """
+        row = execute_query(query, (key,), fetch_one=True)
+        if row is None:
+            # Purged between the insert and the read; claim it again
+            return self.begin(key, request_hash)
+        if row['expired']:
+            # Take the expired row over unless another retry just did
+            takeover_query = f"""
+                UPDATE idempotency_keys
+                SET request_hash = %s, status_code = NULL, response_body = NULL,
+                    created_at = NOW(), expires_at = DATE_ADD(NOW(), INTERVAL {self.lease} SECOND)
+                WHERE idem_key = %s AND expires_at < NOW()
+            """
+            return PROCEED if execute_write(takeover_query, (request_hash, key)).rowcount else IN_PROGRESS
+        if row['request_hash'] != request_hash:
+            return MISMATCH
+        if row['status_code'] is None:
+            return IN_PROGRESS
+        return row['status_code'], row['response_body']
+
+    def complete(self, key, status_code, body):
+        query = f"""
+            UPDATE idempotency_keys
+            SET status_code = %s, response_body = %s,
+                expires_at = DATE_ADD(NOW(), INTERVAL {self.ttl} SECOND)
+            WHERE idem_key = %s
+        """
+        execute_query(query, (status_code, body, key), commit=True)
+
+    def abandon(self, key):
+        execute_query("DELETE FROM idempotency_keys WHERE idem_key = %s", (key,), commit=True)
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + self._PURGE_INTERVAL
+        execute_query("DELETE FROM idempotency_keys WHERE expires_at < NOW()", commit=True)
+
+
+def _create_store():
+    if Config.IDEMPOTENCY_STORE == 'memory':
+        return MemoryIdempotencyStore(
+            max_keys=Config.IDEMPOTENCY_MAX_KEYS, ttl=Config.IDEMPOTENCY_TTL, lease=Config.IDEMPOTENCY_LEASE
+        )
+    if Config.IDEMPOTENCY_STORE == 'database':
+        return DatabaseIdempotencyStore(ttl=Config.IDEMPOTENCY_TTL, lease=Config.IDEMPOTENCY_LEASE)
+    raise ValueError(f"Unsupported IDEMPOTENCY_STORE: {Config.IDEMPOTENCY_STORE}")
+
+
+store = _create_store()
+
+
+def idempotent(view):
+    """
+    View decorator honouring an ``Idempotency-Key`` request header
+
+    The first request with a key runs the view and its response (anything
+    below 500) is stored; a retry with the same key, caller and body gets
+    the stored response back, marked ``Idempotent-Replayed: true``, without
+    running the view again. A retry while the first is still running gets
+    409, the same key with a different body 422. Requests without the
+    header are not affected. Place it below @require_role so keys are
+    scoped to the signed-in user.
+
+    Usage:
+        @attendance_bp.route('/check-in', methods=['POST'])
+        @require_role('Manager', 'Lead', 'Member')
+        @idempotent
+        def check_in():
+            ...
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        client_key = request.headers.get('Idempotency-Key')
+        if not client_key:
+            return view(*args, **kwargs)
+        if len(client_key) > MAX_KEY_LENGTH:
+            return jsonify({"error": f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"}), 400
+
+        user = g.get('user')
+        scope = f"{request.endpoint}\n{user['username'] if user else ''}\n{client_key}"
+        key = hashlib.sha256(scope.encode()).hexdigest()
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+
+        try:
+            state = store.begin(key, request_hash)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+        if state == IN_PROGRESS:
+            return jsonify({"error": "A request with this Idempotency-Key is still being processed"}), 409, {
+                "Retry-After": "1"
+            }
+        if state == MISMATCH:
+            return jsonify({"error": "Idempotency-Key was already used for a different request"}), 422
+        if state != PROCEED:
+            status_code, body = state
+            response = current_app.response_class(body, status=status_code, mimetype='application/json')
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            _forget(key)
+            raise
+
+        # Server errors are not final; let the client's retry run again
+        if response.status_code >= 500:
+            _forget(key)
+        else:
+            try:
+                store.complete(key, response.status_code, response.get_data(as_text=True))
+            except Exception as e:
+                # The request itself succeeded; a retry will get 409 until the claim's lease runs out
+                idempotency_log.warning("Could not store idempotent response: %s", e)
+        return response
+    return wrapper
+
+
+def _forget(key):
+    try:
+        store.abandon(key)
+    except Exception as e:
+        idempotency_log.warning("Could not release Idempotency-Key claim: %s", e)
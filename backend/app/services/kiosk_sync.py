@@ -0,0 +1,208 @@
+from datetime import datetime, timedelta
+
+from ..config import Config
+from ..models.database import execute_many, execute_query, transaction
+from ..models.hierarchy import hierarchy
+
+ACTIONS = ('check-in', 'check-out')
+
+# Usernames per IN (...) lookup of open entries
+_LOOKUP_CHUNK = 500
+_MAX_DEVICE_ID_LENGTH = 64
+
+
+class KioskSyncConflict(Exception):
+    """Open entries changed while a batch was being applied; the whole batch was rolled back"""
+
+    def __init__(self):
+        super().__init__("Time entries changed while syncing, please retry the batch")
+
+
+def allowed_usernames(user):
+    """Return the usernames whose scans ``user`` may sync: a Lead's team, a Manager's Leads and their teams"""
+    if user['user_level'] == 'Manager':
+        leads = hierarchy.leads_of_manager(user['username'])
+    else:
+        leads = {user['username']}
+    allowed = set(leads)
+    for lead in leads:
+        allowed.update(hierarchy.members_of(lead))
+    return allowed
+
+
+def _parse_timestamp(value):
+    """Parse an ISO 8601 client timestamp into naive local time (how time_entries stores it)"""
+    if not isinstance(value, str):
+        raise ValueError
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.replace(microsecond=0)
+
+
+def _validate(event, allowed, latest):
+    """Return (username, action, timestamp, device_id) for a well-formed event, else an error message"""
+    if not isinstance(event, dict):
+        return "Event must be an object"
+    action = event.get('action')
+    if action not in ACTIONS:
+        return "action must be 'check-in' or 'check-out'"
+    username = event.get('member_username')
+    if not isinstance(username, str) or not username:
+        return "member_username is required"
+    if username not in allowed:
+        return "Member is not on your team"
+    device_id = event.get('device_id')
+    if not isinstance(device_id, str) or not device_id or len(device_id) > _MAX_DEVICE_ID_LENGTH:
+        return f"device_id is required (at most {_MAX_DEVICE_ID_LENGTH} characters)"
+    try:
+        timestamp = _parse_timestamp(event.get('timestamp'))
+    except ValueError:
+        return "timestamp must be an ISO 8601 date and time"
+    if timestamp > latest:
+        return "timestamp is in the future"
+    return username, action, timestamp, device_id
+
+
+def _load_entry_state(usernames):
+    """
+    Return the users' open entries and how far their recorded time reaches
+
+    Returns:
+        ({username: (entry id, in_time)}, {username: latest in_time or out_time})
+    """
+    usernames = sorted(usernames)
+    open_entries = {}
+    recorded_until = {}
+    for start in range(0, len(usernames), _LOOKUP_CHUNK):
+        chunk = tuple(usernames[start:start + _LOOKUP_CHUNK])
+        placeholders = ', '.join(['%s'] * len(chunk))
+        query = f"SELECT id, username, in_time FROM time_entries WHERE open_username IN ({placeholders})"
+        for row in execute_query(query, chunk, fetch_all=True):
+            open_entries[row['username']] = (row['id'], row['in_time'])
+
+        # Each user's latest entry, found through the (username, in_time) index
+        query = f"""
+            SELECT te.username, te.in_time, te.out_time
+            FROM time_entries te
+            WHERE te.username IN ({placeholders})
+              AND te.in_time = (SELECT MAX(latest.in_time) FROM time_entries latest
+                                WHERE latest.username = te.username)
+        """
+        for row in execute_query(query, chunk, fetch_all=True):
+            reached = max(row['in_time'], row['out_time'] or row['in_time'])
+            recorded_until[row['username']] = max(reached, recorded_until.get(row['username'], reached))
+    return open_entries, recorded_until
+
+
+def sync_events(events, user):
+    """
+    Validate and apply a kiosk's offline scans
+
+    Events are checked against the signed-in user's team and replayed in
+    timestamp order over the members' open entries, entirely in memory:
+    a lookup of the open and latest entries, then one transaction that
+    closes existing entries and inserts the new ones with multi-row
+    INSERTs. An event that does not fit (check-in while checked in or
+    before time already recorded, which also stops a re-sent batch from
+    applying twice; check-out without an open entry or before its
+    check-in; duplicate event_id from the same device) is rejected on its
+    own; the rest still apply. Entries are
+    approved by ``user``, who operated the kiosk.
+
+    Returns:
+        One result per event, in request order:
+        {"index", "event_id", "device_id", "status": "applied" | "rejected", "error"?}
+
+    Raises:
+        KioskSyncConflict: another request opened or closed one of the
+            entries meanwhile; nothing was written
+    """
+    allowed = allowed_usernames(user)
+    latest = datetime.now() + timedelta(seconds=Config.KIOSK_SYNC_MAX_CLOCK_SKEW)
+
+    results = []
+    valid = []
+    seen = set()
+    for index, event in enumerate(events):
+        event_id = event.get('event_id') if isinstance(event, dict) else None
+        device_id = event.get('device_id') if isinstance(event, dict) else None
+        result = {"index": index, "event_id": event_id, "device_id": device_id, "status": "applied"}
+        results.append(result)
+
+        checked = _validate(event, allowed, latest)
+        if isinstance(checked, str):
+            result.update(status="rejected", error=checked)
+            continue
+        if event_id is not None:
+            key = (checked[3], str(event_id))
+            if key in seen:
+                result.update(status="rejected", error="Duplicate event_id for this device")
+                continue
+            seen.add(key)
+        valid.append((checked[2], index, checked[0], checked[1]))
+
+    if not valid:
+        return results
+
+    # Replay in timestamp order; ties keep the order the kiosk sent them in
+    valid.sort(key=lambda item: (item[0], item[1]))
+    open_entries, recorded_until = _load_entry_state({item[2] for item in valid})
+
+    # username -> [in_time, existing entry id or None, new row or None]
+    state = {username: [in_time, entry_id, None] for username, (entry_id, in_time) in open_entries.items()}
+    new_rows = []
+    closed = []  # (out_time, existing entry id)
+    for timestamp, index, username, action in valid:
+        current = state.get(username)
+        if action == 'check-in':
+            if current is not None:
+                results[index].update(status="rejected", error="Member already has an open time entry")
+                continue
+            if username in recorded_until and timestamp < recorded_until[username]:
+                results[index].update(status="rejected", error="Check-in overlaps time already recorded")
+                continue
+            row = [username, timestamp, None]
+            new_rows.append(row)
+            state[username] = [timestamp, None, row]
+            recorded_until[username] = timestamp
+        else:
+            if current is None:
+                results[index].update(status="rejected", error="No open time entry found")
+                continue
+            in_time, entry_id, row = current
+            if timestamp < in_time:
+                results[index].update(status="rejected", error="Check-out is earlier than the check-in")
+                continue
+            if row is not None:
+                row[2] = timestamp
+            else:
+                closed.append((timestamp, entry_id))
+            del state[username]
+            recorded_until[username] = timestamp
+
+    approver = user['username']
+    with transaction():
+        # Close existing entries first, so a Member's new open entry does
+        # not collide with the old one on the open-entry index
+        if closed:
+            update_query = """
+                UPDATE time_entries
+                SET out_time = %s
+                WHERE id = %s AND out_time IS NULL
+            """
+            if sum(execute_many(update_query, closed)) != len(closed):
+                raise KioskSyncConflict()
+        if new_rows:
+            insert_query = """
+                INSERT INTO time_entries
+                (username, in_time, out_time, status, approved_by, approved_at)
+                VALUES (%s, %s, %s, 'Approved', %s, NOW())
+            """
+            try:
+                execute_many(insert_query, [(*row, approver) for row in new_rows])
+            except Exception as e:
+                if "Duplicate entry" in str(e):
+                    raise KioskSyncConflict() from e
+                raise
+    return results
@@ -0,0 +1,250 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+from ..config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows: the set is only shared between threads
+    fcntl = None
+
+# Shared file: per bucket an epoch header followed by its slots of nonce hashes
+_EPOCH = struct.Struct('<q')
+_SLOT = struct.Struct('<Q')
+_EMPTY = 0
+_DELETED = 2  # nonce hashes are odd, so this never collides with one
+# Slots examined for a nonce before its bucket counts as full
+_PROBES = 32
+
+
+def _hash(nonce):
+    return int.from_bytes(hashlib.blake2b(nonce.encode(), digest_size=8).digest(), 'little') | 1
+
+
+class MemoryNonceSet:
+    """
+    Used QR nonces of this process, in buckets by expiry time
+
+    A nonce is kept in the bucket of its token's expiry until that bucket's
+    time has passed, then the whole bucket is dropped: memory is bounded by
+    the tokens scanned within one QR_TOKEN_TTL, not by history. Only scans
+    that reach this worker are seen; use the shared set with several workers.
+    """
+
+    def __init__(self, bucket_seconds=60):
+        self.bucket_seconds = max(1, int(bucket_seconds))
+        self._lock = threading.Lock()
+        self._buckets = {}  # bucket index -> set of nonces
+        self._oldest = 0
+
+        # Statistics
+        self._added = 0
+        self._replays = 0
+
+    def add(self, nonce, expires_at):
+        """
+        Record a nonce used until ``expires_at`` (Unix time)
+
+        Returns:
+            False if it was already recorded (a replay), else True
+        """
+        index = int(expires_at) // self.bucket_seconds
+        with self._lock:
+            self._expire(int(time.time()) // self.bucket_seconds)
+            if index < self._oldest:
+                # The token has expired; its signature check rejects it anyway
+                return True
+            bucket = self._buckets.setdefault(index, set())
+            if nonce in bucket:
+                self._replays += 1
+                return False
+            bucket.add(nonce)
+            self._added += 1
+            return True
+
+    def discard(self, nonce, expires_at):
+        """Forget a nonce whose scan was rolled back, so the code can be scanned again"""
+        with self._lock:
+            bucket = self._buckets.get(int(expires_at) // self.bucket_seconds)
+            if bucket is not None:
+                bucket.discard(nonce)
+
+    def _expire(self, current):
+        if current <= self._oldest:
+            return
+        for index in [index for index in self._buckets if index < current]:
+            del self._buckets[index]
+        self._oldest = current
+
+    def stats(self):
+        """Return the live buckets' size and counters"""
+        with self._lock:
+            return {
+                "store": "memory",
+                "bucket_seconds": self.bucket_seconds,
+                "buckets": len(self._buckets),
+                "nonces": sum(len(bucket) for bucket in self._buckets.values()),
+                "added": self._added,
+                "replays": self._replays,
+            }
+
+
+class SharedNonceSet:
+    """
+    Used QR nonces shared by all worker processes through a memory-mapped file
+
+    The file is a ring of fixed-size buckets, one per ``bucket_seconds`` of
+    token expiry, sized to cover ``window`` seconds. Each bucket is an
+    open-addressed table of 8-byte nonce hashes under an epoch header; a
+    ring slot whose epoch has passed is wiped and reused, which is how old
+    nonces drop off. Locking is the same as the rate limiter's (a thread
+    lock plus flock). A nonce that finds its bucket full is not recorded
+    and counted as an overflow; the qr_used_tokens record still stops a
+    replay of it.
+    """
+
+    def __init__(self, path, window=300, bucket_seconds=60, slots=16384):
+        self.path = path
+        self.bucket_seconds = max(1, int(bucket_seconds))
+        self.slots = max(_PROBES, slots)
+        # Live buckets span the window, plus the current one and a spare
+        self.buckets = -(-int(window) // self.bucket_seconds) + 2
+        self._bucket_size = _EPOCH.size + self.slots * _SLOT.size
+
+        self._lock = threading.Lock()
+        self._fd = None
+        self._map = None
+        self._pid = None
+
+        # Statistics (this process)
+        self._added = 0
+        self._replays = 0
+        self._overflows = 0
+
+    def _open(self):
+        # flock belongs to the open file description, which a forked worker
+        # would share with its parent, so every process opens its own
+        if self._fd is not None:
+            self._map.close()
+            os.close(self._fd)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = self.buckets * self._bucket_size
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        self._map = mmap.mmap(fd, size)
+        self._fd = fd
+        self._pid = os.getpid()
+
+    def _locked(self, func, *args):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                return func(*args)
+            finally:
+                if fcntl:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def add(self, nonce, expires_at):
+        """
+        Record a nonce used until ``expires_at`` (Unix time)
+
+        Returns:
+            False if any worker already recorded it (a replay), else True
+        """
+        index = int(expires_at) // self.bucket_seconds
+        current = int(time.time()) // self.bucket_seconds
+        if index < current or index >= current + self.buckets - 1:
+            # Expired (rejected by its signature check anyway) or beyond the
+            # ring, which would overwrite a live bucket
+            with self._lock:
+                self._overflows += index >= current
+            return True
+        added = self._locked(self._add, _hash(nonce), index)
+        with self._lock:
+            if added is None:
+                self._overflows += 1
+            elif added:
+                self._added += 1
+            else:
+                self._replays += 1
+        return added is not False
+
+    def _bucket(self, index):
+        """Return the offset of ``index``'s bucket, wiping a ring slot left over from an expired one"""
+        base = (index % self.buckets) * self._bucket_size
+        (epoch,) = _EPOCH.unpack_from(self._map, base)
+        if epoch != index:
+            self._map[base:base + self._bucket_size] = bytes(self._bucket_size)
+            _EPOCH.pack_into(self._map, base, index)
+        return base + _EPOCH.size
+
+    def _add(self, digest, index):
+        start = self._bucket(index)
+        free = None
+        for probe in range(_PROBES):
+            offset = start + ((digest + probe) % self.slots) * _SLOT.size
+            (slot,) = _SLOT.unpack_from(self._map, offset)
+            if slot == digest:
+                return False
+            if slot in (_EMPTY, _DELETED) and free is None:
+                free = offset
+            if slot == _EMPTY:
+                break
+        if free is None:
+            return None
+        _SLOT.pack_into(self._map, free, digest)
+        return True
+
+    def discard(self, nonce, expires_at):
+        """Forget a nonce whose scan was rolled back, so the code can be scanned again"""
+        self._locked(self._discard, _hash(nonce), int(expires_at) // self.bucket_seconds)
+
+    def _discard(self, digest, index):
+        base = (index % self.buckets) * self._bucket_size
+        if _EPOCH.unpack_from(self._map, base)[0] != index:
+            return
+        start = base + _EPOCH.size
+        for probe in range(_PROBES):
+            offset = start + ((digest + probe) % self.slots) * _SLOT.size
+            (slot,) = _SLOT.unpack_from(self._map, offset)
+            if slot == digest:
+                # A tombstone keeps later nonces of the probe chain reachable
+                _SLOT.pack_into(self._map, offset, _DELETED)
+                return
+            if slot == _EMPTY:
+                return
+
+    def stats(self):
+        """Return the ring's geometry and this process's counters"""
+        with self._lock:
+            return {
+                "store": "shared",
+                "file": self.path,
+                "bucket_seconds": self.bucket_seconds,
+                "buckets": self.buckets,
+                "slots_per_bucket": self.slots,
+                "added": self._added,
+                "replays": self._replays,
+                "overflows": self._overflows,
+            }
+
+
+def _create_nonce_set():
+    if Config.QR_NONCE_STORE == 'memory':
+        return MemoryNonceSet(bucket_seconds=Config.QR_NONCE_BUCKET_SECONDS)
+    if Config.QR_NONCE_STORE == 'shared':
+        return SharedNonceSet(
+            Config.QR_NONCE_FILE, window=Config.QR_TOKEN_TTL,
+            bucket_seconds=Config.QR_NONCE_BUCKET_SECONDS, slots=Config.QR_NONCE_SLOTS
+        )
+    raise ValueError(f"Unsupported QR_NONCE_STORE: {Config.QR_NONCE_STORE}")
+
+
+used_nonces = _create_nonce_set()
@@ -0,0 +1,173 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ..config import Config
+
+# Stored format: scrypt$<log2 n>$<r>$<p>$<salt>$<hash> (salt and hash base64)
+SCHEME = 'scrypt'
+_SALT_BYTES = 16
+_HASH_BYTES = 32
+
+
+class PasswordHasherBusy(Exception):
+    """Raised instead of queueing when the hashing pool's backlog is full"""
+
+    def __init__(self):
+        super().__init__("Too many sign-in requests in progress, please retry shortly")
+
+
+class PasswordHasher:
+    """
+    Run scrypt on a small, bounded thread pool
+
+    A KDF deliberately burns tens of milliseconds of CPU per call; doing it
+    on the request thread lets a login storm tie up every worker. Hashes run
+    on ``workers`` threads (hashlib.scrypt releases the GIL) and at most
+    ``max_queue`` more may wait; beyond that PasswordHasherBusy is raised
+    at once so the caller can answer 503 instead of piling up requests.
+    """
+
+    def __init__(self, workers=2, max_queue=16, timeout=10.0, log_n=14, r=8, p=1):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self.log_n = log_n
+        self.r = r
+        self.p = p
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._executor = None
+        self._pid = None
+
+        # Statistics
+        self._completed = 0
+        self._rejected = 0
+        self._in_flight = 0
+
+    def _get_executor(self):
+        # Threads do not survive fork; a worker forked from a preloaded
+        # master starts its own pool
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='password-hash'
+                    )
+                    self._pid = pid
+        return self._executor
+
+    def _submit(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PasswordHasherBusy()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._finished(None)
+            raise
+        # The slot is held until the hash finishes, even if the caller gives up
+        future.add_done_callback(self._finished)
+        return future.result(timeout=self.timeout)
+
+    def _finished(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+        self._slots.release()
+
+    def _scrypt(self, password, salt, log_n, r, p):
+        return hashlib.scrypt(
+            password.encode(), salt=salt, n=2 ** log_n, r=r, p=p,
+            maxmem=256 * r * 2 ** log_n, dklen=_HASH_BYTES
+        )
+
+    def _hash(self, password):
+        salt = secrets.token_bytes(_SALT_BYTES)
+        digest = self._scrypt(password, salt, self.log_n, self.r, self.p)
+        return '$'.join((
+            SCHEME, str(self.log_n), str(self.r), str(self.p),
+            base64.b64encode(salt).decode('ascii'),
+            base64.b64encode(digest).decode('ascii'),
+        ))
+
+    def _verify(self, password, stored):
+        _, log_n, r, p, salt, digest = stored.split('$')
+        actual = self._scrypt(password, base64.b64decode(salt), int(log_n), int(r), int(p))
+        return hmac.compare_digest(actual, base64.b64decode(digest))
+
+    def hash(self, password):
+        """Return the scrypt hash of ``password`` in the stored format"""
+        return self._submit(self._hash, password)
+
+    def verify(self, password, stored):
+        """
+        Check ``password`` against a stored hash
+
+        Returns:
+            (matches, needs_rehash). needs_rehash is True for a match against
+            a legacy unsalted SHA-256 hash or weaker scrypt parameters, so the
+            caller can store hash(password) in its place.
+        """
+        if not stored:
+            # Members have no password
+            return False, False
+
+        if not stored.startswith(SCHEME + '$'):
+            legacy = hashlib.sha256(password.encode()).hexdigest()
+            return hmac.compare_digest(legacy, stored), True
+
+        matches = self._submit(self._verify, password, stored)
+        current = f"{SCHEME}${self.log_n}${self.r}${self.p}$"
+        return matches, matches and not stored.startswith(current)
+
+    def stats(self):
+        """Return pool size, backlog and counters"""
+        with self._lock:
+            return {
+                "algorithm": f"{SCHEME} (n=2^{self.log_n}, r={self.r}, p={self.p})",
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+
+hasher = PasswordHasher(
+    workers=Config.PASSWORD_HASH_WORKERS,
+    max_queue=Config.PASSWORD_HASH_QUEUE,
+    timeout=Config.PASSWORD_HASH_TIMEOUT,
+    log_n=Config.PASSWORD_SCRYPT_LOG_N,
+    r=Config.PASSWORD_SCRYPT_R,
+    p=Config.PASSWORD_SCRYPT_P,
+)
+
+# Verified when the username does not exist, so unknown and known users
+# take the same time to reject
+_DUMMY_HASH = None
+
+
+def hash_password(password):
+    """Hash a new password (raises PasswordHasherBusy when the pool is saturated)"""
+    return hasher.hash(password)
+
+
+def verify_password(password, stored):
+    """Return (matches, needs_rehash) for a stored password hash; see PasswordHasher.verify"""
+    global _DUMMY_HASH
+    if stored is None:
+        if _DUMMY_HASH is None:
+            _DUMMY_HASH = hasher.hash(secrets.token_hex(8))
+        hasher.verify(password, _DUMMY_HASH)
+        return False, False
+    return hasher.verify(password, stored)
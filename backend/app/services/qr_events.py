@@ -0,0 +1,143 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+from ..config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows: only changes made in this process are seen
+    fcntl = None
+
+# One 8-byte generation counter per slot; tokens are hashed onto slots
+_COUNTER = struct.Struct('<Q')
+
+
+def _slot(token, slots):
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), 'little') % slots
+
+
+class QRStatusEvents:
+    """
+    Wake-ups for requests waiting on a QR code's status
+
+    Every status change of a code (scanned, failed) bumps the generation
+    counter of the code's slot, and a waiter returns as soon as its slot's
+    counter differs from what it saw before reading the status, so no change
+    between the read and the wait is missed. Waiters in the publishing
+    process are woken at once through a condition variable. The counters
+    live in a memory-mapped file shared by all workers on the host, which a
+    waiter re-reads every ``check_interval_ms``, so a scan handled by another
+    worker is noticed within that interval, without a query. With no
+    ``path`` the counters are private to the process.
+
+    Codes sharing a slot only cause an extra wake-up; the waiter reads the
+    status again and finds it unchanged.
+    """
+
+    def __init__(self, path=None, slots=4096, check_interval_ms=100):
+        self.path = path
+        self.slots = max(1, slots)
+        self.check_interval = max(1, check_interval_ms) / 1000.0
+
+        self._cond = threading.Condition()
+        self._fd = None
+        self._map = None
+        self._pid = None
+
+        # Statistics (this process)
+        self._published = 0
+        self._waiting = 0
+        self._woken = 0
+        self._timeouts = 0
+
+    def _open(self):
+        # Each process maps the file itself; flock is per open file description
+        if self._map is not None:
+            self._map.close()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        size = self.slots * _COUNTER.size
+        if self.path:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+            self._fd = fd
+        else:
+            self._map = mmap.mmap(-1, size)
+        self._pid = os.getpid()
+
+    def _counter(self, token):
+        """Return the offset of the token's counter; call with self._cond held"""
+        if self._pid != os.getpid():
+            self._open()
+        return _slot(token, self.slots) * _COUNTER.size
+
+    def generation(self, token):
+        """Return the current generation of the token's slot, to pass to wait()"""
+        with self._cond:
+            offset = self._counter(token)
+            return _COUNTER.unpack_from(self._map, offset)[0]
+
+    def publish(self, token):
+        """Announce that the token's status has changed (call once the change is committed)"""
+        with self._cond:
+            offset = self._counter(token)
+            if self._fd is not None and fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                (value,) = _COUNTER.unpack_from(self._map, offset)
+                _COUNTER.pack_into(self._map, offset, value + 1)
+            finally:
+                if self._fd is not None and fcntl:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._published += 1
+            self._cond.notify_all()
+
+    def wait(self, token, since, timeout):
+        """
+        Block until the token's generation moves past ``since`` or ``timeout`` seconds pass
+
+        Returns:
+            True if woken by a change, False on timeout
+        """
+        deadline = time.monotonic() + max(0, timeout)
+        with self._cond:
+            offset = self._counter(token)
+            self._waiting += 1
+            try:
+                while _COUNTER.unpack_from(self._map, offset)[0] == since:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        return False
+                    self._cond.wait(min(remaining, self.check_interval))
+                self._woken += 1
+                return True
+            finally:
+                self._waiting -= 1
+
+    def stats(self):
+        """Return the waiters and wake-up counters of this process"""
+        with self._cond:
+            return {
+                "file": self.path or None,
+                "slots": self.slots,
+                "check_interval_ms": self.check_interval * 1000,
+                "waiting": self._waiting,
+                "published": self._published,
+                "woken": self._woken,
+                "timeouts": self._timeouts,
+            }
+
+
+qr_status_events = QRStatusEvents(
+    path=Config.QR_STATUS_EVENTS_FILE,
+    slots=Config.QR_STATUS_EVENTS_SLOTS,
+    check_interval_ms=Config.QR_STATUS_CHECK_MS,
+)
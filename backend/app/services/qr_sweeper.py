@@ -0,0 +1,216 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from ..config import Config
+from ..models.database import execute_query, execute_write
+
+try:
+    import fcntl
+except ImportError:  # Windows: every worker sweeps, which is only wasted work
+    fcntl = None
+
+sweeper_log = logging.getLogger('app.qr_sweeper')
+
+# Scanned, failed or expired codes that are old enough to delete
+_FINISHED = "status IN ('used', 'failed', 'expired')"
+
+
+def parse_hours(value):
+    """
+    Parse ``"06-09,17-20"`` into [(6, 9), (17, 20)]: hour ranges, end exclusive
+
+    A range may wrap midnight (``"22-02"``); an empty string means none.
+    """
+    ranges = []
+    for part in filter(None, (item.strip() for item in value.split(','))):
+        start, end = part.split('-')
+        ranges.append((int(start) % 24, int(end) % 24))
+    return ranges
+
+
+def _in_hours(hour, ranges):
+    return any(start <= hour < end if start <= end else hour >= start or hour < end for start, end in ranges)
+
+
+class QRSweeper:
+    """
+    Background maintenance of qr_requests and qr_used_tokens
+
+    Every ``interval`` seconds one worker process (whoever holds the flock
+    on ``lock_file``) marks pending codes past their expiry as 'expired'
+    and deletes finished codes and used-token records whose expiry is more
+    than ``retention_days`` ago. Each step selects at most ``batch_size``
+    ids through the (status, expires_at) index and updates or deletes just
+    those in its own short transaction, sleeping ``pause_ms`` in between,
+    so locks are held briefly and scans keep going. Runs are skipped
+    altogether during ``busy_hours``.
+    """
+
+    def __init__(self, interval=300, batch_size=500, pause_ms=200, retention_days=30,
+                 busy_hours='', lock_file=None, max_batches=1000):
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.pause = max(0, pause_ms) / 1000.0
+        self.retention_days = retention_days
+        self.busy_hours = parse_hours(busy_hours)
+        self.lock_file = lock_file
+        self.max_batches = max(1, max_batches)
+
+        self._lock = threading.Lock()
+        self._pid = None
+
+        # Statistics (this process)
+        self._runs = 0
+        self._skipped = 0
+        self._totals = {"expired": 0, "purged": 0, "used_tokens_purged": 0}
+        self._last_run = None
+
+    def ensure_started(self):
+        """Start this process's sweeper thread; threads do not survive fork, so check on every request"""
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._loop, name='qr-sweeper', daemon=True).start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception:
+                sweeper_log.exception("QR sweep failed")
+
+    def run_once(self, force=False):
+        """
+        Run one sweep if this process wins the lock (and, unless ``force``, outside busy hours)
+
+        Returns:
+            The run's report, or None if it was skipped
+        """
+        if not force and _in_hours(datetime.now().hour, self.busy_hours):
+            with self._lock:
+                self._skipped += 1
+            return None
+
+        fd = self._try_lock()
+        if fd is False:
+            with self._lock:
+                self._skipped += 1
+            return None
+        try:
+            return self._sweep()
+        finally:
+            if fd is not None:
+                os.close(fd)  # also releases the flock
+
+    def _try_lock(self):
+        """Return the locked file descriptor, None without locking support, or False if another worker holds it"""
+        if fcntl is None or not self.lock_file:
+            return None
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        return fd
+
+    def _sweep(self):
+        started = time.monotonic()
+        now = datetime.now().replace(microsecond=0)
+        cutoff = now - timedelta(days=self.retention_days)
+        report = {"started_at": now.isoformat(), "expired": 0, "purged": 0, "used_tokens_purged": 0, "batches": 0}
+
+        # Pending codes nobody scanned in time
+        report["expired"] = self._in_batches(
+            report,
+            "SELECT id FROM qr_requests WHERE status = 'pending' AND expires_at < %s ORDER BY expires_at LIMIT %s",
+            "UPDATE qr_requests SET status = 'expired' WHERE status = 'pending' AND id IN ({ids})",
+            now
+        )
+        report["purged"] = self._in_batches(
+            report,
+            f"SELECT id FROM qr_requests WHERE {_FINISHED} AND expires_at < %s ORDER BY expires_at LIMIT %s",
+            "DELETE FROM qr_requests WHERE id IN ({ids})",
+            cutoff
+        )
+        # Signed tokens can no longer be replayed once expired; the record
+        # is only kept for /qr/status
+        report["used_tokens_purged"] = self._in_batches(
+            report,
+            "SELECT nonce AS id FROM qr_used_tokens WHERE expires_at < %s ORDER BY expires_at LIMIT %s",
+            "DELETE FROM qr_used_tokens WHERE nonce IN ({ids})",
+            cutoff
+        )
+        report["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+
+        with self._lock:
+            self._runs += 1
+            for key in self._totals:
+                self._totals[key] += report[key]
+            self._last_run = report
+        sweeper_log.info(
+            "QR sweep: %d expired, %d purged, %d used tokens purged in %d batches (%.0fms)",
+            report["expired"], report["purged"], report["used_tokens_purged"], report["batches"],
+            report["duration_ms"]
+        )
+        return report
+
+    def _in_batches(self, report, select_query, change_query, before):
+        """Apply ``change_query`` to the ids ``select_query`` finds, ``batch_size`` at a time; return the rows changed"""
+        changed = 0
+        for _ in range(self.max_batches):
+            rows = execute_query(select_query, (before, self.batch_size), fetch_all=True)
+            if not rows:
+                break
+            ids = tuple(row['id'] for row in rows)
+            query = change_query.format(ids=', '.join(['%s'] * len(ids)))
+            changed += execute_write(query, ids).rowcount
+            report["batches"] += 1
+            if len(rows) < self.batch_size:
+                break
+            time.sleep(self.pause)
+        return changed
+
+    def stats(self):
+        """Return the settings, this process's run counters and its last run's report"""
+        with self._lock:
+            return {
+                "interval_seconds": self.interval,
+                "batch_size": self.batch_size,
+                "pause_ms": self.pause * 1000,
+                "retention_days": self.retention_days,
+                "busy_hours": [f"{start:02d}-{end:02d}" for start, end in self.busy_hours],
+                "running": self._pid == os.getpid(),
+                "runs": self._runs,
+                "skipped": self._skipped,
+                "totals": dict(self._totals),
+                "last_run": self._last_run,
+            }
+
+
+def qr_table_sizes():
+    """Row counts of qr_requests by status and of qr_used_tokens"""
+    rows = execute_query("SELECT status, COUNT(*) AS count FROM qr_requests GROUP BY status", fetch_all=True)
+    used = execute_query("SELECT COUNT(*) AS count FROM qr_used_tokens", fetch_one=True)
+    by_status = {row['status']: row['count'] for row in rows}
+    return {
+        "qr_requests": sum(by_status.values()),
+        "qr_requests_by_status": by_status,
+        "qr_used_tokens": used['count'],
+    }
+
+
+qr_sweeper = QRSweeper(
+    interval=Config.QR_SWEEP_INTERVAL,
+    batch_size=Config.QR_SWEEP_BATCH_SIZE,
+    pause_ms=Config.QR_SWEEP_PAUSE_MS,
+    retention_days=Config.QR_RETENTION_DAYS,
+    busy_hours=Config.QR_SWEEP_BUSY_HOURS,
+    lock_file=Config.QR_SWEEP_LOCK_FILE,
+)
@@ -0,0 +1,114 @@
+import hashlib
+import hmac
+import json
+import secrets
+import time
+from datetime import datetime
+
+from ..config import Config
+from ..models.database import execute_query, execute_write
+from .tokens import _b64decode, _b64encode, signing_key
+
+# Keeps a QR signature from ever verifying as a session token signature and vice versa
+_DOMAIN = b'qr-token:'
+
+
+# Claim name -> key in the token payload
+_COMPACT = {"lead": "l", "member": "m", "act": "a", "iat": "t", "exp": "e", "nonce": "n"}
+
+
+class InvalidQRToken(Exception):
+    """Raised for a signed QR token that is malformed, tampered with or expired"""
+
+
+def is_signed_token(token):
+    """True for a stateless signed token; tokens stored in qr_requests are plain hex"""
+    return '.' in token
+
+
+def _signature(payload):
+    return hmac.new(signing_key(Config.QR_SIGNING_KEY, 'QR_SIGNING_KEY (or SECRET_KEY)'), _DOMAIN + payload.encode('ascii'), hashlib.sha256).digest()
+
+
+def issue_qr_token(lead_username, member_username, action, ttl=None):
+    """
+    Create a signed QR token that needs no database row
+
+    Like a session token, it is ``<payload>.<signature>``: base64url JSON
+    claims (Lead, Member, action, issue and expiry time, random nonce)
+    followed by their HMAC-SHA256 under Config.QR_SIGNING_KEY. The nonce
+    identifies the token in qr_used_tokens once it has been scanned.
+
+    Returns:
+        (token, issued_at, expires_at) with naive local datetimes
+    """
+    issued_at = int(time.time())
+    claims = {
+        "lead": lead_username,
+        "member": member_username,
+        "act": action,
+        "iat": issued_at,
+        "exp": issued_at + (ttl or Config.QR_TOKEN_TTL),
+        "nonce": secrets.token_hex(16),
+    }
+    # One-letter keys keep the QR code small enough to scan at a distance
+    compact = {_COMPACT[name]: value for name, value in claims.items()}
+    payload = _b64encode(json.dumps(compact, separators=(',', ':')).encode())
+    token = f"{payload}.{_b64encode(_signature(payload))}"
+    return token, datetime.fromtimestamp(claims['iat']), datetime.fromtimestamp(claims['exp'])
+
+
+def verify_qr_token(token, allow_expired=False):
+    """
+    Check a signed QR token's signature and expiry
+
+    Returns:
+        The claims: {"lead", "member", "act", "iat", "exp", "nonce"}
+
+    Raises:
+        InvalidQRToken: malformed, bad signature, or expired (unless allow_expired)
+    """
+    try:
+        payload, signature = token.split('.')
+        valid = hmac.compare_digest(_b64decode(signature), _signature(payload))
+    except (ValueError, UnicodeEncodeError):
+        raise InvalidQRToken("Malformed QR token")
+    if not valid:
+        raise InvalidQRToken("Invalid QR token")
+
+    compact = json.loads(_b64decode(payload))
+    claims = {name: compact[key] for name, key in _COMPACT.items()}
+    if not allow_expired and claims['exp'] <= time.time():
+        raise InvalidQRToken("QR token has expired")
+    return claims
+
+
+def claim_qr_token(claims):
+    """
+    Record a signed token as used; False if it already was (a replay)
+
+    A single no-op upsert on the nonce, so of two concurrent scans exactly
+    one wins. Run it in the same transaction() as the time entry write, so
+    a scan that fails to apply does not use the token up.
+    """
+    claim_query = """
+        INSERT INTO qr_used_tokens (nonce, status, used_at, expires_at)
+        VALUES (%s, 'used', NOW(), %s)
+        ON DUPLICATE KEY UPDATE nonce = nonce
+    """
+    expires_at = datetime.fromtimestamp(claims['exp'])
+    return bool(execute_write(claim_query, (claims['nonce'], expires_at)).rowcount)
+
+
+def mark_qr_token_failed(claims):
+    """Record that a claimed token was scanned but its action could not be applied"""
+    execute_query(
+        "UPDATE qr_used_tokens SET status = 'failed' WHERE nonce = %s",
+        (claims['nonce'],), commit=True
+    )
+
+
+def qr_token_status(claims):
+    """Return the token's used-token record ({"status", "used_at"}) or None if it has not been scanned"""
+    query = "SELECT status, used_at FROM qr_used_tokens WHERE nonce = %s"
+    return execute_query(query, (claims['nonce'],), fetch_one=True)
@@ -0,0 +1,158 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify, request
+
+from ..config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows: buckets are only shared between threads
+    fcntl = None
+
+# One bucket: key hash, tokens left, last refill (Unix time)
+_SLOT = struct.Struct('<Qdd')
+# Slots examined for a key before the stalest one is reused
+_PROBES = 8
+
+
+class SharedTokenBuckets:
+    """
+    Token buckets kept in a memory-mapped file shared by all worker processes
+
+    The file is a fixed-size open-addressed table of (key hash, tokens,
+    last refill) slots. A check locks the table (a thread lock plus flock,
+    which does not exclude threads sharing one descriptor), refills the
+    key's bucket for the time elapsed and takes a token: a few
+    microseconds, no database and no other service. When the probed slots
+    are all taken, the one updated longest ago is reused, which at worst
+    hands that key a fresh bucket.
+    """
+
+    def __init__(self, path, slots=8192):
+        self.path = path
+        self.slots = max(_PROBES, slots)
+
+        self._lock = threading.Lock()
+        self._fd = None
+        self._map = None
+        self._pid = None
+
+        # Statistics (this process)
+        self._allowed = 0
+        self._rejected = 0
+
+    def _open(self):
+        # flock belongs to the open file description, which a forked worker
+        # would share with its parent, so every process opens its own
+        if self._fd is not None:
+            self._map.close()
+            os.close(self._fd)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = self.slots * _SLOT.size
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        self._map = mmap.mmap(fd, size)
+        self._fd = fd
+        self._pid = os.getpid()
+
+    def take(self, key, capacity, per_second):
+        """
+        Take a token from ``key``'s bucket
+
+        Returns:
+            0 if the call is allowed, else seconds until a token is available
+        """
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') | 1
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                retry_after = self._take(digest, capacity, per_second, time.time())
+            finally:
+                if fcntl:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+            if retry_after:
+                self._rejected += 1
+            else:
+                self._allowed += 1
+            return retry_after
+
+    def _take(self, digest, capacity, per_second, now):
+        start = digest % self.slots
+        victim = None
+        for probe in range(_PROBES):
+            offset = ((start + probe) % self.slots) * _SLOT.size
+            slot_key, tokens, updated = _SLOT.unpack_from(self._map, offset)
+            if slot_key == digest:
+                tokens = min(capacity, tokens + max(0.0, now - updated) * per_second)
+                break
+            if victim is None or updated < victim[1]:
+                victim = (offset, updated)
+        else:
+            offset, tokens = victim[0], capacity
+
+        if tokens < 1:
+            _SLOT.pack_into(self._map, offset, digest, tokens, now)
+            return (1 - tokens) / per_second
+        _SLOT.pack_into(self._map, offset, digest, tokens - 1, now)
+        return 0
+
+    def stats(self):
+        """Return this process's allowed/rejected counts"""
+        with self._lock:
+            return {
+                "file": self.path,
+                "slots": self.slots,
+                "allowed": self._allowed,
+                "rejected": self._rejected,
+            }
+
+
+buckets = SharedTokenBuckets(Config.RATE_LIMIT_FILE, slots=Config.RATE_LIMIT_SLOTS)
+
+
+def login_rate_limit(view):
+    """
+    View decorator limiting password attempts per username and per client IP
+
+    Runs before the view, so a rejected attempt costs no query and no
+    password hash. The username is the URL's ``<username>`` or the JSON
+    body's "username". Over the limit the client gets 429 + Retry-After.
+
+    Usage:
+        @auth_bp.route('/login', methods=['POST'])
+        @login_rate_limit
+        def login():
+            ...
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        retry_after = 0
+        if Config.LOGIN_LIMIT_IP_PER_MINUTE:
+            retry_after = buckets.take(
+                f"ip:{request.remote_addr}",
+                Config.LOGIN_LIMIT_IP_BURST, Config.LOGIN_LIMIT_IP_PER_MINUTE / 60.0
+            )
+
+        username = kwargs.get('username') or (request.get_json(silent=True) or {}).get('username')
+        if not retry_after and username and Config.LOGIN_LIMIT_USER_PER_MINUTE:
+            retry_after = buckets.take(
+                f"user:{username}",
+                Config.LOGIN_LIMIT_USER_BURST, Config.LOGIN_LIMIT_USER_PER_MINUTE / 60.0
+            )
+
+        if retry_after:
+            return jsonify({"error": "Too many attempts, please retry later"}), 429, {
+                "Retry-After": str(math.ceil(retry_after))
+            }
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,94 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+from ..config import Config
+
+
+# Keys published with this code (config default, .env.example); anyone
+# could sign tokens with them
+_PUBLIC_KEYS = frozenset({'', 'dev-secret-key-change-in-production', 'change-this-to-a-random-secret-key'})
+
+
+class InvalidToken(Exception):
+    """Raised for a session token that is malformed, tampered with or expired"""
+
+
+class SigningKeyNotSet(Exception):
+    """Raised while a signing key is unset or one of the published defaults"""
+
+
+def is_public_key(key):
+    """True for a signing key that is empty or one of the defaults shipped with the code"""
+    return key in _PUBLIC_KEYS
+
+
+def signing_key(key, name):
+    """
+    Return ``key`` as bytes for HMAC signing
+
+    Raises:
+        SigningKeyNotSet: the key is public, so tokens are neither issued nor accepted
+    """
+    if is_public_key(key):
+        raise SigningKeyNotSet(f"{name} is not set; tokens are disabled until it is set to a random secret")
+    return key.encode()
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _signature(payload):
+    return hmac.new(signing_key(Config.SECRET_KEY, 'SECRET_KEY'), payload.encode('ascii'), hashlib.sha256).digest()
+
+
+def issue_token(username, user_level, ttl=None):
+    """
+    Create a signed session token for a logged-in user
+
+    The token is ``<payload>.<signature>``: the base64url JSON claims
+    (username, role, expiry) followed by their HMAC-SHA256 under
+    Config.SECRET_KEY, so it can be verified without a database lookup.
+
+    Returns:
+        (token, expires_at) where expires_at is a Unix timestamp
+
+    Raises:
+        SigningKeyNotSet: SECRET_KEY is unset or a published default
+    """
+    expires_at = int(time.time()) + (ttl or Config.SESSION_TOKEN_TTL)
+    claims = {"sub": username, "role": user_level, "exp": expires_at}
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+    return f"{payload}.{_b64encode(_signature(payload))}", expires_at
+
+
+def verify_token(token):
+    """
+    Check a session token's signature and expiry
+
+    Returns:
+        {"username": ..., "user_level": ...}
+
+    Raises:
+        InvalidToken: the token is malformed, its signature does not match or it has expired
+        SigningKeyNotSet: SECRET_KEY is unset or a published default
+    """
+    try:
+        payload, signature = token.split('.')
+        valid = hmac.compare_digest(_b64decode(signature), _signature(payload))
+    except (ValueError, UnicodeEncodeError):
+        raise InvalidToken("Malformed session token")
+    if not valid:
+        raise InvalidToken("Invalid session token")
+
+    claims = json.loads(_b64decode(payload))
+    if claims['exp'] <= time.time():
+        raise InvalidToken("Session token has expired")
+    return {"username": claims['sub'], "user_level": claims['role']}
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Group commit benchmark
+
+Simulates a shift change at the database: each thread stands for one
+request worker and keeps checking its own user in and out with the same
+statements the check-in/check-out endpoints run. The run is done twice,
+once committing every scan on its own (GROUP_COMMIT_ENABLED=false) and once
+through the group-commit buffer, and reports scans per second and the
+per-scan latency seen by the caller.
+
+Usage (embedded database, seeded by init_db.py):
+    DB_ENGINE=sqlite python init_db.py
+    DB_ENGINE=sqlite python benchmarks/group_commit.py --threads 64 --seconds 10
+
+Temporary users named bench_gc_* are created for the run and deleted
+afterwards, together with their time entries.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.models.database import execute_many, execute_query, execute_write, get_pool_stats  # noqa: E402
+from app.models.write_buffer import write_buffer  # noqa: E402
+
+CHECK_IN = """
+    INSERT INTO time_entries
+    (username, in_time, status, approved_by, approved_at)
+    VALUES (%s, NOW(), 'Approved', %s, NOW())
+    ON DUPLICATE KEY UPDATE id = id
+"""
+CHECK_OUT = """
+    UPDATE time_entries
+    SET out_time = NOW()
+    WHERE id = %s AND out_time IS NULL
+"""
+PREFIX = 'bench_gc_'
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(write, threads, seconds):
+    """Scan in and out from ``threads`` threads for ``seconds``; return (scans, latencies in ms)"""
+    lock = threading.Lock()
+    latencies = []
+    deadline = time.monotonic() + seconds
+
+    def scanner(index):
+        username = f"{PREFIX}{index:04d}"
+        local = []
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            entry_id = write(CHECK_IN, (username, username)).lastrowid
+            local.append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            write(CHECK_OUT, (entry_id,))
+            local.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=scanner, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return len(latencies), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=64, help='concurrent scanners (request workers)')
+    parser.add_argument('--seconds', type=float, default=10, help='duration of each run')
+    args = parser.parse_args()
+
+    execute_query("DELETE FROM users WHERE username LIKE %s", (PREFIX + '%',), commit=True)
+    execute_many(
+        "INSERT INTO users (username, display_name, email, password, user_level) VALUES (%s, %s, %s, %s, %s)",
+        [(f"{PREFIX}{i:04d}", f"Bench {i}", f"{PREFIX}{i:04d}@example.com", '', 'Lead') for i in range(args.threads)]
+    )
+
+    print(f"{args.threads} scanners, {args.seconds:.0f}s per run, "
+          f"group commit window {write_buffer.max_wait * 1000:.1f}ms / {write_buffer.max_batch} writes\n")
+    try:
+        for label, write in (("per-request commit", execute_write), ("group commit", write_buffer.submit)):
+            scans, latencies = run(write, args.threads, args.seconds)
+            print(f"{label:>18}: {scans / args.seconds:8.1f} scans/s  "
+                  f"p50 {percentile(latencies, 0.5):.1f}ms  p95 {percentile(latencies, 0.95):.1f}ms  "
+                  f"p99 {percentile(latencies, 0.99):.1f}ms")
+    finally:
+        execute_query("DELETE FROM users WHERE username LIKE %s", (PREFIX + '%',), commit=True)
+
+    print(f"\nGroup commit: {write_buffer.stats()}")
+    print(f"Pool:         {get_pool_stats()}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
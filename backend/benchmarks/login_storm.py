@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Login storm benchmark
+
+Fires concurrent logins at the app (in-process, through Flask's test client,
+one thread per simulated request worker) while a probe thread keeps calling
+a cheap endpoint. Reports login throughput, how many logins were shed with
+503, and the probe's latency, i.e. whether workers stay available to other
+requests while passwords are being hashed.
+
+Usage (embedded database, seeded by init_db.py):
+    DB_ENGINE=sqlite python init_db.py
+    DB_ENGINE=sqlite python benchmarks/login_storm.py --threads 32 --seconds 10
+
+Compare hashing settings by changing PASSWORD_HASH_WORKERS,
+PASSWORD_HASH_QUEUE and PASSWORD_SCRYPT_LOG_N in the environment.
+"""
+
+import argparse
+import os
+import secrets
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Measure the hashing pool, not the login rate limiter
+os.environ.setdefault('LOGIN_LIMIT_USER_PER_MINUTE', '0')
+os.environ.setdefault('LOGIN_LIMIT_IP_PER_MINUTE', '0')
+# Login tokens are refused under the published default key; any key works in-process
+os.environ.setdefault('SECRET_KEY', secrets.token_hex(32))
+
+from app import create_app  # noqa: E402
+from app.services.passwords import hasher  # noqa: E402
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=32, help='concurrent login loops')
+    parser.add_argument('--seconds', type=float, default=10, help='storm duration')
+    parser.add_argument('--username', default='ylin')
+    parser.add_argument('--password', default='password!')
+    parser.add_argument('--probe', default='/api/users/ylin', help='cheap endpoint timed during the storm')
+    args = parser.parse_args()
+
+    app = create_app()
+    client = app.test_client()
+
+    # Log in once so a legacy hash is upgraded before measuring
+    response = client.post('/api/auth/login', json={'username': args.username, 'password': args.password})
+    if response.status_code != 200:
+        print(f"Login as {args.username} failed ({response.status_code}): {response.get_json()}")
+        return 1
+
+    lock = threading.Lock()
+    results = {200: 0, 503: 0, 'other': 0}
+    login_ms = []
+    probe_ms = []
+    deadline = time.monotonic() + args.seconds
+
+    def storm():
+        local = app.test_client()
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            status = local.post(
+                '/api/auth/login', json={'username': args.username, 'password': args.password}
+            ).status_code
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                results[status if status in results else 'other'] += 1
+                if status == 200:
+                    login_ms.append(elapsed)
+
+    def probe():
+        local = app.test_client()
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            local.get(args.probe)
+            probe_ms.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.01)
+
+    print(f"Storming {args.threads} threads for {args.seconds:.0f}s, {hasher.stats()['algorithm']}, "
+          f"{hasher.workers} hashing threads, queue {hasher.max_queue}")
+
+    threads = [threading.Thread(target=storm) for _ in range(args.threads)]
+    threads.append(threading.Thread(target=probe))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"\nLogins:  {results[200] / args.seconds:.1f}/s succeeded, "
+          f"{results[503]} shed with 503, {results['other']} other")
+    print(f"         p50 {percentile(login_ms, 0.5):.1f}ms  p95 {percentile(login_ms, 0.95):.1f}ms")
+    print(f"Probe:   {len(probe_ms)} calls to {args.probe}")
+    print(f"         p50 {percentile(probe_ms, 0.5):.1f}ms  p95 {percentile(probe_ms, 0.95):.1f}ms  "
+          f"max {max(probe_ms, default=0):.1f}ms")
+    print(f"Hasher:  {hasher.stats()}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
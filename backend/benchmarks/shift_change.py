@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Shift-change load benchmark
+
+Seeds N Leads and M Members (half of each still checked in from the
+previous shift) and replays a shift change against the app in-process,
+through Flask's test client, on a pool of threads standing in for request
+workers:
+
+  * incoming Members: Lead calls /qr/generate (check-in), Member calls /qr/verify
+  * outgoing Members: the same with a check-out QR code
+  * incoming Leads:   /check-in
+  * outgoing Leads:   /check-out
+
+Arrivals are spread over --window seconds following --curve:
+    uniform   evenly over the window
+    burst     everybody within the first tenth of the window
+    ramp      arrivals keep increasing until the end of the window
+    peak      most arrivals around the first third (shift start), tapering off
+
+Reports throughput, p50/p95/p99 latency, error rate and database round
+trips per request for every endpoint, plus how late requests started
+against their schedule (a growing lag means the stack is saturated).
+Results can be saved as JSON to compare runs.
+
+Usage (embedded database, seeded by init_db.py; or point DB_* at a local MySQL):
+    DB_ENGINE=sqlite python init_db.py
+    DB_ENGINE=sqlite python benchmarks/shift_change.py --members 500 --window 120 --curve peak \\
+        --output results/shift-sqlite.json
+
+Seeded users are named bench_sc_* and are deleted afterwards with their
+time entries and QR requests (unless --keep).
+"""
+
+import argparse
+import json
+import os
+import secrets
+import platform
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Measure the attendance paths, not the login rate limiter
+os.environ.setdefault('LOGIN_LIMIT_USER_PER_MINUTE', '0')
+os.environ.setdefault('LOGIN_LIMIT_IP_PER_MINUTE', '0')
+# Login tokens are refused under the published default key; any key works in-process
+os.environ.setdefault('SECRET_KEY', secrets.token_hex(32))
+
+from app import create_app  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.models.database import execute_many, execute_query, get_pool_stats, query_stats  # noqa: E402
+from app.models.hierarchy import hierarchy  # noqa: E402
+from app.services.passwords import hash_password  # noqa: E402
+
+PREFIX = 'bench_sc_'
+PASSWORD = 'bench-password'
+CURVES = ('uniform', 'burst', 'ramp', 'peak')
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def arrival_offsets(count, window, curve, rng):
+    """Return ``count`` sorted start offsets in [0, window] seconds following ``curve``"""
+    if curve == 'uniform':
+        offsets = [rng.uniform(0, window) for _ in range(count)]
+    elif curve == 'burst':
+        offsets = [rng.uniform(0, window / 10) for _ in range(count)]
+    elif curve == 'ramp':
+        offsets = [window * rng.random() ** 0.5 for _ in range(count)]
+    else:
+        offsets = [rng.triangular(0, window, window / 3) for _ in range(count)]
+    return sorted(offsets)
+
+
+def cleanup():
+    execute_query(
+        "DELETE FROM qr_requests WHERE lead_username LIKE %s OR member_username LIKE %s",
+        (PREFIX + '%', PREFIX + '%'), commit=True
+    )
+    execute_query("DELETE FROM users WHERE username LIKE %s", (PREFIX + '%',), commit=True)
+    hierarchy.invalidate()
+
+
+def seed(leads, members):
+    """Create the users, assign Members round-robin and open entries for the outgoing half"""
+    cleanup()
+    password = hash_password(PASSWORD)
+    lead_names = [f"{PREFIX}lead_{i:03d}" for i in range(leads)]
+    member_names = [f"{PREFIX}member_{i:05d}" for i in range(members)]
+
+    execute_many(
+        "INSERT INTO users (username, display_name, email, password, user_level) VALUES (%s, %s, %s, %s, %s)",
+        [(name, name, f"{name}@example.com", password, 'Lead') for name in lead_names]
+        + [(name, name, f"{name}@example.com", '', 'Member') for name in member_names]
+    )
+    lead_of = {member: lead_names[i % leads] for i, member in enumerate(member_names)}
+    execute_many(
+        "INSERT INTO lead_assignments (lead_username, member_username) VALUES (%s, %s)",
+        [(lead, member) for member, lead in lead_of.items()]
+    )
+
+    # The previous shift: every other user is still checked in
+    started = datetime.now().replace(microsecond=0) - timedelta(hours=8)
+    outgoing = set(lead_names[1::2]) | set(member_names[1::2])
+    execute_many(
+        """
+        INSERT INTO time_entries (username, in_time, status, approved_by, approved_at)
+        VALUES (%s, %s, 'Approved', %s, %s)
+        """,
+        [(name, started, lead_of.get(name, name), started) for name in sorted(outgoing)]
+    )
+    hierarchy.invalidate()
+    return lead_names, member_names, lead_of, outgoing
+
+
+class Recorder:
+    """Collects per-endpoint latencies and status codes from all threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.statuses = {}
+        self.lag = []
+
+    def add(self, label, status, elapsed_ms):
+        with self._lock:
+            self.latencies.setdefault(label, []).append(elapsed_ms)
+            counts = self.statuses.setdefault(label, {})
+            counts[status] = counts.get(status, 0) + 1
+
+    def add_lag(self, lag_ms):
+        with self._lock:
+            self.lag.append(lag_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--leads', type=int, default=20, help='Leads to seed (half start checked in)')
+    parser.add_argument('--members', type=int, default=500, help='Members to seed (half start checked in)')
+    parser.add_argument('--window', type=float, default=120, help='seconds over which everybody arrives')
+    parser.add_argument('--curve', choices=CURVES, default='peak', help='arrival curve')
+    parser.add_argument('--workers', type=int, default=32, help='concurrent request workers')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the arrival times')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--keep', action='store_true', help='keep the seeded users and entries')
+    args = parser.parse_args()
+
+    app = create_app()
+    url_map = app.url_map.bind('')
+    rng = random.Random(args.seed)
+    local = threading.local()
+    recorder = Recorder()
+
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        return local.client
+
+    def call(path, headers=None, body=None):
+        started = time.perf_counter()
+        response = client().post(path, json=body or {}, headers=headers)
+        recorder.add(path, response.status_code, (time.perf_counter() - started) * 1000)
+        return response
+
+    print(f"Seeding {args.leads} Leads and {args.members} Members ({Config.DB_ENGINE})...")
+    lead_names, member_names, lead_of, outgoing = seed(args.leads, args.members)
+    try:
+        tokens = {}
+        for lead in lead_names:
+            response = app.test_client().post('/api/auth/login', json={'username': lead, 'password': PASSWORD})
+            tokens[lead] = {'Authorization': 'Bearer ' + response.get_json()['token']}
+
+        def member_scan(member):
+            action = 'check-out' if member in outgoing else 'check-in'
+            response = call('/api/attendance/qr/generate', tokens[lead_of[member]],
+                            {'member_username': member, 'action': action})
+            if response.status_code == 201:
+                call('/api/attendance/qr/verify', body={'token': response.get_json()['token']})
+
+        def lead_scan(lead):
+            if lead in outgoing:
+                call('/api/attendance/check-out', tokens[lead])
+            else:
+                call('/api/attendance/check-in', tokens[lead])
+
+        arrivals = [(member_scan, name) for name in member_names] + [(lead_scan, name) for name in lead_names]
+        rng.shuffle(arrivals)
+        schedule = list(zip(arrival_offsets(len(arrivals), args.window, args.curve, rng), arrivals))
+
+        query_stats.reset()
+        print(f"Replaying {len(schedule)} arrivals over {args.window:.0f}s ({args.curve}) "
+              f"on {args.workers} workers...")
+
+        def run(scheduled_at, scenario, name):
+            recorder.add_lag((time.monotonic() - scheduled_at) * 1000)
+            scenario(name)
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            for offset, (scenario, name) in schedule:
+                delay = started + offset - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(run, started + offset, scenario, name)
+        elapsed = time.monotonic() - started
+
+        queries = {item['endpoint']: item for item in query_stats.snapshot()['by_endpoint']}
+    finally:
+        if not args.keep:
+            cleanup()
+
+    endpoints = {}
+    for path, latencies in sorted(recorder.latencies.items()):
+        statuses = recorder.statuses[path]
+        errors = sum(count for status, count in statuses.items() if status >= 400)
+        endpoint = url_map.match(path, method='POST')[0]
+        endpoints[path] = {
+            "requests": len(latencies),
+            "throughput_per_second": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "max_ms": round(max(latencies), 2),
+            "error_rate": round(errors / len(latencies), 4),
+            "status_codes": {str(status): count for status, count in sorted(statuses.items())},
+            "queries_per_request": queries.get(endpoint, {}).get('queries_per_request'),
+        }
+
+    total = sum(item["requests"] for item in endpoints.values())
+    results = {
+        "benchmark": "shift_change",
+        "at": datetime.now().isoformat(timespec='seconds'),
+        "environment": {
+            "db_engine": Config.DB_ENGINE,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "db_pool_size": Config.DB_POOL_SIZE,
+            "group_commit": Config.GROUP_COMMIT_ENABLED,
+        },
+        "parameters": vars(args),
+        "elapsed_seconds": round(elapsed, 2),
+        "requests": total,
+        "throughput_per_second": round(total / elapsed, 2),
+        "error_rate": round(
+            sum(item["error_rate"] * item["requests"] for item in endpoints.values()) / total, 4
+        ) if total else 0,
+        "start_lag_ms": {
+            "p50": round(percentile(recorder.lag, 0.50), 2),
+            "p95": round(percentile(recorder.lag, 0.95), 2),
+            "max": round(max(recorder.lag, default=0), 2),
+        },
+        "endpoints": endpoints,
+        "pool": get_pool_stats(),
+    }
+
+    print(f"\n{'endpoint':<28} {'req':>6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'err%':>6} {'db/req':>7}")
+    for path, item in endpoints.items():
+        print(f"{path.replace('/api/attendance', ''):<28} {item['requests']:>6} {item['throughput_per_second']:>8.1f} "
+              f"{item['p50_ms']:>7.1f}ms {item['p95_ms']:>6.1f}ms {item['p99_ms']:>6.1f}ms "
+              f"{item['error_rate'] * 100:>5.1f}% {item['queries_per_request'] or 0:>7.2f}")
+    print(f"\n{total} requests in {elapsed:.1f}s ({results['throughput_per_second']:.1f}/s), "
+          f"error rate {results['error_rate'] * 100:.2f}%, "
+          f"start lag p95 {results['start_lag_ms']['p95']:.1f}ms max {results['start_lag_ms']['max']:.1f}ms")
+
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, 'w') as handle:
+            json.dump(results, handle, indent=2, default=str)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
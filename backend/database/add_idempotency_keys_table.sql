@@ -0,0 +1,15 @@
+-- Migration: Idempotency keys
+-- Stored responses for retried attendance requests carrying an Idempotency-Key
+-- header (IDEMPOTENCY_STORE=database). migrate_to_three_tier.py does the same.
+
+USE attendance_system;
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    idem_key CHAR(64) PRIMARY KEY,
+    request_hash CHAR(64) NOT NULL,
+    status_code SMALLINT NULL,
+    response_body MEDIUMTEXT NULL,
+    created_at DATETIME NOT NULL,
+    expires_at DATETIME NOT NULL,
+    INDEX idx_idempotency_expires (expires_at)
+);
@@ -0,0 +1,26 @@
+-- Migration: At most one open time entry per user
+-- Run this on an existing three-tier database (migrate_to_three_tier.py does
+-- the same). Check-in relies on the unique index to reject a second open
+-- entry in a single INSERT ... ON DUPLICATE KEY UPDATE.
+
+USE attendance_system;
+
+-- Keep each user's newest open entry; close older duplicates so the
+-- unique index can be created
+UPDATE time_entries te
+JOIN (
+    SELECT username, MAX(id) AS newest_id
+    FROM time_entries
+    WHERE out_time IS NULL
+    GROUP BY username
+    HAVING COUNT(*) > 1
+) dup ON te.username = dup.username
+SET te.out_time = te.in_time,
+    te.notes = CONCAT_WS(' ', te.notes, '[closed: duplicate open entry]')
+WHERE te.out_time IS NULL AND te.id < dup.newest_id;
+
+-- The username while the entry is open, NULL once checked out (NULLs do not collide)
+ALTER TABLE time_entries
+    ADD COLUMN open_username VARCHAR(50)
+        GENERATED ALWAYS AS (IF(out_time IS NULL, username, NULL)) VIRTUAL,
+    ADD UNIQUE KEY uq_open_entry (open_username);
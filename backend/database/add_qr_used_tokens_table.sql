@@ -0,0 +1,14 @@
+-- Migration: Used signed QR tokens
+-- With QR_TOKEN_MODE=signed, QR codes are stateless signed tokens; only
+-- scanned ones are recorded here (replay check and /qr/status).
+-- migrate_to_three_tier.py does the same.
+
+USE attendance_system;
+
+CREATE TABLE IF NOT EXISTS qr_used_tokens (
+    nonce CHAR(32) PRIMARY KEY,
+    status ENUM('used', 'failed') NOT NULL DEFAULT 'used',
+    used_at DATETIME NOT NULL,
+    expires_at DATETIME NOT NULL,
+    INDEX idx_qr_used_expires (expires_at)
+);
@@ -0,0 +1,136 @@
+-- Attendance Management System Database Schema
+-- Embedded SQLite version of the three-tier schema (DB_ENGINE=sqlite)
+-- Mirrors init_db.py + migrate_to_three_tier.py. The app applies this file
+-- on first connect; it is safe to run multiple times.
+
+-- =============================================
+-- Table 1: Users (Manager, Lead, Member)
+-- =============================================
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) NOT NULL UNIQUE,
+    display_name VARCHAR(100) NOT NULL,
+    email VARCHAR(100) NOT NULL UNIQUE,
+    password VARCHAR(255) NOT NULL,
+    user_level VARCHAR(10) NOT NULL CHECK (user_level IN ('Manager', 'Lead', 'Member')),
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_users_updated_at
+AFTER UPDATE ON users
+FOR EACH ROW WHEN NEW.updated_at = OLD.updated_at
+BEGIN
+    UPDATE users SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id;
+END;
+
+-- =============================================
+-- Table 2: Lead-Member assignments
+-- =============================================
+CREATE TABLE IF NOT EXISTS lead_assignments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lead_username VARCHAR(50) NOT NULL
+        REFERENCES users(username) ON DELETE CASCADE ON UPDATE CASCADE,
+    member_username VARCHAR(50) NOT NULL
+        REFERENCES users(username) ON DELETE CASCADE ON UPDATE CASCADE,
+    assigned_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    UNIQUE (lead_username, member_username)
+);
+CREATE INDEX IF NOT EXISTS idx_lead ON lead_assignments (lead_username);
+CREATE INDEX IF NOT EXISTS idx_member ON lead_assignments (member_username);
+
+-- =============================================
+-- Table 3: Manager-Lead assignments
+-- =============================================
+CREATE TABLE IF NOT EXISTS manager_lead_assignments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    manager_username VARCHAR(50) NOT NULL
+        REFERENCES users(username) ON DELETE CASCADE ON UPDATE CASCADE,
+    lead_username VARCHAR(50) NOT NULL
+        REFERENCES users(username) ON DELETE CASCADE ON UPDATE CASCADE,
+    assigned_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    UNIQUE (manager_username, lead_username)
+);
+CREATE INDEX IF NOT EXISTS idx_manager_lead ON manager_lead_assignments (manager_username);
+CREATE INDEX IF NOT EXISTS idx_lead_manager ON manager_lead_assignments (lead_username);
+
+-- =============================================
+-- Table 4: Time Entries (Attendance Records)
+-- =============================================
+CREATE TABLE IF NOT EXISTS time_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) NOT NULL
+        REFERENCES users(username) ON DELETE CASCADE ON UPDATE CASCADE,
+    in_time DATETIME NOT NULL,
+    out_time DATETIME NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'Pending'
+        CHECK (status IN ('Pending', 'Approved', 'Rejected')),
+    approved_by VARCHAR(50) NULL
+        REFERENCES users(username) ON DELETE SET NULL ON UPDATE CASCADE,
+    approved_at DATETIME NULL,
+    notes TEXT NULL,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    -- The username while the entry is open, NULL once checked out
+    open_username VARCHAR(50) GENERATED ALWAYS AS (CASE WHEN out_time IS NULL THEN username END) VIRTUAL
+);
+CREATE INDEX IF NOT EXISTS idx_username_date ON time_entries (username, in_time);
+-- At most one open entry per user (NULLs do not collide)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_open_entry ON time_entries (open_username);
+CREATE INDEX IF NOT EXISTS idx_status ON time_entries (status);
+CREATE INDEX IF NOT EXISTS idx_approved_by ON time_entries (approved_by);
+
+CREATE TRIGGER IF NOT EXISTS trg_time_entries_updated_at
+AFTER UPDATE ON time_entries
+FOR EACH ROW WHEN NEW.updated_at = OLD.updated_at
+BEGIN
+    UPDATE time_entries SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id;
+END;
+
+-- =============================================
+-- Table 5: QR Code Requests
+-- =============================================
+CREATE TABLE IF NOT EXISTS qr_requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    token VARCHAR(255) NOT NULL UNIQUE,
+    lead_username VARCHAR(50) NOT NULL
+        REFERENCES users(username) ON DELETE CASCADE ON UPDATE CASCADE,
+    member_username VARCHAR(50) NOT NULL
+        REFERENCES users(username) ON DELETE CASCADE ON UPDATE CASCADE,
+    action_type VARCHAR(10) NOT NULL CHECK (action_type IN ('check-in', 'check-out')),
+    status VARCHAR(10) NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'used', 'failed', 'expired')),
+    created_at DATETIME NOT NULL,
+    expires_at DATETIME NOT NULL,
+    used_at DATETIME NULL
+);
+CREATE INDEX IF NOT EXISTS idx_token ON qr_requests (token);
+CREATE INDEX IF NOT EXISTS idx_status_expires ON qr_requests (status, expires_at);
+CREATE INDEX IF NOT EXISTS idx_member_qr ON qr_requests (member_username);
+
+-- =============================================
+-- Table 6: Idempotency keys (IDEMPOTENCY_STORE=database)
+-- Stored responses for retried requests that carry an Idempotency-Key
+-- =============================================
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    idem_key CHAR(64) PRIMARY KEY,
+    request_hash CHAR(64) NOT NULL,
+    status_code INTEGER NULL,
+    response_body TEXT NULL,
+    created_at DATETIME NOT NULL,
+    expires_at DATETIME NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency_keys (expires_at);
+
+-- =============================================
+-- Table 7: Used signed QR tokens (QR_TOKEN_MODE=signed)
+-- One row per scanned token, keyed by its nonce: the replay check and
+-- what /qr/status reports. Not needed once the token has expired
+-- =============================================
+CREATE TABLE IF NOT EXISTS qr_used_tokens (
+    nonce CHAR(32) PRIMARY KEY,
+    status VARCHAR(10) NOT NULL DEFAULT 'used' CHECK (status IN ('used', 'failed')),
+    used_at DATETIME NOT NULL,
+    expires_at DATETIME NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_qr_used_expires ON qr_used_tokens (expires_at);
@@ -2,10 +2,18 @@
 """
 Database Initialization Script for Railway
 Run this script to automatically set up the database
+
+Load-test data (run after migrate_to_three_tier.py):
+    python init_db.py --seed-leads 20 --members-per-lead 50 --history-days 365
+
+Embedded database (no MySQL server):
+    DB_ENGINE=sqlite python init_db.py
 """
 
+import argparse
 import mysql.connector
 import os
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -99,6 +107,7 @@ def create_tables():
             notes TEXT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            open_username VARCHAR(50) GENERATED ALWAYS AS (IF(out_time IS NULL, username, NULL)) VIRTUAL,
             CONSTRAINT fk_time_entry_user
                 FOREIGN KEY (username) REFERENCES users(username)
                 ON DELETE CASCADE
@@ -109,7 +118,8 @@ def create_tables():
                 ON UPDATE CASCADE,
             INDEX idx_username_date (username, in_time),
             INDEX idx_status (status),
-            INDEX idx_approved_by (approved_by)
+            INDEX idx_approved_by (approved_by),
+            UNIQUE KEY uq_open_entry (open_username)
         )
     """)
     print("    ✓ time_entries table created")
@@ -142,6 +152,34 @@ def create_tables():
     """)
     print("    ✓ qr_requests table created")
 
+    # Table 5: Idempotency keys
+    print("  - Creating idempotency_keys table...")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            idem_key CHAR(64) PRIMARY KEY,
+            request_hash CHAR(64) NOT NULL,
+            status_code SMALLINT NULL,
+            response_body MEDIUMTEXT NULL,
+            created_at DATETIME NOT NULL,
+            expires_at DATETIME NOT NULL,
+            INDEX idx_idempotency_expires (expires_at)
+        )
+    """)
+    print("    ✓ idempotency_keys table created")
+
+    # Table 6: Used signed QR tokens
+    print("  - Creating qr_used_tokens table...")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS qr_used_tokens (
+            nonce CHAR(32) PRIMARY KEY,
+            status ENUM('used', 'failed') NOT NULL DEFAULT 'used',
+            used_at DATETIME NOT NULL,
+            expires_at DATETIME NOT NULL,
+            INDEX idx_qr_used_expires (expires_at)
+        )
+    """)
+    print("    ✓ qr_used_tokens table created")
+
     conn.commit()
     cursor.close()
     conn.close()
@@ -217,8 +255,124 @@ def verify_setup():
     cursor.close()
     conn.close()
 
+def init_sqlite():
+    """Create the embedded SQLite database (DB_ENGINE=sqlite) with the three-tier sample data"""
+    from app.config import Config
+    from app.models.database import execute_many, execute_query
+
+    print(f"Step 1: Creating SQLite database at {Config.SQLITE_PATH}...")
+    # The first query opens a connection, which applies database/init_database_sqlite.sql
+    execute_query("SELECT 1", fetch_one=True)
+    print("✓ Schema created/verified (WAL mode)")
+
+    print("\nStep 2: Inserting sample data...")
+    demo_password = 'f82a7d02e8f0a728b7c3e958c278745cb224d3d7b2e3b84c0ecafc5511fdbdb7'
+    execute_many("""
+        INSERT IGNORE INTO users (username, display_name, email, password, user_level)
+        VALUES (%s, %s, %s, %s, %s)
+    """, [
+        ('ylin', 'Yuchen Lin', 'yuchen.lin@example.com', demo_password, 'Manager'),
+        ('xlu', 'Xuanyu Lu', 'xuanyu.lu@example.com', demo_password, 'Lead'),
+        ('jsmith', 'John Smith', 'john.smith@example.com', demo_password, 'Lead'),
+        ('member01', 'Member One', 'member01@example.com', '', 'Member'),
+    ])
+    execute_many("""
+        INSERT IGNORE INTO manager_lead_assignments (manager_username, lead_username)
+        VALUES (%s, %s)
+    """, [('ylin', 'xlu'), ('ylin', 'jsmith')])
+    execute_many("""
+        INSERT IGNORE INTO lead_assignments (lead_username, member_username)
+        VALUES (%s, %s)
+    """, [('xlu', 'member01')])
+    print("✓ Sample users and assignments inserted")
+
+    print("\nTest Credentials:")
+    print("  Manager: ylin / password!")
+    print("  Lead:    xlu / password!")
+    print("  Lead:    jsmith / password!")
+    print("  Member:  member01 (QR code only)")
+    return 0
+
+def seed_large_dataset(lead_count, members_per_lead, history_days):
+    """Bulk-insert Leads, Members, assignments and approved history for load testing"""
+    from app.models.database import execute_many
+
+    print("\nSeeding load-test data...")
+    # Same demo password as the sample users ("password!")
+    demo_password = 'f82a7d02e8f0a728b7c3e958c278745cb224d3d7b2e3b84c0ecafc5511fdbdb7'
+    leads = [f"seed_lead{i:04d}" for i in range(lead_count)]
+    members = {
+        lead: [f"{lead}_m{j:04d}" for j in range(members_per_lead)]
+        for lead in leads
+    }
+
+    user_rows = [
+        (lead, f"Seed Lead {lead[-4:]}", f"{lead}@example.com", demo_password, 'Lead')
+        for lead in leads
+    ]
+    user_rows += [
+        (member, f"Seed Member {member[-10:]}", f"{member}@example.com", '', 'Member')
+        for lead in leads for member in members[lead]
+    ]
+    counts = execute_many("""
+        INSERT IGNORE INTO users (username, display_name, email, password, user_level)
+        VALUES (%s, %s, %s, %s, %s)
+    """, user_rows)
+    print(f"  ✓ Users: {sum(counts)} inserted in {len(counts)} statement(s)")
+
+    counts = execute_many("""
+        INSERT IGNORE INTO lead_assignments (lead_username, member_username)
+        VALUES (%s, %s)
+    """, ((lead, member) for lead in leads for member in members[lead]))
+    print(f"  ✓ Lead assignments: {sum(counts)} inserted in {len(counts)} statement(s)")
+
+    if history_days > 0:
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        def history_rows():
+            for day in range(history_days, 0, -1):
+                start = today - timedelta(days=day)
+                if start.weekday() >= 5:
+                    continue
+                for lead in leads:
+                    for member in members[lead]:
+                        yield (
+                            member,
+                            start + timedelta(hours=8),
+                            start + timedelta(hours=17),
+                            lead,
+                            start + timedelta(hours=17, minutes=5),
+                        )
+
+        counts = execute_many("""
+            INSERT INTO time_entries (username, in_time, out_time, status, approved_by, approved_at)
+            VALUES (%s, %s, %s, 'Approved', %s, %s)
+        """, history_rows())
+        print(f"  ✓ Time entries: {sum(counts)} inserted in {len(counts)} statement(s)")
+
 def main():
     """Main initialization function"""
+    parser = argparse.ArgumentParser(description="Initialize the attendance database")
+    parser.add_argument('--seed-leads', type=int, default=0,
+                        help="Bulk-insert this many Leads for load testing (requires the three-tier schema)")
+    parser.add_argument('--members-per-lead', type=int, default=20,
+                        help="Members created and assigned per seeded Lead")
+    parser.add_argument('--history-days', type=int, default=0,
+                        help="Days of approved weekday history to insert per seeded Member")
+    args = parser.parse_args()
+
+    if os.getenv('DB_ENGINE', 'mysql').lower() == 'sqlite' and not args.seed_leads:
+        return init_sqlite()
+
+    if args.seed_leads:
+        try:
+            seed_large_dataset(args.seed_leads, args.members_per_lead, args.history_days)
+        except mysql.connector.Error as err:
+            print(f"\n✗ Error: {err}")
+            print("\nRun migrate_to_three_tier.py first so the Lead/Member schema exists.")
+            return 1
+        return 0
+
     print("=" * 60)
     print("Attendance Management System - Database Initialization")
     print("=" * 60)
@@ -367,6 +367,99 @@ def remove_contractor_enum(cursor, connection):
         connection.rollback()
         return False
 
+def add_open_entry_index(cursor, connection):
+    """Enforce at most one open time entry per user (generated column + unique index)"""
+    print("🔧 Adding open-entry index to time_entries...")
+
+    try:
+        cursor.execute("""
+            SELECT COLUMN_NAME FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE()
+            AND TABLE_NAME = 'time_entries'
+            AND COLUMN_NAME = 'open_username'
+        """)
+        if cursor.fetchone():
+            print("   ℹ️  Index already exists, skipping...")
+            return True
+
+        # Keep each user's newest open entry; close older duplicates so the
+        # unique index can be created
+        cursor.execute("""
+            UPDATE time_entries te
+            JOIN (
+                SELECT username, MAX(id) AS newest_id
+                FROM time_entries
+                WHERE out_time IS NULL
+                GROUP BY username
+                HAVING COUNT(*) > 1
+            ) dup ON te.username = dup.username
+            SET te.out_time = te.in_time,
+                te.notes = CONCAT_WS(' ', te.notes, '[closed: duplicate open entry]')
+            WHERE te.out_time IS NULL AND te.id < dup.newest_id
+        """)
+        if cursor.rowcount:
+            print(f"   → Closed {cursor.rowcount} duplicate open entr{'y' if cursor.rowcount == 1 else 'ies'}")
+
+        cursor.execute("""
+            ALTER TABLE time_entries
+            ADD COLUMN open_username VARCHAR(50)
+                GENERATED ALWAYS AS (IF(out_time IS NULL, username, NULL)) VIRTUAL,
+            ADD UNIQUE KEY uq_open_entry (open_username)
+        """)
+        connection.commit()
+        print("   ✓ Added open_username column and uq_open_entry index")
+        return True
+    except Error as e:
+        print(f"❌ Error adding open-entry index: {e}")
+        connection.rollback()
+        return False
+
+def create_idempotency_keys_table(cursor, connection):
+    """Create idempotency_keys table (stored responses for Idempotency-Key retries)"""
+    print("📋 Creating idempotency_keys table...")
+
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                idem_key CHAR(64) PRIMARY KEY,
+                request_hash CHAR(64) NOT NULL,
+                status_code SMALLINT NULL,
+                response_body MEDIUMTEXT NULL,
+                created_at DATETIME NOT NULL,
+                expires_at DATETIME NOT NULL,
+                INDEX idx_idempotency_expires (expires_at)
+            )
+        """)
+        connection.commit()
+        print("   ✓ idempotency_keys table ready")
+        return True
+    except Error as e:
+        print(f"❌ Error creating idempotency_keys table: {e}")
+        connection.rollback()
+        return False
+
+def create_qr_used_tokens_table(cursor, connection):
+    """Create qr_used_tokens table (scanned signed QR tokens)"""
+    print("📋 Creating qr_used_tokens table...")
+
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS qr_used_tokens (
+                nonce CHAR(32) PRIMARY KEY,
+                status ENUM('used', 'failed') NOT NULL DEFAULT 'used',
+                used_at DATETIME NOT NULL,
+                expires_at DATETIME NOT NULL,
+                INDEX idx_qr_used_expires (expires_at)
+            )
+        """)
+        connection.commit()
+        print("   ✓ qr_used_tokens table ready")
+        return True
+    except Error as e:
+        print(f"❌ Error creating qr_used_tokens table: {e}")
+        connection.rollback()
+        return False
+
 def verify_migration(cursor):
     """Verify the migration was successful"""
     print("\n🔍 Verifying migration...")
@@ -417,7 +510,14 @@ def main():
         status = check_migration_status(cursor)
 
         if status.get('is_migrated'):
-            print("✅ Migration already completed! Nothing to do.\n")
+            print("✅ Migration already completed!\n")
+            # Schema additions made after the three-tier migration
+            if not add_open_entry_index(cursor, connection):
+                return 1
+            if not create_idempotency_keys_table(cursor, connection):
+                return 1
+            if not create_qr_used_tokens_table(cursor, connection):
+                return 1
             verify_migration(cursor)
             return 0
 
@@ -433,6 +533,9 @@ def main():
             ("Migrate manager assignments", lambda: migrate_manager_assignments(cursor, connection)),
             ("Update qr_requests table", lambda: update_qr_requests_table(cursor, connection)),
             ("Remove old enum value", lambda: remove_contractor_enum(cursor, connection)),
+            ("Add open-entry index", lambda: add_open_entry_index(cursor, connection)),
+            ("Create idempotency_keys table", lambda: create_idempotency_keys_table(cursor, connection)),
+            ("Create qr_used_tokens table", lambda: create_qr_used_tokens_table(cursor, connection)),
         ]
 
         for step_name, step_func in steps:
@@ -3,6 +3,12 @@
 const API_BASE_URL = 'http://localhost:5001/api';
 let currentUser = null;
 
+// Session token issued at login, sent to endpoints that check the caller's role
+function authHeaders(headers = {}) {
+    const token = sessionStorage.getItem('token');
+    return token ? { ...headers, 'Authorization': `Bearer ${token}` } : headers;
+}
+
 // Initialize
 document.addEventListener('DOMContentLoaded', () => {
     checkSession();
@@ -54,6 +60,7 @@ async function handleLogin(e) {
         if (response.ok) {
             currentUser = data.user;
             sessionStorage.setItem('user', JSON.stringify(currentUser));
+            sessionStorage.setItem('token', data.token);
             showDashboard();
             showMessage('登录成功！', 'success');
         } else {
@@ -77,8 +84,7 @@ async function handleCheckIn() {
     try {
         const response = await fetch(`${API_BASE_URL}/attendance/check-in`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ username: currentUser.username })
+            headers: authHeaders({ 'Content-Type': 'application/json' })
         });
 
         const data = await response.json();
@@ -98,8 +104,7 @@ async function handleCheckOut() {
     try {
         const response = await fetch(`${API_BASE_URL}/attendance/check-out`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ username: currentUser.username })
+            headers: authHeaders({ 'Content-Type': 'application/json' })
         });
 
         const data = await response.json();
@@ -210,6 +215,7 @@ function displayMonthlySummary(data) {
 
 function handleLogout() {
     sessionStorage.removeItem('user');
+    sessionStorage.removeItem('token');
     currentUser = null;
     document.getElementById('dashboard-section').style.display = 'none';
     document.getElementById('login-section').style.display = 'block';
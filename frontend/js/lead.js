@@ -9,6 +9,13 @@ let currentUser = null;
 let members = [];
 let qrTimer = null;
 let qrCode = null;
+let qrWaitToken = null;
+
+// Session token issued at login, sent to endpoints that check the caller's role
+function authHeaders(headers = {}) {
+    const token = sessionStorage.getItem('token');
+    return token ? { ...headers, 'Authorization': `Bearer ${token}` } : headers;
+}
 
 // Initialize
 document.addEventListener('DOMContentLoaded', () => {
@@ -93,6 +100,7 @@ async function handleLogin(e) {
             }
 
             sessionStorage.setItem('user', JSON.stringify(currentUser));
+            sessionStorage.setItem('token', data.token);
             showDashboard();
             showMessage('Login successful!', 'success');
         } else {
@@ -185,7 +193,7 @@ async function handleAddMember(e) {
             `${API_BASE_URL}/users/lead/${currentUser.username}/members`,
             {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: authHeaders({ 'Content-Type': 'application/json' }),
                 body: JSON.stringify({
                     member_username: memberUsername,
                     display_name: displayName,
@@ -217,7 +225,8 @@ async function removeMember(memberUsername, memberName) {
         const response = await fetch(
             `${API_BASE_URL}/users/lead/${currentUser.username}/members/${memberUsername}`,
             {
-                method: 'DELETE'
+                method: 'DELETE',
+                headers: authHeaders()
             }
         );
 
@@ -293,9 +302,8 @@ async function generateQR(action) {
     try {
         const response = await fetch(`${API_BASE_URL}/attendance/qr/generate`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: authHeaders({ 'Content-Type': 'application/json' }),
             body: JSON.stringify({
-                lead_username: currentUser.username,
                 member_username: memberUsername,
                 action: action
             })
@@ -304,7 +312,7 @@ async function generateQR(action) {
         const data = await response.json();
 
         if (response.ok) {
-            displayQRCode(data.token, data.action, data.member_name);
+            displayQRCode(data.token, data.action, data.member_name, data.expires_in_seconds);
         } else {
             showMessage(data.error || 'Failed to generate QR code', 'error');
         }
@@ -313,7 +321,7 @@ async function generateQR(action) {
     }
 }
 
-function displayQRCode(token, action, memberName) {
+function displayQRCode(token, action, memberName, expiresInSeconds) {
     // Clear previous QR code
     const container = document.getElementById('qr-code-container');
     container.innerHTML = '';
@@ -325,15 +333,16 @@ function displayQRCode(token, action, memberName) {
         height: 256,
         colorDark: '#000000',
         colorLight: '#ffffff',
-        correctLevel: QRCode.CorrectLevel.H
+        // Signed tokens are several times longer; lower error correction keeps the modules large enough to scan
+        correctLevel: token.length > 64 ? QRCode.CorrectLevel.M : QRCode.CorrectLevel.H
     });
 
     // Show QR display
     document.getElementById('qr-display').style.display = 'block';
     document.getElementById('action-buttons').style.display = 'none';
 
-    // Start countdown timer (5 minutes)
-    let timeLeft = 300;
+    // Start countdown timer (5 minutes unless the server says otherwise)
+    let timeLeft = expiresInSeconds || 300;
     updateTimer(timeLeft);
 
     qrTimer = setInterval(() => {
@@ -345,6 +354,44 @@ function displayQRCode(token, action, memberName) {
             showMessage('QR code expired. Please generate a new one.', 'warning');
         }
     }, 1000);
+
+    waitForScan(token);
+}
+
+// Long-polls the code's status: the server answers as soon as the member
+// scans it (or after ~25s), so there is one request per scan instead of one per second
+async function waitForScan(token) {
+    qrWaitToken = token;
+
+    while (qrWaitToken === token) {
+        try {
+            const response = await fetch(
+                `${API_BASE_URL}/attendance/qr/status/${encodeURIComponent(token)}?wait=25`
+            );
+            const data = await response.json();
+
+            if (!response.ok || qrWaitToken !== token) {
+                return;
+            }
+
+            if (data.status === 'used') {
+                cancelQR();
+                showMessage(`${data.action} successful`, 'success');
+                handleMemberSelection(); // Refresh member status
+                return;
+            } else if (data.status === 'failed') {
+                cancelQR();
+                showMessage(`${data.action} failed. Please check the member's status.`, 'error');
+                handleMemberSelection();
+                return;
+            } else if (data.status === 'expired' || data.is_expired) {
+                return; // The countdown reports it
+            }
+        } catch (error) {
+            console.error('Error waiting for QR scan:', error);
+            await new Promise(resolve => setTimeout(resolve, 2000));
+        }
+    }
 }
 
 function updateTimer(seconds) {
@@ -355,6 +402,8 @@ function updateTimer(seconds) {
 }
 
 function cancelQR() {
+    qrWaitToken = null;
+
     if (qrTimer) {
         clearInterval(qrTimer);
         qrTimer = null;
@@ -368,7 +417,8 @@ function cancelQR() {
 async function loadPendingApprovals() {
     try {
         const response = await fetch(
-            `${API_BASE_URL}/attendance/pending-approvals?username=${currentUser.username}`
+            `${API_BASE_URL}/attendance/pending-approvals`,
+            { headers: authHeaders() }
         );
         const data = await response.json();
 
@@ -416,9 +466,8 @@ async function approveEntry(entryId, status) {
     try {
         const response = await fetch(`${API_BASE_URL}/attendance/approve`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: authHeaders({ 'Content-Type': 'application/json' }),
             body: JSON.stringify({
-                approver_username: currentUser.username,
                 entry_id: entryId,
                 status: status
             })
@@ -439,6 +488,7 @@ async function approveEntry(entryId, status) {
 
 function handleLogout() {
     sessionStorage.removeItem('user');
+    sessionStorage.removeItem('token');
     currentUser = null;
     document.getElementById('dashboard-section').style.display = 'none';
     document.getElementById('login-section').style.display = 'block';
@@ -49,4 +49,5 @@ function getSession() {
 
 function clearSession() {
     sessionStorage.removeItem('user');
+    sessionStorage.removeItem('token');
 }
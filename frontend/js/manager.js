@@ -12,6 +12,12 @@ const API_BASE_URL = 'http://localhost:5001/api';
 let currentUser = null;
 let leads = [];
 
+// Session token issued at login, sent to endpoints that check the caller's role
+function authHeaders(headers = {}) {
+    const token = sessionStorage.getItem('token');
+    return token ? { ...headers, 'Authorization': `Bearer ${token}` } : headers;
+}
+
 // Initialize
 document.addEventListener('DOMContentLoaded', () => {
     checkSession();
@@ -68,6 +74,7 @@ async function handleLogin(e) {
             }
 
             sessionStorage.setItem('user', JSON.stringify(currentUser));
+            sessionStorage.setItem('token', data.token);
             showDashboard();
             showMessage('Login successful!', 'success');
         } else {
@@ -91,7 +98,8 @@ function showDashboard() {
 async function loadLeads() {
     try {
         const response = await fetch(
-            `${API_BASE_URL}/users/manager/${currentUser.username}/leads`
+            `${API_BASE_URL}/users/manager/${currentUser.username}/leads`,
+            { headers: authHeaders() }
         );
         const data = await response.json();
 
@@ -198,7 +206,8 @@ function closeLeadDetails() {
 async function loadPendingApprovals() {
     try {
         const response = await fetch(
-            `${API_BASE_URL}/attendance/pending-approvals?username=${currentUser.username}`
+            `${API_BASE_URL}/attendance/pending-approvals`,
+            { headers: authHeaders() }
         );
         const data = await response.json();
 
@@ -255,9 +264,8 @@ async function approveEntry(entryId, status) {
     try {
         const response = await fetch(`${API_BASE_URL}/attendance/approve`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: authHeaders({ 'Content-Type': 'application/json' }),
             body: JSON.stringify({
-                approver_username: currentUser.username,
                 entry_id: entryId,
                 status: status
             })
@@ -278,6 +286,7 @@ async function approveEntry(entryId, status) {
 
 function handleLogout() {
     sessionStorage.removeItem('user');
+    sessionStorage.removeItem('token');
     currentUser = null;
     leads = [];
     document.getElementById('dashboard-section').style.display = 'none';
@@ -257,36 +257,31 @@ function updateTimerDisplay(seconds) {
 }
 
 async function pollQRStatus(token) {
-    const maxAttempts = 60; // Poll for 5 minutes (60 * 5 seconds)
-    let attempts = 0;
-
-    const pollInterval = setInterval(async () => {
-        attempts++;
+    const maxAttempts = 12; // Wait for up to 5 minutes (12 * 25 seconds)
 
+    // Each request waits on the server until the code is scanned
+    for (let attempts = 0; attempts < maxAttempts && qrTimer; attempts++) {
         try {
-            const response = await fetch(`${API_BASE_URL}/attendance/qr/status/${token}`);
+            const response = await fetch(`${API_BASE_URL}/attendance/qr/status/${encodeURIComponent(token)}?wait=25`);
             const data = await response.json();
 
             if (response.ok) {
                 if (data.status === 'used') {
-                    clearInterval(pollInterval);
                     showMessage(`${data.action} 成功完成！`, 'success');
                     cancelQR();
                     handleWorkerSelection(); // Refresh worker status
+                    return;
                 } else if (data.status === 'failed' || data.status === 'expired') {
-                    clearInterval(pollInterval);
                     showMessage(`二维码 ${data.status}`, 'error');
                     cancelQR();
+                    return;
                 }
             }
         } catch (error) {
             console.error('Error polling QR status:', error);
+            await new Promise(resolve => setTimeout(resolve, 5000));
         }
-
-        if (attempts >= maxAttempts) {
-            clearInterval(pollInterval);
-        }
-    }, 5000); // Poll every 5 seconds
+    }
 }
 
 function cancelQR() {
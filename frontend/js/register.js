@@ -1,6 +1,12 @@
 const API_BASE_URL = 'http://localhost:5001/api';
 let currentManager = null;
 
+// Session token issued at login, sent to endpoints that check the caller's role
+function authHeaders(headers = {}) {
+    const token = sessionStorage.getItem('token');
+    return token ? { ...headers, 'Authorization': `Bearer ${token}` } : headers;
+}
+
 document.addEventListener('DOMContentLoaded', () => {
     checkSession();
     setupEventListeners();
@@ -49,6 +55,7 @@ async function handleManagerLogin(e) {
             }
 
             sessionStorage.setItem('user', JSON.stringify(currentManager));
+            sessionStorage.setItem('token', data.token);
             showRegistrationForm();
             showMessage('管理员身份验证成功', 'success');
         } else {
@@ -86,9 +93,8 @@ async function handleRegistration(e) {
     try {
         const response = await fetch(`${API_BASE_URL}/users/`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: authHeaders({ 'Content-Type': 'application/json' }),
             body: JSON.stringify({
-                manager_username: currentManager.username,
                 username: username,
                 display_name: displayName,
                 email: email,
@@ -149,6 +155,7 @@ function resetForm() {
 
 function handleLogout() {
     sessionStorage.removeItem('user');
+    sessionStorage.removeItem('token');
     currentManager = null;
     document.getElementById('registration-section').style.display = 'none';
     document.getElementById('login-section').style.display = 'block';
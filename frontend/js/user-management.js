@@ -3,6 +3,12 @@ let currentUser = null;
 let allUsers = [];
 let filteredUsers = [];
 
+// Session token issued at login, sent to endpoints that check the caller's role
+function authHeaders(headers = {}) {
+    const token = sessionStorage.getItem('token');
+    return token ? { ...headers, 'Authorization': `Bearer ${token}` } : headers;
+}
+
 document.addEventListener('DOMContentLoaded', () => {
     checkSession();
     setupEventListeners();
@@ -40,7 +46,7 @@ async function loadAllUsers() {
     try {
         showMessage('Loading users...', 'success');
 
-        const response = await fetch(`${API_BASE_URL}/users/?manager_username=${currentUser.username}`);
+        const response = await fetch(`${API_BASE_URL}/users/`, { headers: authHeaders() });
         const data = await response.json();
 
         if (response.ok) {
@@ -167,10 +173,7 @@ async function deleteUser(username) {
     try {
         const response = await fetch(`${API_BASE_URL}/users/${username}`, {
             method: 'DELETE',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                manager_username: currentUser.username
-            })
+            headers: authHeaders()
         });
 
         const data = await response.json();